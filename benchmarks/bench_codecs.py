@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+'''
+Codec Benchmark
+---------------
+
+Encodes and decodes the payloads used in ``tests/test_jsonrpcdispatcher.py``
+with every installed JSON backend, both compact and indented by 4
+(the previous default output), and with the installed binary codecs
+(MessagePack and CBOR). Payloads a codec cannot encode (eg. naive dates in
+CBOR) are reported as such.
+
+::
+
+    python benchmarks/bench_codecs.py --number 2000
+
+'''
+
+import base64
+import os
+import sys
+import time
+from datetime import datetime
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rpc4django.jsonrpcdispatcher import json
+from rpc4django.serialization import CODECS, JSON_BACKENDS, JSONCodec, get_codecs
+
+
+class DateEncoder(json.JSONEncoder):
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.strftime("%Y-%m-%d %H:%M:%S")
+        return super(DateEncoder, self).default(o)
+
+
+BLOB = os.urandom(4096)
+
+
+def response(api_call_id, result):
+    return {'id': api_call_id, 'result': result, 'error': None}
+
+
+PAYLOADS = [
+    ('add request', {"params": [1, 2], "method": "add", "id": 1}),
+    ('unicode request', {"params": [u'はじめ', u'まして'], "method": "add", "id": 2}),
+    ('kwargs response', response(1, False)),
+    ('unicode response', response(1, u'はじめまして')),
+    ('date response', response(1, datetime(2012, 2, 2, 12, 0, 0))),
+    # JSON has no binary strings, JSON clients send binary data in base64
+    ('binary response', response(1, BLOB)),
+    ('base64 response', response(1, base64.b64encode(BLOB))),
+    ('error response', {'id': 123, 'result': None, 'error': {
+        'name': 'JSONRPCError', 'exception': 'BadMethodException',
+        'message': 'JSON Wrong parameter method', 'code': 102}}),
+    ('listMethods response x1000', response(1, [
+        'system.describe', 'system.listMethods', 'system.methodHelp',
+        'system.methodSignature'] * 1000)),
+    ('date rows x1000', response(1, [
+        {'id': i, 'name': u'はじめまして', 'created': datetime(2012, 2, 2)}
+        for i in range(1000)])),
+]
+
+
+def timeit(func, number, *args):
+    start = time.time()
+    for i in xrange(number):
+        func(*args)
+    return (time.time() - start) / number
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--number', type='int', default=1000,
+                      help='iterations per payload')
+    options, args = parser.parse_args()
+
+    codecs = []
+    for name, backend in JSON_BACKENDS:
+        try:
+            for indent in (None, 4):
+                codecs.append(('%s indent=%s' % (name, indent),
+                               JSONCodec(name, DateEncoder, indent)))
+        except ImportError:
+            print '%s is not installed' % name
+    binary = get_codecs(encoder=DateEncoder)
+    for name, codec in CODECS:
+        if name not in [c.name for c in binary]:
+            print '%s is not installed' % name
+    codecs.extend((codec.name, codec) for codec in binary)
+
+    print '%-28s %-22s %10s %10s %8s' % ('payload', 'codec', 'dumps us',
+                                         'loads us', 'bytes')
+    for label, payload in PAYLOADS:
+        number = options.number
+        if 'x1000' in label:
+            number = max(1, number / 100)
+        for codec_name, codec in codecs:
+            try:
+                data = codec.dumps(payload)
+            except Exception as e:
+                print '%-28s %-22s %s' % (label, codec_name, e)
+                continue
+            dumps = timeit(codec.dumps, number, payload)
+            loads = timeit(codec.loads, number, data)
+            print '%-28s %-22s %10.1f %10.1f %8d' % (label, codec_name,
+                dumps * 1e6, loads * 1e6, len(data))
+
+
+if __name__ == '__main__':
+    main()
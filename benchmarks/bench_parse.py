@@ -0,0 +1,86 @@
+'''
+Request Parsing Benchmark
+-------------------------
+
+Compares decoding the request body twice (once for the permission check
+and once more for dispatching) with decoding it once into a
+:class:`JSONRPCRequest <rpc4django.jsonrpcdispatcher.JSONRPCRequest>`
+that is shared by both.
+
+::
+
+    python benchmarks/bench_parse.py --size 100000 --repeat 20
+
+'''
+
+import os
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rpc4django.rpcdispatcher import RPCDispatcher, rpcmethod
+from rpc4django.jsonrpcdispatcher import json
+
+
+class FakeRequest(object):
+    def __init__(self, body):
+        self.raw_post_data = body
+
+
+@rpcmethod(name='bench.count')
+def count(values, **kwargs):
+    return len(values)
+
+
+def build_body(size):
+    return json.dumps({'id': 1, 'method': 'bench.count',
+                       'params': [range(size)]})
+
+
+def run_twice(dispatcher, request):
+    # the request flow before the body was parsed into a JSONRPCRequest
+    dispatcher.get_method_name(request.raw_post_data)
+    return dispatcher.jsonrpcdispatcher.dispatch(request.raw_post_data)
+
+
+def run_once(dispatcher, request):
+    # dispatch() runs check_request_permission with the parsed request
+    rpc_request = dispatcher.jsonrpcdispatcher.parse(request.raw_post_data)
+    return dispatcher.jsonrpcdispatcher.dispatch(rpc_request, request=request)
+
+
+def timeit(func, repeat, *args):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        func(*args)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--size', type='int', default=200000,
+                      help='number of array elements in the params')
+    parser.add_option('--repeat', type='int', default=10)
+    options, args = parser.parse_args()
+
+    dispatcher = RPCDispatcher()
+    dispatcher.register_method(count)
+    request = FakeRequest(build_body(options.size))
+
+    twice = timeit(run_twice, options.repeat, dispatcher, request)
+    once = timeit(run_once, options.repeat, dispatcher, request)
+
+    print 'body size:   %d bytes' % len(request.raw_post_data)
+    print 'parse twice: %.2f ms' % (twice * 1000)
+    print 'parse once:  %.2f ms' % (once * 1000)
+    print 'speedup:     %.2fx' % (twice / once)
+
+
+if __name__ == '__main__':
+    main()
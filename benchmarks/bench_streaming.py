@@ -0,0 +1,96 @@
+'''
+Streaming Benchmark
+-------------------
+
+Compares the peak memory and the time to the first byte of a method
+returning ``--rows`` rows as a list, which is encoded into one string
+before it is sent, with the same method returning a generator whose rows
+are encoded as the response is consumed.
+
+Each mode runs in its own process because the peak resident set size
+(``ru_maxrss``) of a process never goes down.
+
+::
+
+    python benchmarks/bench_streaming.py --rows 100000
+
+'''
+
+import os
+import resource
+import subprocess
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rpc4django.jsonrpcdispatcher import JSONRPCDispatcher
+
+MODES = ('buffered', 'streamed')
+
+
+def row(i):
+    return {'id': i, 'name': 'row %d' % i, 'tags': ['a', 'b', 'c'], 'score': i * 0.5}
+
+
+def rows_list(count):
+    return [row(i) for i in xrange(count)]
+
+
+def rows_generator(count):
+    for i in xrange(count):
+        yield row(i)
+
+
+def maxrss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run(mode, rows):
+    dispatcher = JSONRPCDispatcher()
+    dispatcher.register_function(rows_list, 'buffered')
+    dispatcher.register_function(rows_generator, 'streamed')
+    body = '{"id":1,"method":"%s","params":[%d]}' % (mode, rows)
+
+    baseline = maxrss_kb()
+    start = time.time()
+    response = dispatcher.dispatch(body)
+    if isinstance(response, basestring):
+        response = [response]
+
+    # consume the response like a server writing it to the socket
+    first_byte = None
+    size = 0
+    for chunk in response:
+        if first_byte is None:
+            first_byte = time.time() - start
+        size += len(chunk)
+    elapsed = time.time() - start
+
+    print '%-10s %10d %12.1f %12.1f %12d' % (mode, size, first_byte * 1000,
+                                             elapsed * 1000, maxrss_kb() - baseline)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--rows', type='int', default=100000,
+                      help='number of rows returned by the method')
+    parser.add_option('--mode', choices=MODES,
+                      help='run a single mode in this process')
+    options, args = parser.parse_args()
+
+    if options.mode:
+        run(options.mode, options.rows)
+        return
+
+    print '%-10s %10s %12s %12s %12s' % ('mode', 'bytes', 'first ms',
+                                         'total ms', 'peak +KB')
+    sys.stdout.flush()
+    for mode in MODES:
+        subprocess.check_call([sys.executable, __file__, '--mode', mode,
+                               '--rows', str(options.rows)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+'''
+View Benchmark
+--------------
+
+Drives :func:`serve_rpc_request <rpc4django.views.serve_rpc_request>`
+in process with Django's ``RequestFactory`` for each scenario below and
+reports the requests per second, the p50 and p99 latency, the growth of
+the peak resident set size and the time spent in each stage of a JSON-RPC
+call (parse, permission check, invoke, encode).
+
+Each scenario runs in its own process so that the memory of one scenario
+does not hide the memory of the next. Python 2 has no allocation tracer,
+so the peak RSS growth (``ru_maxrss``) stands in for allocations.
+
+::
+
+    python benchmarks/bench_views.py --output before.json
+    python benchmarks/bench_views.py --output after.json
+    python benchmarks/bench_views.py --compare before.json after.json
+
+``--compare`` exits with status 1 if a scenario got slower than
+``--threshold`` (10% by default) in requests per second or p99 latency.
+
+'''
+
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+USERNAME = 'bench'
+PASSWORD = 'bench password'
+
+SETTINGS = {
+    'SECRET_KEY': 'rpc4django benchmarks',
+    'AUTHENTICATION_BACKENDS': ('__main__.BenchBackend',),
+    'INSTALLED_APPS': ('rpc4django',),
+    'ROOT_URLCONF': 'tests.urls',
+    'RPC4DJANGO_RPC_MODULES': ['example.testapp.othermodule'],
+    'RPC4DJANGO_AUTH_USE_SESSION': False,
+}
+
+
+class BenchUser(object):
+    pk = 1
+    is_active = True
+    is_staff = False
+    is_superuser = False
+    password = None
+
+    def is_authenticated(self):
+        return True
+
+
+class BenchBackend(object):
+    '''
+    Checks the password against a hash like ``ModelBackend`` without a database
+    '''
+
+    def authenticate(self, username=None, password=None):
+        from django.contrib.auth.hashers import check_password
+        if username == USERNAME and check_password(password, BenchUser.password):
+            return BenchUser()
+        return None
+
+    def get_user(self, user_id):
+        return BenchUser() if user_id == BenchUser.pk else None
+
+
+def call(method, params, call_id=1):
+    return json.dumps({'id': call_id, 'method': method, 'params': params})
+
+
+AUTHORIZATION = 'Basic ' + base64.b64encode('%s:%s' % (USERNAME, PASSWORD))
+
+# name -> (HTTP method, body, extra request headers, number divisor)
+# the divisor lowers the number of requests of the slow scenarios
+SCENARIOS = [
+    ('tiny', ('POST', call('bench.echo', [1]), {}, 1)),
+    ('large_params', ('POST', call('bench.count', [range(100000)]), {}, 100)),
+    ('large_result', ('POST', call('bench.rows', [10000]), {}, 100)),
+    ('streamed_result', ('POST', call('bench.iterrows', [10000]), {}, 100)),
+    ('error', ('POST', call('bench.fail', []), {}, 1)),
+    ('bad_method', ('POST', call('bench.nosuchmethod', []), {}, 1)),
+    ('bad_params', ('POST', call('bench.echo', [1, 2, 3]), {}, 1)),
+    ('list_methods', ('POST', call('system.listMethods', []), {}, 1)),
+    ('describe', ('POST', call('system.describe', []), {}, 1)),
+    ('batch_10', ('POST', '[%s]' % ','.join(call('bench.echo', [i], i)
+                                            for i in range(10)), {}, 1)),
+    ('summary_page', ('GET', None, {}, 1)),
+    ('auth', ('POST', call('bench.secure', [1]),
+              {'HTTP_AUTHORIZATION': AUTHORIZATION}, 20)),
+    ('auth_cached', ('POST', call('bench.secure', [1]),
+                     {'HTTP_AUTHORIZATION': AUTHORIZATION}, 1)),
+]
+
+
+def setup(scenario):
+    from django.conf import settings
+    settings.configure(**SETTINGS)
+
+    from django.contrib.auth.hashers import make_password
+    from rpc4django import auth, views
+    from rpc4django.rpcdispatcher import rpcmethod
+    from rpc4django.exceptions import ProcessingException
+
+    BenchUser.password = make_password(PASSWORD)
+    auth.AUTH_CACHE_TTL = 300 if scenario == 'auth_cached' else 0
+
+    @rpcmethod(name='bench.echo', signature=['int', 'int'])
+    def echo(value):
+        return value
+
+    @rpcmethod(name='bench.count', signature=['int', 'array'])
+    def count(values):
+        return len(values)
+
+    @rpcmethod(name='bench.rows', signature=['array', 'int'])
+    def rows(number):
+        return [{'id': i, 'name': 'row %d' % i, 'tags': ['a', 'b']}
+                for i in xrange(number)]
+
+    @rpcmethod(name='bench.iterrows', signature=['array', 'int'])
+    def iterrows(number):
+        for i in xrange(number):
+            yield {'id': i, 'name': 'row %d' % i, 'tags': ['a', 'b']}
+
+    @rpcmethod(name='bench.fail')
+    def fail():
+        raise ProcessingException('failed')
+
+    @rpcmethod(name='bench.secure', signature=['int', 'int'],
+               authentication=auth.basic_http_auth)
+    def secure(value):
+        return value
+
+    dispatcher = views.get_dispatcher()
+    for method in (echo, count, rows, iterrows, fail, secure):
+        dispatcher.register_method(method)
+    return views, dispatcher
+
+
+def build_request(factory, http_method, body, headers):
+    if http_method == 'GET':
+        return factory.get('/RPC2', **headers)
+    return factory.post('/RPC2', body, 'application/json', **headers)
+
+
+def consume(response):
+    # iterates streamed responses like a server would
+    return sum(len(chunk) for chunk in response)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def time_stages(views, dispatcher, factory, body, headers, number):
+    # runs the stages of serve_rpc_request for a single call one by one
+    from rpc4django.exceptions import RpcException, UnknownProcessingError
+
+    protocol = dispatcher.jsonrpcdispatcher
+    stages = dict((stage, 0.0) for stage in ('parse', 'permission', 'invoke', 'encode'))
+    for i in xrange(number):
+        request = build_request(factory, 'POST', body, headers)
+
+        start = time.time()
+        rpc_request = protocol.parse(views.read_body(request, views.MAX_BODY_SIZE),
+                                     views.MAX_JSON_DEPTH, views.MAX_JSON_ELEMENTS)
+        parsed = time.time()
+        dispatcher.check_request_permission(request, rpc_request, set())
+        permitted = time.time()
+        try:
+            method = dispatcher.registry[rpc_request.method]
+            result = method.invoke(*rpc_request.params, request=request)
+            if protocol._streams(method, result):
+                result = list(result)
+            invoked = time.time()
+            protocol._encode_result(rpc_request.id, result=result)
+        except Exception as e:
+            invoked = time.time()
+            if not isinstance(e, RpcException):
+                e = UnknownProcessingError(str(e))
+            protocol.encode_error(e, rpc_request)
+        encoded = time.time()
+
+        stages['parse'] += parsed - start
+        stages['permission'] += permitted - parsed
+        stages['invoke'] += invoked - permitted
+        stages['encode'] += encoded - invoked
+    return dict((stage, total / number * 1e6) for stage, total in stages.items())
+
+
+def run(scenario, number, warmup):
+    http_method, body, headers, divisor = dict(SCENARIOS)[scenario]
+    number = max(10, number / divisor)
+    warmup = max(1, warmup / divisor)
+
+    views, dispatcher = setup(scenario)
+
+    from django.test.client import RequestFactory
+    factory = RequestFactory()
+
+    # the peak grows during the warmup as much as during the run
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for i in xrange(warmup):
+        consume(views.serve_rpc_request(build_request(factory, http_method, body, headers)))
+
+    latencies = []
+    size = 0
+    for i in xrange(number):
+        request = build_request(factory, http_method, body, headers)
+        start = time.time()
+        response = views.serve_rpc_request(request)
+        size = consume(response)
+        latencies.append(time.time() - start)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+
+    latencies.sort()
+    result = {
+        'requests': number,
+        'rps': number / sum(latencies),
+        'p50_us': percentile(latencies, 0.5) * 1e6,
+        'p99_us': percentile(latencies, 0.99) * 1e6,
+        'rss_kb': rss,
+        'response_bytes': size,
+    }
+    if http_method == 'POST' and not body.startswith('['):
+        result['stages_us'] = time_stages(views, dispatcher, factory, body,
+                                          headers, number)
+    return result
+
+
+def run_all(names, number, warmup):
+    results = {}
+    for name in names:
+        output = subprocess.check_output([sys.executable, __file__,
+                                          '--scenario', name,
+                                          '--number', str(number),
+                                          '--warmup', str(warmup)])
+        results[name] = json.loads(output)
+        print_result(name, results[name])
+        sys.stdout.flush()
+    return results
+
+
+def print_header():
+    print '%-16s %8s %10s %10s %10s %8s   %s' % ('scenario', 'requests', 'req/s',
+        'p50 us', 'p99 us', 'rss KB', 'parse/permission/invoke/encode us')
+
+
+def print_result(name, result):
+    stages = result.get('stages_us')
+    if stages:
+        stages = '/'.join('%.0f' % stages[stage] for stage in
+                          ('parse', 'permission', 'invoke', 'encode'))
+    print '%-16s %8d %10.0f %10.0f %10.0f %8d   %s' % (name, result['requests'],
+        result['rps'], result['p50_us'], result['p99_us'], result['rss_kb'],
+        stages or '-')
+
+
+def compare(before_path, after_path, threshold):
+    with open(before_path) as f:
+        before = json.load(f)['results']
+    with open(after_path) as f:
+        after = json.load(f)['results']
+
+    print '%-16s %10s %10s %8s %10s %10s %8s' % ('scenario', 'req/s', 'req/s',
+        'change', 'p99 us', 'p99 us', 'change')
+    regressions = []
+    for name, ignored in SCENARIOS:
+        if name not in before or name not in after:
+            continue
+        old, new = before[name], after[name]
+        rps = new['rps'] / old['rps'] - 1
+        p99 = new['p99_us'] / old['p99_us'] - 1
+        flag = ''
+        if rps < -threshold or p99 > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print '%-16s %10.0f %10.0f %+7.1f%% %10.0f %10.0f %+7.1f%%%s' % (name,
+            old['rps'], new['rps'], rps * 100, old['p99_us'], new['p99_us'],
+            p99 * 100, flag)
+
+    if regressions:
+        print '%d regressions: %s' % (len(regressions), ', '.join(regressions))
+        return 1
+    return 0
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--number', type='int', default=2000,
+                      help='requests per scenario (slow scenarios run fewer)')
+    parser.add_option('--warmup', type='int', default=100)
+    parser.add_option('--only', action='append', default=[],
+                      help='run only this scenario (can be repeated)')
+    parser.add_option('--output', help='save the results as JSON to this file')
+    parser.add_option('--compare', nargs=2, metavar='BEFORE AFTER',
+                      help='compare two saved results')
+    parser.add_option('--threshold', type='float', default=0.1,
+                      help='slowdown reported as a regression by --compare')
+    parser.add_option('--scenario', help='run a single scenario in this process '
+                      'and print its results as JSON')
+    options, args = parser.parse_args()
+
+    if options.compare:
+        sys.exit(compare(options.compare[0], options.compare[1], options.threshold))
+
+    if options.scenario:
+        print json.dumps(run(options.scenario, options.number, options.warmup))
+        return
+
+    names = options.only or [name for name, ignored in SCENARIOS]
+    print_header()
+    results = run_all(names, options.number, options.warmup)
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump({'python': sys.version.split()[0],
+                       'number': options.number,
+                       'results': results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+'''
+XMLRPC Benchmark
+----------------
+
+Compares the throughput of the XMLRPC and the JSONRPC dispatchers of an
+:class:`RPCDispatcher <rpc4django.rpcdispatcher.RPCDispatcher>` for:
+
+- a small call
+- a call with ``--size`` params returning them
+- ``--calls`` small calls in one ``system.multicall`` or JSON-RPC 2.0 batch
+
+It also compares the expat parser of the XMLRPC dispatcher with
+``xmlrpclib.loads`` and with building a DOM with ``xml.dom.minidom``.
+
+::
+
+    python benchmarks/bench_xmlrpc.py --size 10000 --number 200
+
+'''
+
+import os
+import sys
+import time
+import xmlrpclib
+from optparse import OptionParser
+from xml.dom.minidom import parseString
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from rpc4django.rpcdispatcher import RPCDispatcher, rpcmethod
+from rpc4django.jsonrpcdispatcher import json
+from rpc4django.xmlrpcdispatcher import XMLRPCCodec
+
+
+@rpcmethod(name='bench.add')
+def add(a, b, **kwargs):
+    return a + b
+
+
+@rpcmethod(name='bench.echo')
+def echo(rows, **kwargs):
+    return rows
+
+
+def rows(size):
+    return [{'id': i, 'name': 'row %d' % i, 'score': i * 0.5, 'tags': ['a', 'b']}
+            for i in xrange(size)]
+
+
+def bodies(size, calls):
+    # (label, XMLRPC body, JSONRPC body)
+    return [
+        ('small call',
+         xmlrpclib.dumps((1, 2), 'bench.add'),
+         json.dumps({'id': 1, 'method': 'bench.add', 'params': [1, 2]})),
+        ('%d rows' % size,
+         xmlrpclib.dumps((rows(size),), 'bench.echo'),
+         json.dumps({'id': 1, 'method': 'bench.echo', 'params': [rows(size)]})),
+        ('%d calls batched' % calls,
+         xmlrpclib.dumps(([{'methodName': 'bench.add', 'params': [1, 2]}] * calls,),
+                         'system.multicall'),
+         json.dumps([{'id': i, 'method': 'bench.add', 'params': [1, 2]}
+                     for i in xrange(calls)])),
+    ]
+
+
+def timeit(func, number, *args):
+    start = time.time()
+    for i in xrange(number):
+        func(*args)
+    return (time.time() - start) / number
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option('--size', type='int', default=1000,
+                      help='number of rows echoed by the large call')
+    parser.add_option('--calls', type='int', default=50,
+                      help='number of calls in a batch')
+    parser.add_option('--number', type='int', default=100,
+                      help='iterations per body')
+    options, args = parser.parse_args()
+
+    dispatcher = RPCDispatcher()
+    dispatcher.register_method(add)
+    dispatcher.register_method(echo)
+
+    print '%-22s %-8s %10s %10s %10s' % ('body', 'protocol', 'bytes', 'ms', 'calls/s')
+    for label, xml, jsontxt in bodies(options.size, options.calls):
+        for protocol, body, dispatch in (('xmlrpc', xml, dispatcher.xmldispatch),
+                                         ('jsonrpc', jsontxt, dispatcher.jsondispatch)):
+            elapsed = timeit(dispatch, options.number, body)
+            print '%-22s %-8s %10d %10.3f %10.0f' % (label, protocol, len(body),
+                                                   elapsed * 1000, 1 / elapsed)
+
+    print
+    print '%-22s %-10s %10s' % ('body', 'parser', 'ms')
+    codec = XMLRPCCodec()
+    for label, xml, jsontxt in bodies(options.size, options.calls):
+        for name, parse in (('expat', codec.loads), ('xmlrpclib', xmlrpclib.loads),
+                            ('minidom', parseString)):
+            elapsed = timeit(parse, options.number, xml)
+            print '%-22s %-10s %10.3f' % (label, name, elapsed * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,59 @@
 import base64
+import hashlib
+import hmac
 from functools import wraps
-from django.contrib.auth import authenticate, login
+from django.conf import settings
+from django.contrib.auth import authenticate, login, load_backend
 from .exceptions import ProcessingException
+from .utils import LRUCache
+
+# successful basic auth verifications are cached for this many seconds
+# 0 verifies the password on every request
+AUTH_CACHE_TTL = getattr(settings, 'RPC4DJANGO_AUTH_CACHE_TTL', 0)
+AUTH_CACHE_SIZE = getattr(settings, 'RPC4DJANGO_AUTH_CACHE_SIZE', 1000)
+AUTH_USE_SESSION = getattr(settings, 'RPC4DJANGO_AUTH_USE_SESSION', True)
+
+# keyed hash of the authorization header -> (user id, backend, password hash)
+credential_cache = LRUCache(AUTH_CACHE_SIZE)
 
 
 class AuthException(ProcessingException):
     code = 403
 
 
-def basic_http_auth(request):
+def _keyed_hash(value):
+    # neither the credentials nor the password hash are kept in memory
+    return hmac.new(settings.SECRET_KEY, value, hashlib.sha256).hexdigest()
+
+
+def _get_cached_user(key):
+    cached = credential_cache.get(key)
+    if cached is None:
+        return None
+
+    user_id, backend_path, password_hash = cached
+    user = load_backend(backend_path).get_user(user_id)
+    if user is None or not user.is_active or \
+            _keyed_hash(user.password) != password_hash:
+        # the user was deleted, deactivated or changed password
+        credential_cache.delete(key)
+        return None
+
+    user.backend = backend_path
+    return user
+
+
+def clear_credential_cache():
+    '''
+    Forgets every cached basic auth verification
+
+    Changed passwords are detected without this, it is only needed to
+    revoke credentials before the cache entries expire.
+    '''
+    credential_cache.clear()
+
+
+def _basic_http_auth(request, use_session):
     # Already authenticated user
     user = getattr(request, 'user', None)
     if user and user.is_authenticated():
@@ -16,23 +61,58 @@ def basic_http_auth(request):
     # HTTP auth
     if 'HTTP_AUTHORIZATION' not in request.META:
         raise AuthException('Authentication required')
-    auth = request.META['HTTP_AUTHORIZATION'].split()
+    header = request.META['HTTP_AUTHORIZATION']
+    auth = header.split()
     if len(auth) != 2:
         raise AuthException('Wrong HTTP_AUTHORIZATION header')
         # NOTE: We are only support basic authentication for now.
     if auth[0].lower() != "basic":
         raise AuthException('We support only basic http auth')
-    username, password = base64.b64decode(auth[1]).split(':')
-    user = authenticate(username=username, password=password)
+
+    key = None
+    user = None
+    if AUTH_CACHE_TTL:
+        key = _keyed_hash(header)
+        user = _get_cached_user(key)
+
     if user is None:
-        raise AuthException('Wrong user.')
-    if not user.is_active:
-        raise AuthException('Wrong user.')
-    login(request, user)
+        username, password = base64.b64decode(auth[1]).split(':', 1)
+        user = authenticate(username=username, password=password)
+        if user is None:
+            raise AuthException('Wrong user.')
+        if not user.is_active:
+            raise AuthException('Wrong user.')
+        if key is not None:
+            credential_cache.set(key, (user.pk, user.backend,
+                                       _keyed_hash(user.password)),
+                                 AUTH_CACHE_TTL)
+
+    if use_session:
+        login(request, user)
     request.user = user
     return request
 
 
+def basic_http_auth(request):
+    '''
+    Authenticates ``request`` with its HTTP basic auth credentials
+
+    Successful verifications are cached for
+    :envvar:`RPC4DJANGO_AUTH_CACHE_TTL` seconds so the password is not
+    hashed on every request. The user is logged into the session unless
+    :envvar:`RPC4DJANGO_AUTH_USE_SESSION` is ``False``.
+    '''
+    return _basic_http_auth(request, AUTH_USE_SESSION)
+
+
+def stateless_basic_http_auth(request):
+    '''
+    Like :func:`basic_http_auth` but only sets ``request.user`` and never
+    touches the session
+    '''
+    return _basic_http_auth(request, False)
+
+
 def staff_required(request):
     user = getattr(request, 'user', None)
     if not user:
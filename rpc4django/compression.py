@@ -0,0 +1,215 @@
+'''
+Compression of requests and responses
+
+Responses are compressed with the best encoding accepted by the client
+(``Accept-Encoding``) among :envvar:`RPC4DJANGO_COMPRESS_ENCODINGS`:
+
+- zstd with zstandard_ (optional)
+- br with brotli_ (optional)
+- gzip with zlib
+
+Responses smaller than :envvar:`RPC4DJANGO_COMPRESS_MIN_SIZE` are sent as
+they are. Streamed responses are compressed as they are sent.
+
+Request bodies sent with ``Content-Encoding: gzip`` (or ``deflate``) are
+decompressed as they are read and rejected as soon as they decompress to
+more than the maximum body size, so a small compressed body cannot expand
+to fill the memory of the server.
+
+.. _zstandard: https://pypi.python.org/pypi/zstandard
+.. _brotli: https://pypi.python.org/pypi/Brotli
+'''
+
+import zlib
+
+
+class GzipCompressor(object):
+    '''
+    Compresses with gzip, levels 1 to 9
+    '''
+
+    name = 'gzip'
+    default_level = 6
+
+    def _compressobj(self, level):
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data, level=None):
+        compressor = self._compressobj(level or self.default_level)
+        return compressor.compress(data) + compressor.flush()
+
+    def stream(self, chunks, level=None):
+        '''
+        Yields the compressed ``chunks``, each one as soon as it is compressed
+        '''
+        compressor = self._compressobj(level or self.default_level)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+class ZstdCompressor(object):
+    '''
+    Compresses with zstandard, levels 1 to 22
+    '''
+
+    name = 'zstd'
+    default_level = 3
+
+    def __init__(self):
+        import zstandard as module
+        self.module = module
+
+    def compress(self, data, level=None):
+        return self.module.ZstdCompressor(level=level or self.default_level).compress(data)
+
+    def stream(self, chunks, level=None):
+        compressor = self.module.ZstdCompressor(level=level or self.default_level).compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + \
+                compressor.flush(self.module.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+
+
+class BrotliCompressor(object):
+    '''
+    Compresses with brotli, levels 0 to 11
+    '''
+
+    name = 'br'
+    default_level = 5
+
+    def __init__(self):
+        import brotli as module
+        self.module = module
+
+    def _level(self, level):
+        return self.default_level if level is None else level
+
+    def compress(self, data, level=None):
+        return self.module.compress(data, quality=self._level(level))
+
+    def stream(self, chunks, level=None):
+        compressor = self.module.Compressor(quality=self._level(level))
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+
+
+# encodings by name in order of preference
+COMPRESSORS = (
+    ('zstd', ZstdCompressor),
+    ('br', BrotliCompressor),
+    ('gzip', GzipCompressor),
+)
+
+
+def get_compressors(names=None):
+    '''
+    Returns the compressors called ``names`` (all by default) which can
+    be imported, in order of preference
+    '''
+    compressors = []
+    for name, compressor in COMPRESSORS:
+        if names is not None and name not in names:
+            continue
+        try:
+            compressors.append(compressor())
+        except ImportError:
+            continue
+    return compressors
+
+
+def parse_accept_encoding(header):
+    '''
+    Returns a dict of the quality of each encoding of an
+    ``Accept-Encoding`` header
+    '''
+    qualities = {}
+    for item in (header or '').split(','):
+        parts = item.strip().split(';')
+        encoding = parts[0].strip().lower()
+        if not encoding:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            key, sep, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[encoding] = quality
+    return qualities
+
+
+class ResponseCompression(object):
+    '''
+    Chooses the encoding of responses
+
+    **Parameters**
+
+    ``encodings``
+      The names of the encodings responses may be compressed with. Those
+      which are not installed are ignored
+    ``min_size``
+      Responses smaller than this many bytes are not compressed
+    '''
+
+    def __init__(self, encodings=None, min_size=1024):
+        self.compressors = get_compressors(encodings)
+        self.min_size = min_size
+
+    def negotiate(self, accept_encoding):
+        '''
+        Returns the preferred compressor accepted by the client or ``None``
+        '''
+        if not accept_encoding:
+            return None
+        qualities = parse_accept_encoding(accept_encoding)
+        best, best_quality = None, 0
+        for compressor in self.compressors:
+            quality = qualities.get(compressor.name, qualities.get('*', 0))
+            if quality > best_quality:
+                best, best_quality = compressor, quality
+        return best
+
+
+def decompress(chunks, encoding, max_size=None):
+    '''
+    Returns the ``chunks`` of a body compressed with ``encoding`` (``gzip``
+    or ``deflate``) decompressed
+
+    Raises ``ValueError`` if the encoding is not supported, the data is
+    corrupt or it decompresses to more than ``max_size`` bytes. Never more
+    than ``max_size`` bytes and one chunk are held in memory.
+    '''
+    if encoding in ('gzip', 'x-gzip'):
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        decompressor = zlib.decompressobj()
+    else:
+        raise ValueError('Unsupported Content-Encoding %s' % encoding)
+
+    parts = []
+    size = 0
+    try:
+        for chunk in chunks:
+            while chunk:
+                # decompress one byte more than allowed to detect larger bodies
+                limit = max_size - size + 1 if max_size is not None else 0
+                data = decompressor.decompress(chunk, limit)
+                size += len(data)
+                if max_size is not None and size > max_size:
+                    raise ValueError('Decompressed request body exceeds %d bytes' % max_size)
+                parts.append(data)
+                chunk = decompressor.unconsumed_tail
+        data = decompressor.flush()
+    except zlib.error:
+        raise ValueError('Invalid %s request body' % encoding)
+
+    size += len(data)
+    if max_size is not None and size > max_size:
+        raise ValueError('Decompressed request body exceeds %d bytes' % max_size)
+    parts.append(data)
+    return ''.join(parts)
@@ -0,0 +1,101 @@
+'''
+Deadlines of RPC calls
+
+A client can say when it stops waiting for the response with the
+``X-RPC4Django-Deadline`` header or the ``"deadline"`` member of a call,
+both in seconds since the epoch (Unix time). A method can set its own
+limit with ``@rpcmethod(timeout=...)``. The earliest of these is the
+deadline of the call.
+
+Python cannot interrupt a running method so the deadline is enforced
+around it:
+
+- a call whose deadline has passed is rejected before its permissions
+  are checked and before the method is called (eg. after waiting in the
+  queue of a proxy)
+- the result of a call which ends after its deadline is not encoded
+- a streamed result stops at the deadline
+
+Any of these fail the call with
+:class:`DeadlineExceededException <rpc4django.exceptions.DeadlineExceededException>`.
+A method which takes a ``deadline`` parameter is passed the
+:class:`Deadline` of the call, like ``request``, to cut its own work short
+(eg. with a database statement timeout)::
+
+    @rpcmethod(timeout=5)
+    def report(name, deadline=None):
+        cursor.execute('SET statement_timeout = %s',
+                       [int(deadline.remaining() * 1000)])
+        ...
+'''
+
+import math
+import time
+from .exceptions import DeadlineExceededException
+
+DEADLINE_HEADER = 'HTTP_X_RPC4DJANGO_DEADLINE'
+
+
+class Deadline(object):
+    '''
+    The time a call has to end by, in seconds since the epoch
+    '''
+
+    def __init__(self, expires):
+        self.expires = expires
+
+    def remaining(self):
+        '''
+        Returns the number of seconds left, ``0`` once the deadline passed
+        '''
+        return max(0.0, self.expires - time.time())
+
+    def expired(self):
+        return time.time() >= self.expires
+
+    def check(self, api_call_id=''):
+        '''
+        Raises ``DeadlineExceededException`` if the deadline has passed
+        '''
+        if time.time() >= self.expires:
+            raise DeadlineExceededException('The deadline of the call has passed',
+                                            api_call_id)
+
+    def __repr__(self):
+        return '<Deadline expires=%.3f>' % self.expires
+
+
+def parse_deadline(value):
+    '''
+    Returns the Unix time of a deadline header or member
+
+    Raises ``ValueError`` if ``value`` is not a finite number.
+    '''
+    if isinstance(value, bool):
+        raise ValueError('The deadline has to be a number')
+    try:
+        deadline = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('The deadline has to be a number')
+    if math.isinf(deadline) or math.isnan(deadline):
+        raise ValueError('The deadline has to be a number')
+    return deadline
+
+
+def earliest(*deadlines):
+    '''
+    Returns the earliest of the Unix times ``deadlines`` which are not
+    ``None`` or ``None``
+    '''
+    deadlines = [deadline for deadline in deadlines if deadline is not None]
+    return min(deadlines) if deadlines else None
+
+
+def until(items, deadline, api_call_id=''):
+    '''
+    Yields ``items`` until the ``deadline`` passes, then raises
+    ``DeadlineExceededException``
+    '''
+    for item in items:
+        deadline.check(api_call_id)
+        yield item
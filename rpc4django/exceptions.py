@@ -36,6 +36,20 @@ class UnknownProcessingError(RpcException):
     """
     code = 104
 
+class OverloadedException(RpcException):
+    """
+    The call was rejected because the method or the server is running too
+    many calls or is called too often. It can be retried later
+    """
+    code = 105
+
+class DeadlineExceededException(RpcException):
+    """
+    The deadline of the call set by the client or by the timeout of the
+    method has passed
+    """
+    code = 106
+
 class ProcessingException(RpcException):
     """
     Exception for use in api methods.
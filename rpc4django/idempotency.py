@@ -0,0 +1,171 @@
+'''
+Replays the responses of retried calls
+
+A client which retries a call after a timeout sends it with the same
+``Idempotency-Key`` header. The first call runs and its encoded response
+is kept for :envvar:`RPC4DJANGO_IDEMPOTENCY_TTL` seconds, and the retries
+get that response without calling the method again. A retry arriving
+while the first call is still running waits for its response.
+
+If :envvar:`RPC4DJANGO_IDEMPOTENCY_IDS` is ``True``, the ``id`` of a
+JSONRPC call is its key when there is no header. Only use this for
+clients whose ids are unique (eg. UUIDs): a client sending ``"id": 1``
+with every call would get the response of its previous identical call.
+
+A key is always combined with the user, the method, the params and, for
+the calls of a batch, their position and id, so the same key cannot
+replay a response to another user or for another call. The id of a
+single call is not part of its key: a retry with a new id (eg. from
+:class:`Client <rpc4django.client.Client>`) gets the kept response with
+its own id. Permissions are checked before a response is replayed.
+
+Only successful responses are kept: a call which failed runs again when
+it is retried. A call with a key is not streamed, its response is
+encoded as a whole to be kept.
+
+Responses are kept in a bounded in-process LRU and, optionally, in a
+Django cache shared by the workers (:envvar:`RPC4DJANGO_IDEMPOTENCY_CACHE`).
+With a shared cache, a retry sent to another worker also waits for the
+first call.
+'''
+
+import threading
+import time
+from .exceptions import OverloadedException
+from .jsonrpcdispatcher import canonical_params
+from .resultcache import ResultCache
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+class ReplayCache(object):
+    '''
+    Keeps the encoded responses of the calls with an idempotency key
+
+    **Parameters**
+
+    ``max_size``
+      The number of responses kept in process
+    ``ttl``
+      The number of seconds a response is kept
+    ``django_cache``
+      The name of a Django cache (see ``CACHES``) shared by the workers or
+      ``None`` to only keep responses in process
+    ``use_ids``
+      The id of a JSONRPC call is its key when it has no header
+    ``wait_timeout``
+      The number of seconds a retry waits for the first call before it
+      fails with :class:`OverloadedException <rpc4django.exceptions.OverloadedException>`
+    '''
+
+    # a retry waiting for a call in another process checks every this
+    # many seconds if it ended
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, max_size=1000, ttl=300, django_cache=None, use_ids=False,
+                 wait_timeout=30):
+        self.store = ResultCache(max_size, django_cache)
+        self.ttl = ttl
+        self.use_ids = use_ids
+        self.wait_timeout = wait_timeout
+        self.replays = 0
+        self.waits = 0
+        # an Event for each key whose first call runs in this process
+        self._running = {}
+        self._lock = threading.Lock()
+
+    def make_key(self, rpc_request, request=None, codec_name='json', batch_index=None):
+        '''
+        Returns the key the response of ``rpc_request`` is kept under or
+        ``None`` if it has no idempotency key
+
+        ``batch_index`` is the position of the call in its batch or
+        ``None`` for a single call
+        '''
+        key = None
+        if request is not None:
+            key = request.META.get(IDEMPOTENCY_HEADER) or None
+        if key is not None:
+            parts = [key, rpc_request.params]
+            if batch_index is not None:
+                # the calls of a batch share the header
+                parts.extend([batch_index, rpc_request.id])
+        elif self.use_ids and rpc_request.id not in ('', None):
+            parts = ['id', rpc_request.id, rpc_request.params]
+        else:
+            return None
+
+        try:
+            fragment = canonical_params(parts)
+        except (TypeError, ValueError):
+            # eg. binary strings of a binary codec, such calls are not replayed
+            return None
+        return self.store.make_key('replay:%s:%s' % (codec_name, rpc_request.method),
+                                   fragment, True, request)
+
+    def run(self, key, call):
+        '''
+        Returns the response kept under ``key`` or the response of
+        ``call()``
+
+        ``call`` returns the encoded response and whether it may be kept.
+        Only one call for a key runs at a time: the others wait for its
+        response, or run if it is not kept.
+        '''
+        expires = time.time() + self.wait_timeout
+        while True:
+            response = self._replay(key)
+            if response is not None:
+                return response
+
+            with self._lock:
+                event = self._running.get(key)
+                if event is None:
+                    event = self._running[key] = threading.Event()
+                    break
+                self.waits += 1
+            if not event.wait(max(0, expires - time.time())):
+                raise OverloadedException('A call with the same idempotency key is running')
+
+        try:
+            while not self.store.lock(key, self.wait_timeout):
+                # the first call runs in another process
+                if time.time() >= expires:
+                    raise OverloadedException('A call with the same idempotency key is running')
+                time.sleep(self.POLL_INTERVAL)
+                response = self._replay(key)
+                if response is not None:
+                    return response
+
+            try:
+                # the first call may have ended between the checks
+                response = self._replay(key)
+                if response is not None:
+                    return response
+                response, keep = call()
+                if keep:
+                    self.store.set(key, response, self.ttl)
+                return response
+            finally:
+                self.store.unlock(key)
+        finally:
+            with self._lock:
+                del self._running[key]
+            event.set()
+
+    def _replay(self, key):
+        response = self.store.get(key, self.ttl)
+        if response is not None:
+            with self._lock:
+                self.replays += 1
+        return response
+
+    def stats(self):
+        '''
+        Returns a dict of the number of responses replayed, of the retries
+        which waited for a running call and of the stats of the store
+        '''
+        stats = self.store.stats()
+        stats['replays'] = self.replays
+        stats['waits'] = self.waits
+        return stats
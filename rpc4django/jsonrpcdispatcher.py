@@ -1,13 +1,119 @@
 '''
-This module implements a JSON 1.0 compatible dispatcher
+This module implements a JSON 1.0 compatible dispatcher which also accepts
+JSON-RPC 2.0 batches (an Array of calls)
 
 see http://json-rpc.org/wiki/specification
+and http://www.jsonrpc.org/specification#batch
 '''
+import threading
+import time
+from collections import Iterable, Iterator
+from itertools import chain
+from multiprocessing.pool import ThreadPool
 from types import StringTypes
-from .exceptions import RpcException, BadDataException, BadMethodException
+from .deadlines import Deadline, parse_deadline, earliest, until
+from .exceptions import RpcException, BadDataException, BadMethodException, \
+    UnknownProcessingError
+from .logutils import error_limiter
+from .metrics import UNKNOWN_METHOD, BATCH
+from .querysets import encode_models
+from .registry import MethodRegistry
+from .resultcache import ResultCache
+from .serialization import JSONCodec
+from .utils import LRUCache, ClosingIterator, close_iterator
+from django.conf import settings
 from django.utils import simplejson as json
 
 
+class JSONRPCRequest(object):
+    '''
+    A decoded JSONRPC call
+
+    The request body is decoded exactly once by
+    :meth:`JSONRPCDispatcher.parse` and this object is then handed to the
+    permission checks, the dispatcher, logging and error encoding.
+
+    **Attributes**
+
+    ``method``
+      The name of the method being called (not validated)
+    ``params``
+      The list of positional parameters
+    ``id``
+      The id of the call which is echoed back in the response
+    ``raw_size``
+      The length in bytes of the undecoded request body (the whole batch
+      for the calls of a batch)
+    ``batched``
+      Whether the call is part of a batch
+    ``deadline``
+      The Unix time the client stops waiting for the response or ``None``
+      (see :mod:`rpc4django.deadlines`)
+
+    '''
+
+    def __init__(self, method=None, params=None, id='', raw_size=0, deadline=None):
+        self.method = method
+        self.params = params if params is not None else []
+        self.id = id
+        self.raw_size = raw_size
+        self.deadline = deadline
+        self.batched = False
+
+    def __repr__(self):
+        return '<JSONRPCRequest method=%r id=%r size=%d>' % \
+            (self.method, self.id, self.raw_size)
+
+
+class JSONRPCBatch(list):
+    '''
+    A decoded JSON-RPC 2.0 batch
+
+    Each item is either a :class:`JSONRPCRequest` or, for entries which
+    are not valid calls, the :class:`RpcException <rpc4django.exceptions.RpcException>`
+    that will be returned for that entry.
+    '''
+
+    # errors about the batch as a whole are not tied to any call
+    id = ''
+
+    def __init__(self, entries, raw_size=0):
+        list.__init__(self, entries)
+        self.raw_size = raw_size
+        for entry in entries:
+            if isinstance(entry, JSONRPCRequest):
+                entry.batched = True
+
+    def __repr__(self):
+        return '<JSONRPCBatch calls=%d size=%d>' % (len(self), self.raw_size)
+
+
+def _close_db_connections():
+    # threads from the batch pool open their own database connections
+    if settings.configured:
+        from django.db import connections
+        for conn in connections.all():
+            conn.close()
+
+
+# marks the end of a streamed result
+_END_OF_STREAM = object()
+
+
+def _canonical_default(value):
+    # eg. the Binary and DateTime params of XMLRPC calls
+    return '%s:%r' % (value.__class__.__name__, str(value))
+
+
+def canonical_params(params):
+    '''
+    Returns a string which is the same for equal ``params`` and can be used
+    as a key for the result of a call
+    '''
+    return json.dumps(params, sort_keys=True, separators=(',', ':'),
+                      default=_canonical_default)
+
+
 class JSONRPCDispatcher:
     '''
     This class can be used encode and decode jsonrpc messages, dispatch
@@ -17,11 +123,66 @@ class JSONRPCDispatcher:
 
     # indent the json output by this many characters
     # 0 does newlines only and None does most compact
-    JSON_INDENT = 4
+    # only used when no codec is passed to the dispatcher
+    JSON_INDENT = None
+
+    # the maximum number of calls accepted in a single batch
+    MAX_BATCH_SIZE = 100
+
+    # the number of threads running the calls of a batch concurrently
+    # 0 runs the calls one after the other in the request thread
+    BATCH_THREADS = 0
+
+    # streamed results are yielded in chunks of about this many bytes
+    STREAM_CHUNK_SIZE = 65536
+
+    # the number of items of a streamed result encoded at a time
+    STREAM_ITEMS = 100
+
+    # the number of encoded results of versioned methods kept per
+    # registry version, the least recently used are evicted
+    VERSIONED_CACHE_SIZE = 1000
     
-    def __init__(self, json_encoder=None):
+    def __init__(self, json_encoder=None, methods=None, permission_check=None,
+                 codec=None, result_cache=None, metrics=None, limiter=None,
+                 replay_cache=None):
         self.json_encoder = json_encoder
-        self.methods = {}
+
+        # a JSONCodec used for all decoding and encoding
+        if codec is None:
+            codec = JSONCodec(encoder=json_encoder, indent=self.JSON_INDENT)
+        self.codec = codec
+
+        # a MethodRegistry which may be shared with the RPCDispatcher
+        if methods is None:
+            methods = MethodRegistry()
+        self.methods = methods
+
+        # called as permission_check(request, rpc_request, authenticated)
+        # before every call, see RPCDispatcher.check_request_permission
+        self.permission_check = permission_check
+
+        # a ResultCache of the methods with a cache_ttl
+        if result_cache is None:
+            result_cache = ResultCache()
+        self.result_cache = result_cache
+
+        # a Metrics instance recording every call or None
+        self.metrics = metrics
+
+        # a Limiter of all the calls or None, see rpc4django.limits
+        self.limiter = limiter
+
+        # a ReplayCache of the calls with an idempotency key or None,
+        # see rpc4django.idempotency
+        self.replay_cache = replay_cache
+
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+        # an LRUCache of the encoded results of versioned methods for one
+        # registry version
+        self._versioned = (None, None)
 
 
     def register_function(self, method, external_name):
@@ -30,70 +191,181 @@ class JSONRPCDispatcher:
         
         This method can be called later via the dispatch method.
         '''
-        self.methods[external_name] = method
+        self.methods.register(external_name, method)
 
 
     def _encode_result(self, api_call_id, result=None, error=None):
         assert error is None or isinstance(error, RpcException)
         assert not (result and error)
         if error:
-            error = {
-                'name': 'JSONRPCError',
-                'exception': error.__class__.__name__,
-                'message': error.message,
-                'code': error.code,
-            }
+            error = self._error_object(error)
+        # the keys are text in binary codecs as well
         result = {
-            'id': api_call_id,
-            'result': result,
-            'error': error
+            u'id': api_call_id,
+            u'result': result,
+            u'error': error
         }
         try:
-            return json.dumps(result, indent=self.JSON_INDENT, cls=self.json_encoder)
+            return self.codec.dumps(result)
         except:
-            error = {
-                'name': 'JSONRPCError',
-                'exception': 'RpcException',
-                'message': 'Failed to encode return value',
-                'code': 100,
-            }
             result = {
-                'id': api_call_id,
-                'result': None,
-                'error': error
+                u'id': api_call_id,
+                u'result': None,
+                u'error': self._error_object(RpcException('Failed to encode return value')),
             }
-            return json.dumps(result, indent=self.JSON_INDENT, cls=self.json_encoder)
+            return self.codec.dumps(result)
+
 
+    def _error_object(self, error):
+        message = error.message
+        if isinstance(message, str):
+            message = message.decode('utf-8', 'replace')
+        return {
+            u'name': u'JSONRPCError',
+            u'exception': unicode(error.__class__.__name__),
+            u'message': message,
+            u'code': error.code,
+        }
 
-    def encode_error(self, error):
+
+    def _encode_stream(self, api_call_id, result, stream_errors=None):
+        # yields the response for an iterable result in chunks so neither
+        # the result nor the response is ever held in memory as a whole
+        #
+        # the items are encoded STREAM_ITEMS at a time into the "result"
+        # Array. If iterating or encoding fails, the Array is closed after
+        # the items already encoded and the error is set: a response with
+        # both a (partial) "result" and an "error" is the error trailer
+        chunk = ['{"id":%s,"result":[' % self.codec.dumps(api_call_id)]
+        size = 0
+        separator = ''
+        error = None
+        try:
+            items = []
+            for item in chain(result, [_END_OF_STREAM]):
+                if item is not _END_OF_STREAM:
+                    items.append(item)
+                    if len(items) < self.STREAM_ITEMS:
+                        continue
+                elif not items:
+                    break
+
+                # the items are encoded as an Array without its brackets
+                try:
+                    encoded = self.codec.dumps(items)[1:-1]
+                except Exception:
+                    raise RpcException('Failed to encode return value')
+                items = []
+                chunk.append(separator)
+                chunk.append(encoded)
+                separator = ','
+                size += len(encoded)
+                if size >= self.STREAM_CHUNK_SIZE:
+                    yield ''.join(chunk)
+                    chunk = []
+                    size = 0
+        except RpcException as e:
+            error = e
+        except Exception as e:
+            error_limiter.log_exception('Streaming the result of call %r failed', api_call_id)
+            error = UnknownProcessingError('%s: %s' % (e.__class__.__name__, e.message))
+
+        if error is None:
+            chunk.append('],"error":null}')
+        else:
+            if stream_errors is not None:
+                stream_errors.append(error.code)
+            chunk.append('],"error":%s}' % self.codec.dumps(self._error_object(error)))
+        yield ''.join(chunk)
+
+
+    def _streams(self, method, result):
+        # generators and other iterators are streamed and so is any
+        # iterable (eg. a list or QuerySet) from a method with stream=True
+        if isinstance(result, (basestring, dict)):
+            return False
+        if getattr(method, 'stream', False):
+            return isinstance(result, Iterable)
+        return isinstance(result, Iterator)
+
+
+    def _encode_encoded_result(self, api_call_id, encoded_result):
+        # wraps a result which is already encoded without decoding it again
+        return self.codec.encode_response(self.codec.dumps(api_call_id), encoded_result)
+
+
+    def encode_error(self, error, rpc_request=None):
+        '''
+        Returns the JSON encoded response for ``error``
+
+        If the error does not carry the id of the call, it is taken from
+        ``rpc_request`` when the request body could be parsed.
+        '''
         assert isinstance(error, RpcException)
-        return self._encode_result(error.api_call_id, error=error)
+        api_call_id = error.api_call_id
+        if not api_call_id and rpc_request is not None:
+            api_call_id = rpc_request.id
+        return self._encode_result(api_call_id, error=error)
 
 
-    def dispatch(self, json_data, **kwargs):
+    def parse(self, json_data, max_depth=None, max_elements=None, deadline=None):
         '''
-        Verifies that the passed json encoded string
-        is in the correct form according to the json-rpc spec
-        and calls the appropriate Python method
+        Decodes the passed json encoded string into a :class:`JSONRPCRequest`
+        or, if the root is an Array, a :class:`JSONRPCBatch` and verifies that
+        it is in the correct form according to the json-rpc spec
 
         **Checks**
 
          1. that the string encodes into a javascript Object (dictionary)
-         2. that 'method' and 'params' are present
-         3. 'method' must be a javascript String type
-         4. 'params' must be a javascript Array type
+            or a non-empty Array of them no longer than ``MAX_BATCH_SIZE``
+         2. 'params' must be a javascript Array type
+         3. that the JSON is not nested deeper than ``max_depth`` and has
+            at most ``max_elements`` elements, before it is decoded (see
+            :func:`check_json_limits <rpc4django.serialization.check_json_limits>`
+            and, for the binary codecs, ``check_msgpack_limits`` and
+            ``check_cbor_limits``)
+         4. 'deadline', if present, must be a number
 
-        Returns the JSON encoded response
+        ``deadline`` is the Unix time the client stops waiting for every
+        call (eg. from a header). A call with an earlier ``"deadline"``
+        keeps its own.
+
+        The method name is validated later by :meth:`dispatch`.
+        Invalid entries of a batch do not fail the whole batch.
         '''
         if not json_data:
             raise BadDataException('No POST data')
 
+        try:
+            self.codec.check_limits(json_data, max_depth, max_elements)
+        except ValueError as e:
+            raise BadDataException(e.message)
+
         try:
             # attempt to do a json decode on the data
-            jsondict = json.loads(json_data)
-        except ValueError:
+            jsondata = self.codec.loads(json_data)
+        except (ValueError, RuntimeError):
+            # RuntimeError is the recursion limit of deeply nested JSON
             raise BadDataException('JSON decoding error')
 
+        if isinstance(jsondata, list):
+            if not jsondata:
+                raise BadDataException('JSON batch is empty')
+            if len(jsondata) > self.MAX_BATCH_SIZE:
+                raise BadDataException('JSON batch exceeds %d calls' % self.MAX_BATCH_SIZE)
+
+            entries = []
+            for jsondict in jsondata:
+                try:
+                    entries.append(self._parse_call(jsondict, len(json_data), deadline))
+                except RpcException as e:
+                    entries.append(e)
+            return JSONRPCBatch(entries, len(json_data))
+
+        return self._parse_call(jsondata, len(json_data), deadline)
+
+
+    def _parse_call(self, jsondict, raw_size, deadline=None):
         if not isinstance(jsondict, dict):
             # verify the json data was a javascript Object which gets decoded
             # into a python dictionary
@@ -105,11 +377,369 @@ class JSONRPCDispatcher:
         if not isinstance(params, list):
             raise BadDataException('JSON method params has to be a list', api_call_id=api_call_id)
 
+        if jsondict.get('deadline') is not None:
+            try:
+                deadline = earliest(deadline, parse_deadline(jsondict['deadline']))
+            except ValueError as e:
+                raise BadDataException('JSON %s' % e.message, api_call_id=api_call_id)
+
+        return JSONRPCRequest(jsondict.get('method'), params, api_call_id, raw_size,
+                              deadline)
+
+
+    def dispatch(self, json_data, **kwargs):
+        '''
+        Calls the appropriate Python method for a JSONRPC call
+
+        ``json_data`` is either a :class:`JSONRPCRequest` or
+        :class:`JSONRPCBatch` returned by :meth:`parse` or a json encoded
+        string which is parsed first. ``kwargs`` are passed to the method.
+
+        Returns the JSON encoded response. Errors of a single call are
+        raised while errors in a batch are encoded in that entry's response.
+
+        If a single call returns an iterator (eg. a generator) or the method
+        has ``stream=True``, an iterator of the chunks of the response is
+        returned instead and the result is encoded as it is consumed.
+        An error while streaming is returned as an ``"error"`` following
+        the partial ``"result"`` Array.
+
+        A call with a deadline, from the client or the ``timeout`` of the
+        method, is also passed it as the ``deadline`` keyword argument (see
+        :mod:`rpc4django.deadlines`).
+        '''
+        if isinstance(json_data, (JSONRPCRequest, JSONRPCBatch)):
+            rpc_request = json_data
+        else:
+            rpc_request = self.parse(json_data)
+
+        if isinstance(rpc_request, JSONRPCBatch):
+            return self.dispatch_batch(rpc_request, **kwargs)
+
+        try:
+            self._check_deadline(rpc_request)
+            self._check_permission(rpc_request, kwargs, set())
+        except Exception as e:
+            self._record_error(rpc_request, e)
+            raise
+        return self._call(rpc_request, kwargs)
+
+
+    def dispatch_batch(self, batch, **kwargs):
+        '''
+        Calls the methods of every entry in ``batch``
+
+        Permissions are checked for every entry in the request thread and
+        each authentication is only applied once to the HttpRequest. The
+        permitted calls then run one after the other or, if
+        ``BATCH_THREADS`` is set, concurrently on a thread pool.
+
+        Returns a JSON Array of the responses in the order of the batch
+        '''
+        start = time.time()
+        authenticated = set()
+        calls = []
+        for index, entry in enumerate(batch):
+            error = None
+            if isinstance(entry, RpcException):
+                entry, error = None, entry
+            else:
+                try:
+                    self._check_deadline(entry)
+                    self._check_permission(entry, kwargs, authenticated)
+                except Exception as e:
+                    error = e
+            calls.append((entry, error, kwargs, index))
+
+        if self.BATCH_THREADS > 0 and len(calls) > 1:
+            responses = self._get_pool().map(self._dispatch_threaded, calls)
+        else:
+            responses = [self._dispatch_entry(call) for call in calls]
+
+        response = self.codec.encode_array(responses)
+        if self.metrics is not None:
+            self.metrics.record(BATCH, time.time() - start, batch.raw_size, len(response))
+        return response
+
+
+    def _check_deadline(self, rpc_request):
+        # calls nobody waits for anymore are not even authenticated
+        if rpc_request.deadline is not None:
+            Deadline(rpc_request.deadline).check(rpc_request.id)
+
+
+    def _check_permission(self, rpc_request, kwargs, authenticated):
+        if self.permission_check is not None:
+            self.permission_check(kwargs.get('request'), rpc_request, authenticated)
+
+
+    def _call(self, rpc_request, kwargs, batch_index=None):
+        # calls the method, or replays the response of a previous call
+        # with the same idempotency key, and returns the encoded response
+        if self.replay_cache is not None:
+            key = self.replay_cache.make_key(rpc_request, kwargs.get('request'),
+                                             self.codec.name, batch_index)
+            if key is not None:
+                api_call_id, response = self.replay_cache.run(
+                    key, lambda: self._call_replayable(rpc_request, kwargs))
+                if api_call_id != rpc_request.id:
+                    # a retry with a new id
+                    response = self._replace_id(response, rpc_request.id)
+                return response
+        return self._call_once(rpc_request, kwargs)
+
+
+    def _call_replayable(self, rpc_request, kwargs):
+        stream_errors = []
+        response = self._call_once(rpc_request, kwargs, stream_errors)
+        if not isinstance(response, basestring):
+            response = ''.join(response)
+        # a stream which ended with an error is not replayed
+        return (rpc_request.id, response), not stream_errors
+
+
+    def _replace_id(self, response, api_call_id):
+        # replayed responses are only decoded when the id differs
+        response = self.codec.loads(response)
+        response[u'id'] = api_call_id
+        return self.codec.dumps(response)
+
+
+    def _call_once(self, rpc_request, kwargs, stream_errors=None):
+        if self.metrics is None:
+            return self._invoke(rpc_request, kwargs, stream_errors)
+
+        start = time.time()
+        if stream_errors is None:
+            stream_errors = []
+        try:
+            response = self._invoke(rpc_request, kwargs, stream_errors)
+        except Exception as e:
+            self._record_error(rpc_request, e, start)
+            raise
+
+        if isinstance(response, basestring):
+            self._record(rpc_request, start, len(response))
+            return response
+        return self._measure_stream(rpc_request, start, response, stream_errors)
+
+
+    def _measure_stream(self, rpc_request, start, chunks, stream_errors):
+        # records a streamed call once its response has been sent, or
+        # closed without being sent
+        sizes = []
+
+        def measure():
+            for chunk in chunks:
+                sizes.append(len(chunk))
+                yield chunk
+
+        def record():
+            self._record(rpc_request, start, sum(sizes),
+                         stream_errors[0] if stream_errors else None)
+
+        return ClosingIterator(measure(), lambda: close_iterator(chunks), record)
+
+
+    def _record(self, rpc_request, start, response_bytes, error_code=None):
+        name = rpc_request.method
+        if self.methods.get(name) is None:
+            name = UNKNOWN_METHOD
+        # the size of a batch is only recorded once, under BATCH
+        request_bytes = None if rpc_request.batched else rpc_request.raw_size
+        self.metrics.record(name, time.time() - start, request_bytes,
+                            response_bytes, error_code)
+
+
+    def _record_error(self, rpc_request, error, start=None):
+        if self.metrics is not None and rpc_request is not None:
+            if isinstance(error, RpcException):
+                code = error.code
+            else:
+                code = UnknownProcessingError.code
+            self._record(rpc_request, start or time.time(), 0, code)
+
+
+    def _invoke(self, rpc_request, kwargs, stream_errors=None):
+        method = self.methods.get(rpc_request.method)
+        if method is None:
+            raise BadMethodException('JSON Wrong parameter method', api_call_id=rpc_request.id)
+
+        max_body_size = getattr(method, 'max_body_size', None)
+        if max_body_size is not None and rpc_request.raw_size > max_body_size:
+            raise BadDataException('%s accepts at most %d bytes' %
+                                   (rpc_request.method, max_body_size),
+                                   api_call_id=rpc_request.id)
+
+        timeout = getattr(method, 'timeout', None)
+        expires = earliest(rpc_request.deadline,
+                           time.time() + timeout if timeout is not None else None)
+        if expires is not None:
+            deadline = Deadline(expires)
+            deadline.check(rpc_request.id)
+            kwargs = dict(kwargs, deadline=deadline)
+
+        limiters = [limiter for limiter in (self.limiter, getattr(method, 'limiter', None))
+                    if limiter is not None]
+        if not limiters:
+            return self._invoke_method(method, rpc_request, kwargs, stream_errors)
+
+        acquired = []
         try:
-            method = self.methods[jsondict.get('method')]
+            for limiter in limiters:
+                limiter.acquire(rpc_request.id)
+                acquired.append(limiter)
+            response = self._invoke_method(method, rpc_request, kwargs, stream_errors)
         except:
-            raise BadMethodException('JSON Wrong parameter method', api_call_id=api_call_id)
+            self._release(acquired)
+            raise
+
+        if isinstance(response, basestring):
+            self._release(acquired)
+            return response
+        # a streamed call runs until its response has been sent
+        return self._release_after(response, acquired)
+
+
+    def _invoke_method(self, method, rpc_request, kwargs, stream_errors):
+        if getattr(method, 'versioned', False):
+            return self._call_versioned(method, rpc_request, kwargs)
+
+        if getattr(method, 'cache_ttl', None):
+            return self._call_cached(method, rpc_request, kwargs)
+
+        result = self._call_method(method, rpc_request, kwargs)
+        deadline = kwargs.get('deadline')
+        if self._streams(method, result):
+            if isinstance(deadline, Deadline):
+                result = until(result, deadline, rpc_request.id)
+            if self.codec.streams:
+                return self._encode_stream(rpc_request.id, result, stream_errors)
+            # binary codecs encode the length of an Array before its items
+            result = list(result)
+        if isinstance(deadline, Deadline):
+            # nobody reads a late result, it is not encoded
+            deadline.check(rpc_request.id)
+        return self._encode_result(rpc_request.id, result=result)
+
+
+    def _call_method(self, method, rpc_request, kwargs):
+        # QuerySets and model instances are turned into dicts (iterators
+        # of dicts for QuerySets and lists), see rpc4django.querysets
+        # RPCMethods check the params before calling their method, other
+        # callables (eg. from register_function) are called as they are
+        invoke = getattr(method, 'invoke', method)
+        return encode_models(invoke(*rpc_request.params, **kwargs),
+                             getattr(method, 'fields', None))
+
+
+    def _call_whole(self, method, rpc_request, kwargs):
+        # the result of a call whose encoded result is kept is never streamed
+        result = self._call_method(method, rpc_request, kwargs)
+        if isinstance(result, Iterator):
+            result = list(result)
+        return result
+
+
+    def _release(self, limiters):
+        for limiter in limiters:
+            limiter.release()
+
+
+    def _release_after(self, chunks, limiters):
+        # the limits are released once, when the response has been sent
+        # or is closed, even if it was never iterated
+        return ClosingIterator(chunks, lambda: self._release(limiters))
+
+
+    def _call_versioned(self, method, rpc_request, kwargs):
+        version, results = self._versioned
+        if version != self.methods.version:
+            results = LRUCache(self.VERSIONED_CACHE_SIZE)
+            self._versioned = (self.methods.version, results)
+
+        try:
+            key = (rpc_request.method, canonical_params(rpc_request.params))
+        except (TypeError, ValueError):
+            # eg. binary strings of a binary codec, such calls are not cached
+            return self._call_uncached(method, rpc_request, kwargs)
+        encoded_result = results.get(key)
+        if encoded_result is None:
+            result = self._call_whole(method, rpc_request, kwargs)
+            encoded_result = self.codec.dumps(result)
+            results.set(key, encoded_result)
+
+        return self._encode_encoded_result(rpc_request.id, encoded_result)
+
+
+    def _call_uncached(self, method, rpc_request, kwargs):
+        # the result of a call whose params cannot be a key
+        return self._encode_result(rpc_request.id,
+                                   result=self._call_whole(method, rpc_request, kwargs))
+
+
+    def _call_cached(self, method, rpc_request, kwargs):
+        # the params are checked before the cache_key function sees them
+        check_params = getattr(method, 'check_params', None)
+        if check_params is not None:
+            check_params(rpc_request.params, kwargs)
+
+        key_func = getattr(method, 'cache_key', None)
+        if key_func is not None:
+            fragment = key_func(*rpc_request.params)
+        else:
+            try:
+                fragment = canonical_params(rpc_request.params)
+            except (TypeError, ValueError):
+                # eg. binary strings of a binary codec, such calls are not cached
+                return self._call_uncached(method, rpc_request, kwargs)
+        # the results are cached as encoded by the codec
+        name = '%s:%s' % (self.codec.name, rpc_request.method)
+        key = self.result_cache.make_key(name, fragment,
+                                         getattr(method, 'cache_per_user', False),
+                                         kwargs.get('request'))
+
+        encoded_result = self.result_cache.get(key, method.cache_ttl)
+        if encoded_result is None:
+            result = self._call_whole(method, rpc_request, kwargs)
+            try:
+                encoded_result = self.codec.dumps(result)
+            except Exception:
+                # encoding errors are reported and never cached
+                return self._encode_result(rpc_request.id, result=result)
+            self.result_cache.set(key, encoded_result, method.cache_ttl)
+
+        return self._encode_encoded_result(rpc_request.id, encoded_result)
+
+
+    def _dispatch_entry(self, call):
+        entry, error, kwargs, index = call
+        try:
+            if error is not None:
+                self._record_error(entry, error)
+                raise error
+            response = self._call(entry, kwargs, index)
+            if not isinstance(response, basestring):
+                # the calls of a batch are never streamed
+                response = ''.join(response)
+            return response
+        except RpcException as e:
+            return self.encode_error(e, entry)
+        except Exception as e:
+            error_limiter.log_exception('Batch call %r failed', entry)
+            return self.encode_error(UnknownProcessingError('%s: %s' % (e.__class__.__name__, e.message)), entry)
+
+
+    def _dispatch_threaded(self, call):
+        try:
+            return self._dispatch_entry(call)
+        finally:
+            _close_db_connections()
 
-        result = method(*params, **kwargs)
-        return self._encode_result(api_call_id, result=result)
 
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPool(self.BATCH_THREADS)
+        return self._pool
@@ -0,0 +1,101 @@
+'''
+Concurrency and rate limits of RPC methods
+
+A method declared with ``@rpcmethod(max_concurrency=..., rate=...)`` gets
+a :class:`Limiter` and the dispatcher may have a global one
+(:envvar:`RPC4DJANGO_MAX_CONCURRENCY`). A call over a limit is rejected
+at once with :class:`OverloadedException <rpc4django.exceptions.OverloadedException>`
+instead of waiting, so a busy method cannot tie up every thread of the
+server and nothing queues without bound.
+
+The limits are per process.
+'''
+
+import threading
+import time
+from .exceptions import OverloadedException
+
+
+class TokenBucket(object):
+    '''
+    Allows ``rate`` calls per second on average and bursts of up to
+    ``burst`` calls (defaults to ``rate`` or 1)
+    '''
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(rate, 1))
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def take(self):
+        '''
+        Returns whether a call is allowed now
+        '''
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class Limiter(object):
+    '''
+    Limits the number of concurrent calls and the rate of calls
+
+    **Parameters**
+
+    ``max_concurrency``
+      The number of calls running at the same time. ``None`` is unlimited
+    ``rate``
+      The number of calls per second. ``None`` is unlimited
+    ``burst``
+      The number of calls allowed at once above ``rate``
+    ``name``
+      Named in the error of rejected calls
+    '''
+
+    def __init__(self, max_concurrency=None, rate=None, burst=None, name=''):
+        self.max_concurrency = max_concurrency
+        self.name = name
+        self.active = 0
+        self.rejected = 0
+        self._bucket = TokenBucket(rate, burst) if rate is not None else None
+        self._lock = threading.Lock()
+
+    def acquire(self, api_call_id=''):
+        '''
+        Starts a call or raises ``OverloadedException``. Every call started
+        must be ended with :meth:`release`
+        '''
+        with self._lock:
+            if self.max_concurrency is not None and self.active >= self.max_concurrency:
+                self.rejected += 1
+                raise OverloadedException('%s is running too many calls' %
+                                          (self.name or 'The server'), api_call_id)
+            self.active += 1
+
+        if self._bucket is not None and not self._bucket.take():
+            with self._lock:
+                self.active -= 1
+                self.rejected += 1
+            raise OverloadedException('%s is called too often' %
+                                      (self.name or 'The server'), api_call_id)
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+def make_limiter(name, max_concurrency=None, rate=None, burst=None):
+    '''
+    Returns a :class:`Limiter`, or ``None`` if there is no limit
+    '''
+    if max_concurrency is None and rate is None:
+        return None
+    return Limiter(max_concurrency, rate, burst, name)
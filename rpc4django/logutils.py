@@ -0,0 +1,103 @@
+'''
+Logging of requests, responses and errors which costs next to nothing
+when the messages would not be emitted
+
+Request and response bodies are only formatted when the ``rpc4django``
+logger is enabled for DEBUG, are sampled per method and are truncated.
+Errors are logged with their traceback at most once per interval for each
+exception type.
+'''
+
+import logging
+import random
+import sys
+import threading
+import time
+
+logger = logging.getLogger('rpc4django')
+
+
+class ErrorRateLimiter(object):
+    '''
+    Logs exceptions with their traceback at most once every ``interval``
+    seconds for each exception type. The number of errors suppressed in
+    between is added to the next message.
+    '''
+
+    def __init__(self, interval=60):
+        self.interval = interval
+        self._last = {}     # exception type -> (time logged, suppressed)
+        self._lock = threading.Lock()
+
+    def log_exception(self, message, *args):
+        '''
+        Logs the exception being handled as an error
+
+        Returns ``False`` if it was suppressed
+        '''
+        exc_type = sys.exc_info()[0]
+        now = time.time()
+
+        with self._lock:
+            last, suppressed = self._last.get(exc_type, (None, 0))
+            if last is not None and now - last < self.interval:
+                self._last[exc_type] = (last, suppressed + 1)
+                return False
+            self._last[exc_type] = (now, 0)
+
+        if suppressed:
+            message += ' (%d similar errors suppressed)'
+            args += (suppressed,)
+        logger.error(message, *args, exc_info=True)
+        return True
+
+
+# used for every error logged by rpc4django
+error_limiter = ErrorRateLimiter()
+
+
+class RequestLogger(object):
+    '''
+    Logs incoming requests and outgoing responses at DEBUG level
+
+    **Parameters**
+
+    ``sample_rates``
+      A dict of the fraction (``0.0`` - ``1.0``) of the calls to log by
+      method name. The rate of ``'*'`` is used for methods that are not
+      listed and for batches. Defaults to logging every call
+    ``max_body``
+      Bodies are truncated to this many bytes
+    ``log_responses``
+      Whether response bodies are logged
+    '''
+
+    def __init__(self, sample_rates=None, max_body=1024, log_responses=False):
+        self.sample_rates = sample_rates or {}
+        self.max_body = max_body
+        self.log_responses = log_responses
+
+    def sampled(self, rpc_request):
+        '''
+        Returns whether the request (and its response) should be logged
+        '''
+        if not logger.isEnabledFor(logging.DEBUG):
+            return False
+
+        rate = self.sample_rates.get('*', 1.0)
+        method_name = getattr(rpc_request, 'method', None)
+        if isinstance(method_name, basestring):
+            rate = self.sample_rates.get(method_name, rate)
+        return rate >= 1.0 or random.random() < rate
+
+    def truncate(self, body):
+        if len(body) <= self.max_body:
+            return body
+        return '%s... (%d bytes)' % (body[:self.max_body], len(body))
+
+    def log_request(self, rpc_request, body):
+        logger.debug('Incoming request %r: %s', rpc_request, self.truncate(body))
+
+    def log_response(self, rpc_request, body):
+        if self.log_responses:
+            logger.debug('Outgoing response %r: %s', rpc_request, self.truncate(body))
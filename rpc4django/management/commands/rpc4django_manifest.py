@@ -0,0 +1,34 @@
+'''
+Writes the manifest of the RPC methods so that workers can register them
+without scanning the ``INSTALLED_APPS``
+
+::
+
+    python manage.py rpc4django_manifest [path]
+
+The path defaults to :envvar:`RPC4DJANGO_MANIFEST`.
+'''
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    args = '[path]'
+    help = 'Writes the manifest of the RPC methods loaded by RPC4DJANGO_MANIFEST'
+
+    def handle(self, *args, **options):
+        from rpc4django import views
+
+        if len(args) > 1:
+            raise CommandError('Usage: rpc4django_manifest %s' % self.args)
+
+        path = args[0] if args else views.MANIFEST
+        if not path:
+            raise CommandError('Pass a path or set RPC4DJANGO_MANIFEST')
+
+        # never read the manifest which is being rebuilt
+        dispatcher = views.build_dispatcher(use_manifest=False)
+        dispatcher.write_manifest(path)
+
+        count = len(dispatcher.get_manifest()['methods'])
+        self.stdout.write('Wrote %d methods to %s\n' % (count, path))
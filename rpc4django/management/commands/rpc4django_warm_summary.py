@@ -0,0 +1,26 @@
+'''
+Renders the method summary page ahead of the first request
+
+::
+
+    python manage.py rpc4django_warm_summary
+
+The page is only shared with the server processes when
+:envvar:`RPC4DJANGO_SUMMARY_CACHE` names a Django cache.
+'''
+
+from django.core.management.base import NoArgsCommand
+
+
+class Command(NoArgsCommand):
+    help = 'Renders the RPC method summary into RPC4DJANGO_SUMMARY_CACHE'
+
+    def handle_noargs(self, **options):
+        from rpc4django import views
+
+        if not views.SUMMARY_CACHE:
+            self.stderr.write('RPC4DJANGO_SUMMARY_CACHE is not set, '
+                              'the page is only rendered in this process\n')
+
+        html, etag = views.get_method_summary(views.get_dispatcher())
+        self.stdout.write('Rendered %d bytes with ETag %s\n' % (len(html), etag))
@@ -0,0 +1,230 @@
+'''
+Per-method call metrics
+
+The dispatcher records the calls, the errors by code, the latency and the
+request and response sizes of every method in a :class:`Metrics` instance.
+They can be read with the ``system.stats`` RPC method
+(:envvar:`RPC4DJANGO_RESTRICT_STATS`) or scraped in the Prometheus text
+format from :func:`serve_metrics <rpc4django.views.serve_metrics>`.
+
+Each process of a multi-process server records its own calls. With
+:envvar:`RPC4DJANGO_METRICS_DIR`, every process regularly writes them to a
+file in that directory and the files of all the processes are added up
+when the metrics are read.
+'''
+
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+
+# the upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+# calls to methods which are not registered are recorded under this name
+# so that clients cannot create metrics for arbitrary names
+UNKNOWN_METHOD = '_unknown'
+
+# batches as a whole are recorded under this name: their calls are
+# recorded under their methods without the size of the request
+BATCH = '_batch'
+
+HISTOGRAMS = (
+    ('latency', LATENCY_BUCKETS),
+    ('request_bytes', SIZE_BUCKETS),
+    ('response_bytes', SIZE_BUCKETS),
+)
+
+
+def _new_method_stats():
+    stats = {'calls': 0, 'errors': {}}
+    for name, buckets in HISTOGRAMS:
+        stats[name] = {'counts': [0] * (len(buckets) + 1), 'sum': 0}
+    return stats
+
+
+def _observe(histogram, buckets, value):
+    # counts[i] is the number of values <= buckets[i] and > buckets[i - 1]
+    # and the last count is the number of values > buckets[-1]
+    histogram['counts'][bisect_left(buckets, value)] += 1
+    histogram['sum'] += value
+
+
+def _merge(total, stats):
+    for method, method_stats in stats.iteritems():
+        merged = total.setdefault(method, _new_method_stats())
+        merged['calls'] += method_stats['calls']
+        for code, count in method_stats['errors'].iteritems():
+            merged['errors'][code] = merged['errors'].get(code, 0) + count
+        for name, buckets in HISTOGRAMS:
+            histogram = merged[name]
+            histogram['sum'] += method_stats[name]['sum']
+            histogram['counts'] = [a + b for a, b in
+                                   zip(histogram['counts'], method_stats[name]['counts'])]
+    return total
+
+
+class Metrics(object):
+    '''
+    Records calls per method
+
+    **Parameters**
+
+    ``directory``
+      A directory shared by the processes of the server where each process
+      writes its metrics every ``flush_interval`` seconds. ``None`` keeps
+      the metrics of this process only
+    '''
+
+    def __init__(self, directory=None, flush_interval=5):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._flushed = time.time()
+
+    def record(self, method, seconds, request_bytes, response_bytes, error_code=None):
+        '''
+        Records a call to ``method`` which took ``seconds``
+
+        ``error_code`` is the code of the
+        :class:`RpcException <rpc4django.exceptions.RpcException>` the call
+        failed with or ``None``. ``request_bytes`` is ``None`` for the calls
+        of a batch, whose size is recorded under ``BATCH``
+        '''
+        flush = False
+        with self._lock:
+            if self._pid != os.getpid():
+                # a forked process does not count the calls of its parent
+                self._stats = {}
+                self._pid = os.getpid()
+
+            stats = self._stats.get(method)
+            if stats is None:
+                stats = self._stats[method] = _new_method_stats()
+            stats['calls'] += 1
+            if error_code is not None:
+                code = str(error_code)
+                stats['errors'][code] = stats['errors'].get(code, 0) + 1
+            _observe(stats['latency'], LATENCY_BUCKETS, seconds)
+            if request_bytes is not None:
+                _observe(stats['request_bytes'], SIZE_BUCKETS, request_bytes)
+            _observe(stats['response_bytes'], SIZE_BUCKETS, response_bytes)
+
+            if self.directory is not None:
+                now = time.time()
+                if now - self._flushed >= self.flush_interval:
+                    self._flushed = now
+                    flush = True
+
+        if flush:
+            self.flush()
+
+    def snapshot(self):
+        '''
+        Returns a copy of the metrics of this process
+        '''
+        with self._lock:
+            return _merge({}, self._stats)
+
+    def flush(self):
+        '''
+        Writes the metrics of this process to ``directory``
+        '''
+        if self.directory is None:
+            return
+        data = json.dumps(self.snapshot())
+        fd, path = tempfile.mkstemp(prefix='.metrics-', dir=self.directory)
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+        # readers never see a partially written file
+        os.rename(path, os.path.join(self.directory, 'metrics-%d.json' % os.getpid()))
+
+    def collect(self):
+        '''
+        Returns the metrics of every process writing to ``directory`` (or
+        of this process only) as a dict keyed by method name
+
+        Each method has the number of ``calls``, the number of ``errors``
+        by code and the ``latency``, ``request_bytes`` and
+        ``response_bytes`` histograms. The ``counts`` of a histogram are
+        per bucket of :data:`LATENCY_BUCKETS` or :data:`SIZE_BUCKETS`
+        followed by the count above the last bucket.
+        '''
+        if self.directory is None:
+            return self.snapshot()
+
+        self.flush()
+        total = {}
+        for filename in os.listdir(self.directory):
+            if not (filename.startswith('metrics-') and filename.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    stats = json.load(f)
+            except (IOError, ValueError):
+                # removed or replaced since it was listed
+                continue
+            _merge(total, stats)
+        return total
+
+    def clear(self):
+        with self._lock:
+            self._stats = {}
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_bound(bound):
+    return repr(float(bound)) if isinstance(bound, float) else str(bound)
+
+
+def format_prometheus(stats):
+    '''
+    Returns the metrics ``stats`` returned by :meth:`Metrics.collect` in
+    the Prometheus text exposition format
+    '''
+    methods = sorted(stats)
+    lines = [
+        '# HELP rpc4django_calls_total RPC calls by method',
+        '# TYPE rpc4django_calls_total counter',
+    ]
+    for method in methods:
+        lines.append('rpc4django_calls_total{method="%s"} %d' %
+                     (_escape(method), stats[method]['calls']))
+
+    lines.append('# HELP rpc4django_errors_total RPC calls which failed by method and error code')
+    lines.append('# TYPE rpc4django_errors_total counter')
+    for method in methods:
+        for code, count in sorted(stats[method]['errors'].iteritems()):
+            lines.append('rpc4django_errors_total{method="%s",code="%s"} %d' %
+                         (_escape(method), code, count))
+
+    for name, metric, buckets, help in (
+            ('latency', 'rpc4django_call_duration_seconds', LATENCY_BUCKETS,
+             'RPC call latency by method'),
+            ('request_bytes', 'rpc4django_request_bytes', SIZE_BUCKETS,
+             'RPC request body size by method'),
+            ('response_bytes', 'rpc4django_response_bytes', SIZE_BUCKETS,
+             'RPC response body size by method')):
+        lines.append('# HELP %s %s' % (metric, help))
+        lines.append('# TYPE %s histogram' % metric)
+        for method in methods:
+            label = _escape(method)
+            histogram = stats[method][name]
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), histogram['counts']):
+                cumulative += count
+                lines.append('%s_bucket{method="%s",le="%s"} %d' %
+                             (metric, label, _format_bound(bound), cumulative))
+            lines.append('%s_sum{method="%s"} %s' % (metric, label, repr(float(histogram['sum']))))
+            lines.append('%s_count{method="%s"} %d' % (metric, label, cumulative))
+
+    return '\n'.join(lines) + '\n'
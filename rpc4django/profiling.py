@@ -0,0 +1,184 @@
+'''
+Profiles single RPC requests on demand
+
+A request is dispatched under ``cProfile`` when it carries a valid
+``X-RPC4Django-Profile`` header signed with :envvar:`RPC4DJANGO_PROFILE_KEY`
+or when it is sampled by :envvar:`RPC4DJANGO_PROFILE_SAMPLE_RATES`.
+The profile is saved in :envvar:`RPC4DJANGO_PROFILE_DIR` and can be read
+with ``pstats``. The header value is made by :func:`sign` for the method
+called, or the comma separated methods of a batch, so a header seen by
+someone else cannot profile other methods::
+
+    python -c "from rpc4django.profiling import sign; print sign('the key', 'math.add')"
+
+Requests are not profiled, and pay nothing, unless one of these settings
+is set.
+'''
+
+import cProfile
+import hashlib
+import hmac
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger('rpc4django')
+
+PROFILE_HEADER = 'HTTP_X_RPC4DJANGO_PROFILE'
+SUMMARY_HEADER = 'X-RPC4Django-Profile-Summary'
+
+_UNSAFE = re.compile(r'[^\w.-]+')
+
+
+def _signature(key, method_name, timestamp):
+    message = '%d:%s' % (timestamp, method_name.encode('utf-8'))
+    return hmac.new(key, message, hashlib.sha256).hexdigest()
+
+
+def profiled_name(rpc_request):
+    '''
+    Returns the name a profile header is signed for: the method of a call
+    or the comma separated methods of a batch. ``None`` if a method name
+    is not a string
+    '''
+    entries = rpc_request if isinstance(rpc_request, list) else [rpc_request]
+    names = [getattr(entry, 'method', u'') for entry in entries]
+    if not all(isinstance(name, basestring) for name in names):
+        return None
+    return u','.join(names)
+
+
+def sign(key, method_name, timestamp=None):
+    '''
+    Returns the value of the ``X-RPC4Django-Profile`` header requesting a
+    profile of a call to ``method_name`` (see :func:`profiled_name`),
+    valid for a few minutes after ``timestamp`` (defaults to now)
+    '''
+    if timestamp is None:
+        timestamp = int(time.time())
+    if isinstance(method_name, str):
+        method_name = method_name.decode('utf-8')
+    return '%d:%s' % (timestamp, _signature(key, method_name, timestamp))
+
+
+class RequestProfiler(object):
+    '''
+    Decides which requests are profiled and profiles them
+
+    **Parameters**
+
+    ``key``
+      The secret signing the profile header. ``None`` ignores the header
+    ``directory``
+      Where the profiles are saved
+    ``sample_rates``
+      A dict of the fraction of the calls to profile by method name. The
+      rate of ``'*'`` is used for methods that are not listed and batches
+    ``summary``
+      Whether the functions taking the most time are returned in the
+      ``X-RPC4Django-Profile-Summary`` response header
+    ``top``
+      The number of functions in the summary
+    ``max_age``
+      The number of seconds a signed header is valid
+    '''
+
+    def __init__(self, key=None, directory=None, sample_rates=None,
+                 summary=False, top=10, max_age=300):
+        self.key = key
+        self.directory = directory
+        self.sample_rates = sample_rates or {}
+        self.summary = summary
+        self.top = top
+        self.max_age = max_age
+
+    def wants(self, request, rpc_request):
+        '''
+        Returns whether ``request`` is profiled
+        '''
+        header = request.META.get(PROFILE_HEADER)
+        if header is not None and self.key:
+            return self.verify(header, profiled_name(rpc_request))
+
+        if self.sample_rates:
+            rate = self.sample_rates.get('*', 0)
+            method_name = getattr(rpc_request, 'method', None)
+            if isinstance(method_name, basestring):
+                rate = self.sample_rates.get(method_name, rate)
+            return rate > 0 and random.random() < rate
+        return False
+
+    def verify(self, header, method_name):
+        '''
+        Returns whether ``header`` is a valid signed request to profile a
+        call to ``method_name``
+        '''
+        if method_name is None:
+            return False
+        try:
+            timestamp, signature = header.split(':', 1)
+            timestamp = int(timestamp)
+        except ValueError:
+            return False
+        if abs(time.time() - timestamp) > self.max_age:
+            return False
+        return constant_time_compare(signature,
+                                     _signature(self.key, method_name, timestamp))
+
+    def run(self, rpc_request, func, *args, **kwargs):
+        '''
+        Calls ``func`` under the profiler and saves the profile, even if
+        ``func`` raises
+
+        A streamed response is consumed so that encoding it is profiled.
+        Returns the response and, if ``summary`` is set, the summary of the
+        top functions (or ``None``).
+        '''
+        profiler = cProfile.Profile()
+        try:
+            response = profiler.runcall(self._call, func, *args, **kwargs)
+        finally:
+            path = self.save(profiler, rpc_request)
+            logger.info('Saved the profile of %r to %s', rpc_request, path)
+
+        summary = self.summarize(profiler) if self.summary else None
+        return response, summary
+
+    def _call(self, func, *args, **kwargs):
+        response = func(*args, **kwargs)
+        if not isinstance(response, basestring):
+            response = ''.join(response)
+        return response
+
+    def save(self, profiler, rpc_request):
+        '''
+        Saves the profile as ``<method>-<request id>-<time>.prof``
+        '''
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        method_name = getattr(rpc_request, 'method', None)
+        if not isinstance(method_name, basestring):
+            method_name = 'batch'
+        filename = '%s-%s-%d.prof' % (
+            _UNSAFE.sub('_', method_name.encode('utf-8'))[:100],
+            _UNSAFE.sub('_', unicode(rpc_request.id).encode('utf-8'))[:50],
+            int(time.time() * 1000))
+        path = os.path.join(self.directory, filename)
+        profiler.dump_stats(path)
+        return path
+
+    def summarize(self, profiler):
+        '''
+        Returns the ``top`` functions by cumulative time on one line
+        '''
+        stats = pstats.Stats(profiler).stats
+        top = sorted(stats.iteritems(), key=lambda item: item[1][3], reverse=True)
+        return ', '.join('%s:%d(%s) %.2fms' % (os.path.basename(filename), line,
+                                               function, cumulative * 1000)
+                         for (filename, line, function), (cc, nc, tt, cumulative, callers)
+                         in top[:self.top])
@@ -0,0 +1,129 @@
+'''
+Results which are Django QuerySets or model instances
+
+The dispatchers turn these results into values every codec can encode:
+
+- a QuerySet is read with ``.values()`` and ``.iterator()``, so rows are
+  fetched from the database a chunk at a time and no model instance is
+  built or cached. The rows are streamed as they are encoded
+- a model instance becomes a dict of its fields, like a row of
+  ``.values()``
+- a list or tuple of model instances is streamed as such dicts
+
+A method can declare the fields it returns with
+``@rpcmethod(fields=[...])``. Only those columns are selected::
+
+    @rpcmethod(fields=['id', 'title', 'author'])
+    def books(**kwargs):
+        return Book.objects.filter(published=True)
+
+As with ``.values()``, a foreign key is its primary key and is named
+after its field (``author``) if it is declared and after its column
+(``author_id``) otherwise. A declared name which is not a field (eg. a
+property) is read from the instances, which are then built.
+'''
+
+import sys
+
+
+def _models():
+    # django.db.models is only imported if the project uses models: a
+    # result cannot be a model if it is not imported yet
+    return sys.modules.get('django.db.models')
+
+
+def is_model_result(result):
+    '''
+    Returns ``True`` if ``result`` is a QuerySet, a model instance or a
+    list or tuple starting with a model instance
+    '''
+    models = _models()
+    if models is None:
+        return False
+    if isinstance(result, (models.query.QuerySet, models.Model)):
+        return True
+    return isinstance(result, (list, tuple)) and len(result) > 0 and \
+        isinstance(result[0], models.Model)
+
+
+def _attnames(model, fields):
+    # the attribute holding each field of fields (None for other names)
+    models = _models()
+    attnames = []
+    for name in fields:
+        try:
+            attnames.append(model._meta.get_field(name).attname)
+        except models.FieldDoesNotExist:
+            attnames.append(None)
+    return attnames
+
+
+def model_to_dict(obj, fields=None, attnames=None):
+    '''
+    Returns the fields of the model instance ``obj`` (all of its concrete
+    fields by default) as a dict keyed like a row of ``.values()``
+    '''
+    if fields is None:
+        return dict((field.attname, getattr(obj, field.attname))
+                    for field in obj._meta.fields)
+    if attnames is None:
+        attnames = _attnames(obj.__class__, fields)
+    return dict((name, getattr(obj, attname or name))
+                for name, attname in zip(fields, attnames))
+
+
+def _instances_to_dicts(instances, fields):
+    attnames = {}
+    for obj in instances:
+        if fields is None:
+            yield model_to_dict(obj)
+            continue
+        model = obj.__class__
+        if model not in attnames:
+            attnames[model] = _attnames(model, fields)
+        yield model_to_dict(obj, fields, attnames[model])
+
+
+def queryset_rows(queryset, fields=None):
+    '''
+    Returns an iterator of the rows of ``queryset`` as dicts, or tuples
+    for a ``values_list()`` QuerySet, without caching them
+
+    A QuerySet which was already evaluated is not queried again.
+    '''
+    query = sys.modules['django.db.models.query']
+    if queryset._result_cache is not None:
+        if isinstance(queryset, query.ValuesQuerySet):
+            return iter(queryset._result_cache)
+        return _instances_to_dicts(queryset._result_cache, fields)
+
+    if isinstance(queryset, query.ValuesListQuerySet):
+        return queryset.iterator()
+    if fields is not None:
+        attnames = _attnames(queryset.model, fields)
+        if None in attnames and not isinstance(queryset, query.ValuesQuerySet):
+            # a property needs the instances
+            return _instances_to_dicts(queryset.iterator(), fields)
+        return queryset.values(*fields).iterator()
+    if isinstance(queryset, query.ValuesQuerySet):
+        return queryset.iterator()
+    return queryset.values().iterator()
+
+
+def encode_models(result, fields=None):
+    '''
+    Returns ``result`` with a QuerySet or model instances replaced by
+    dicts of their ``fields`` (see above). Other results are returned as
+    they are
+
+    QuerySets and lists of instances become iterators, which the
+    dispatchers stream.
+    '''
+    if not is_model_result(result):
+        return result
+    models = _models()
+    if isinstance(result, models.query.QuerySet):
+        return queryset_rows(result, fields)
+    if isinstance(result, models.Model):
+        return model_to_dict(result, fields)
+    return _instances_to_dicts(result, fields)
@@ -0,0 +1,81 @@
+'''
+This module contains the registry of methods callable via RPC.
+It is shared by :class:`RPCDispatcher <rpc4django.rpcdispatcher.RPCDispatcher>`
+and the protocol dispatchers.
+'''
+
+from bisect import insort
+
+
+class MethodRegistry(object):
+    '''
+    Keeps the methods available to be called indexed by their external name
+
+    Looking up a method is a dictionary lookup. The registration order and
+    the sorted list of names are maintained as methods are registered so
+    neither has to be rebuilt when they are needed.
+
+    ``version`` is incremented whenever a method is registered so that
+    anything derived from the registered methods can be cached until it
+    changes.
+    '''
+
+    def __init__(self):
+        self._methods = {}      # external name -> method
+        self._ordered = []      # methods in registration order
+        self._names = []        # sorted external names
+        self.version = 0
+
+    def register(self, name, method):
+        '''
+        Adds ``method`` under the external ``name``
+
+        Returns ``False`` and leaves the registry untouched if a method
+        is already registered with that name and ``True`` otherwise
+        '''
+        if name in self._methods:
+            return False
+
+        self._methods[name] = method
+        self._ordered.append(method)
+        insort(self._names, name)
+        self.version += 1
+        return True
+
+    def get(self, name, default=None):
+        '''
+        Returns the method registered as ``name`` or ``default``
+        '''
+        try:
+            return self._methods.get(name, default)
+        except TypeError:
+            # unhashable names (eg. a list from a decoded request)
+            return default
+
+    def values(self):
+        '''
+        Returns the registered methods in registration order
+
+        The returned list is the registry's own and must not be modified
+        '''
+        return self._ordered
+
+    def names(self):
+        '''
+        Returns the sorted external names of the registered methods
+
+        The returned list is the registry's own and must not be modified
+        '''
+        return self._names
+
+    def __getitem__(self, name):
+        return self._methods[name]
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._methods)
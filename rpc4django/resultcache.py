@@ -0,0 +1,116 @@
+'''
+Caches the encoded results of methods decorated with
+``@rpcmethod(cache_ttl=...)``
+
+Results are kept in a bounded in-process LRU and, optionally, in a Django
+cache shared between processes. A hit skips both calling the method and
+encoding its result.
+'''
+
+import hashlib
+import threading
+from .utils import LRUCache
+
+
+class ResultCache(object):
+    '''
+    A two tier cache of encoded results
+
+    **Parameters**
+
+    ``max_size``
+      The number of results kept in process
+    ``django_cache``
+      The name of a Django cache (see ``CACHES``) used as the second tier
+      or ``None`` to only cache in process
+    '''
+
+    def __init__(self, max_size=1000, django_cache=None):
+        self.local = LRUCache(max_size)
+        self.django_cache = django_cache
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self._shared = None
+        self._lock = threading.Lock()
+
+    def make_key(self, name, fragment, per_user=False, request=None):
+        '''
+        Returns the cache key of a call to the method ``name``
+
+        ``fragment`` identifies the params of the call. If ``per_user`` is
+        set, the key also identifies the user of ``request``.
+        '''
+        parts = [name, fragment]
+        if per_user:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated():
+                parts.append('user:%s' % user.pk)
+            else:
+                parts.append('anonymous')
+        parts = [part.encode('utf-8') if isinstance(part, unicode) else str(part)
+                 for part in parts]
+        return 'rpc4django:result:%s' % hashlib.sha1('\0'.join(parts)).hexdigest()
+
+    def get(self, key, ttl=None):
+        '''
+        Returns the encoded result stored under ``key`` or ``None``
+
+        A result found in the Django cache is kept in process for ``ttl``
+        seconds.
+        '''
+        encoded_result = self.local.get(key)
+        if encoded_result is not None or self.django_cache is None:
+            return encoded_result
+
+        encoded_result = self._get_shared().get(key)
+        with self._lock:
+            if encoded_result is None:
+                self.shared_misses += 1
+            else:
+                self.shared_hits += 1
+        if encoded_result is not None:
+            self.local.set(key, encoded_result, ttl)
+        return encoded_result
+
+    def set(self, key, encoded_result, ttl):
+        self.local.set(key, encoded_result, ttl)
+        if self.django_cache is not None:
+            self._get_shared().set(key, encoded_result, ttl)
+
+    def lock(self, key, timeout):
+        '''
+        Marks ``key`` as being computed in the Django cache for at most
+        ``timeout`` seconds
+
+        Returns ``False`` if it is already marked by another process and
+        always ``True`` without a Django cache.
+        '''
+        if self.django_cache is None:
+            return True
+        return self._get_shared().add(key + ':lock', 1, timeout)
+
+    def unlock(self, key):
+        if self.django_cache is not None:
+            self._get_shared().delete(key + ':lock')
+
+    def clear(self):
+        '''
+        Forgets the results cached in process
+        '''
+        self.local.clear()
+
+    def stats(self):
+        '''
+        Returns a dict of the hits, misses, evictions and size of the in
+        process tier and the hits and misses of the Django cache tier
+        '''
+        stats = self.local.stats()
+        stats['shared_hits'] = self.shared_hits
+        stats['shared_misses'] = self.shared_misses
+        return stats
+
+    def _get_shared(self):
+        if self._shared is None:
+            from django.core.cache import get_cache
+            self._shared = get_cache(self.django_cache)
+        return self._shared
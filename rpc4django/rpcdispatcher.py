@@ -1,21 +1,52 @@
 '''
-This module contains the classes necessary to handle
+This module contains the classes necessary to handle both
 `JSONRPC <http://json-rpc.org/>`_ and
+`XMLRPC <http://www.xmlrpc.com/>`_ requests.
 It also contains a decorator to mark methods as rpc methods.
 '''
 
+import datetime
+import hashlib
 import inspect
 import platform
 import pydoc
-from rpc4django.exceptions import BadMethodException
+from rpc4django.exceptions import BadMethodException, BadParamsException
 import types
+import xmlrpclib
 from django.contrib.auth import authenticate, login, logout
+from django.utils.importlib import import_module
 from jsonrpcdispatcher import JSONRPCDispatcher, json
+from limits import make_limiter
+from xmlrpcdispatcher import XMLRPCDispatcher
+from registry import MethodRegistry
 
 # this error code is taken from xmlrpc-epi
 # http://xmlrpc-epi.sourceforge.net/specs/rfc.fault_codes.php
 APPLICATION_ERROR = -32500
 
+def _is_int(value):
+    return isinstance(value, (int, long)) and not isinstance(value, bool)
+
+def _is_double(value):
+    return isinstance(value, (int, long, float)) and not isinstance(value, bool)
+
+# checks for the XMLRPC types used in method signatures
+# any other type (eg. object) is not checked
+RPCTYPE_CHECKS = {
+    'int': _is_int,
+    'i4': _is_int,
+    'i8': _is_int,
+    'double': _is_double,
+    'boolean': lambda value: isinstance(value, bool),
+    'string': lambda value: isinstance(value, basestring),
+    'base64': lambda value: isinstance(value, (basestring, xmlrpclib.Binary)),
+    'dateTime.iso8601': lambda value: isinstance(value, (basestring,
+        datetime.datetime, xmlrpclib.DateTime)),
+    'struct': lambda value: isinstance(value, dict),
+    'array': lambda value: isinstance(value, (list, tuple)),
+    'nil': lambda value: value is None,
+}
+
 def rpcmethod(**kwargs):
     '''
     Accepts keyword based arguments that describe the method's rpc aspects
@@ -35,6 +66,46 @@ def rpcmethod(**kwargs):
       the Django permission required to execute this method
     ``login_required``
       the method requires a user to be logged in
+    ``versioned``
+      the result only depends on the params and on the registered methods
+      (eg. introspection). The encoded result is reused until another
+      method is registered. At most :envvar:`RPC4DJANGO_VERSIONED_CACHE_SIZE`
+      results are kept
+    ``cache_ttl``
+      the encoded result is cached for this many seconds and reused for
+      calls with the same params. See :envvar:`RPC4DJANGO_RESULT_CACHE`
+    ``cache_key``
+      a function called with the params of a call which returns the string
+      identifying them in the cache. Defaults to the params encoded as JSON
+      with sorted keys
+    ``cache_per_user``
+      the result is cached separately for each user
+    ``max_body_size``
+      calls with a request body larger than this many bytes are rejected
+      before the method is called
+    ``stream``
+      an iterable result (eg. a list or QuerySet) is streamed to the client
+      as it is encoded. Results which are iterators (eg. generators) are
+      always streamed
+    ``max_concurrency``
+      at most this many calls of the method run at the same time in a
+      process. Calls over the limit fail at once with
+      :class:`OverloadedException <rpc4django.exceptions.OverloadedException>`
+    ``rate``, ``burst``
+      the method is called at most ``rate`` times per second in a process,
+      with bursts of up to ``burst`` calls. Calls over the limit fail at
+      once with ``OverloadedException``
+    ``timeout``
+      calls have a deadline this many seconds after they start, unless the
+      client set an earlier one. See :mod:`rpc4django.deadlines`
+    ``compress_level``
+      the level responses are compressed with (eg. 1 to 9 for gzip) when the
+      client accepts compressed responses. ``0`` never compresses them
+      (eg. for results which are already compressed)
+    ``fields``
+      the names of the fields returned for each model instance when the
+      method returns a QuerySet or model instances. Only these columns
+      are selected. See :mod:`rpc4django.querysets`
 
     **Examples**
 
@@ -44,6 +115,14 @@ def rpcmethod(**kwargs):
         @rpcmethod(name='myns.myFuncName', signature=['int','int'])
         @rpcmethod(permission='add_group')
         @rpcmethod(login_required=True)
+        @rpcmethod(versioned=True)
+        @rpcmethod(cache_ttl=300, cache_per_user=True)
+        @rpcmethod(stream=True)
+        @rpcmethod(max_body_size=4096)
+        @rpcmethod(max_concurrency=4, rate=50, burst=100)
+        @rpcmethod(timeout=5)
+        @rpcmethod(compress_level=1)
+        @rpcmethod(fields=['id', 'title'])
 
     '''
 
@@ -52,6 +131,18 @@ def rpcmethod(**kwargs):
         method.signature = []
         method.permission = None
         method.login_required = False
+        method.versioned = kwargs.get('versioned', False)
+        method.cache_ttl = kwargs.get('cache_ttl', None)
+        method.cache_key = kwargs.get('cache_key', None)
+        method.cache_per_user = kwargs.get('cache_per_user', False)
+        method.stream = kwargs.get('stream', False)
+        method.max_body_size = kwargs.get('max_body_size', None)
+        method.max_concurrency = kwargs.get('max_concurrency', None)
+        method.rate = kwargs.get('rate', None)
+        method.burst = kwargs.get('burst', None)
+        method.timeout = kwargs.get('timeout', None)
+        method.compress_level = kwargs.get('compress_level', None)
+        method.fields = kwargs.get('fields', None)
         method.external_name = getattr(method, '__name__')
 
         method.authentication = kwargs.get('authentication', None)
@@ -72,6 +163,12 @@ def rpcmethod(**kwargs):
         return method
     return set_rpcmethod_info
 
+def is_rpcmethod(obj):
+    '''
+    Returns ``True`` if ``obj`` is callable and has the rpcmethod decorator
+    '''
+    return callable(obj) and getattr(obj, 'is_rpcmethod', False) == True
+
 class RPCMethod:
     '''
     A method available to be called via the rpc dispatcher
@@ -91,6 +188,21 @@ class RPCMethod:
       Any Django permissions required to call this method
     ``login_required``
       The method can only be called by a logged in user
+    ``versioned``, ``cache_ttl``, ``cache_key``, ``cache_per_user``, ``stream``, ``max_body_size``
+      See :meth:`rpc4django.rpcdispatcher.rpcmethod`
+    ``max_concurrency``, ``rate``, ``burst``, ``timeout``, ``compress_level``, ``fields``
+      See :meth:`rpc4django.rpcdispatcher.rpcmethod`
+    ``limiter``
+      The :class:`Limiter <rpc4django.limits.Limiter>` enforcing these
+      limits or ``None``
+    ``accepts_kwargs``
+      The method takes ``**kwargs`` and is passed every keyword argument
+      given to the dispatcher (eg. ``request``). Other methods are only
+      passed the keyword arguments they name as parameters
+    ``source``
+      A ``(module name, attribute name)`` tuple where the method was found
+      when it was registered from a module. See
+      :meth:`RPCDispatcher.get_manifest <rpc4django.rpcdispatcher.RPCDispatcher.get_manifest>`
 
     '''
 
@@ -103,9 +215,10 @@ class RPCMethod:
         self.permission = None
         self.login_required = False
         self.args = []
+        self.source = None
 
-        self.authentication = method.authentication
-        self.authorization = method.authorization
+        self.authentication = getattr(method, 'authentication', None)
+        self.authorization = getattr(method, 'authorization', None)
 
         # set the method name based on @rpcmethod or the passed value
         # default to the actual method name
@@ -128,9 +241,25 @@ class RPCMethod:
         # set the permissions based on the decorator
         self.login_required = getattr(method, 'login_required', self.permission is not None)
 
+        self.versioned = getattr(method, 'versioned', False)
+        self.cache_ttl = getattr(method, 'cache_ttl', None)
+        self.cache_key = getattr(method, 'cache_key', None)
+        self.cache_per_user = getattr(method, 'cache_per_user', False)
+        self.stream = getattr(method, 'stream', False)
+        self.max_body_size = getattr(method, 'max_body_size', None)
+        self.max_concurrency = getattr(method, 'max_concurrency', None)
+        self.rate = getattr(method, 'rate', None)
+        self.burst = getattr(method, 'burst', None)
+        self.timeout = getattr(method, 'timeout', None)
+        self.compress_level = getattr(method, 'compress_level', None)
+        self.fields = getattr(method, 'fields', None)
+        self.limiter = make_limiter(self.name, self.max_concurrency,
+                                    self.rate, self.burst)
+
         # use inspection (reflection) to get the arguments
         args, varargs, keywords, defaults = inspect.getargspec(method)
         self.args = [arg for arg in args if arg != 'self']
+        self.accepts_kwargs = keywords is not None
         self.signature = ['object' for arg in self.args]
         self.signature.insert(0, 'object')
 
@@ -144,6 +273,62 @@ class RPCMethod:
             # of arguments
             self.signature = signature
 
+        # compile what invoke checks so calls do no introspection
+        self._arg_index = dict((arg, i) for i, arg in enumerate(self.args))
+        self._min_args = len(self.args) - len(defaults or ())
+        self._max_args = None if varargs else len(self.args)
+        self._checks = [(i, self.args[i], self.signature[i + 1],
+                         RPCTYPE_CHECKS[self.signature[i + 1]])
+                        for i in range(len(self.args))
+                        if self.signature[i + 1] in RPCTYPE_CHECKS]
+
+    def invoke(self, *params, **kwargs):
+        '''
+        Calls the method after checking the number of ``params`` and their
+        types against the signature
+
+        Raises :class:`BadParamsException <rpc4django.exceptions.BadParamsException>`
+        before calling the method if they do not match.
+
+        RPCMethods are not callable themselves so that templates (eg. the
+        method summary) never call them.
+        '''
+        kwargs = self.check_params(params, kwargs)
+        return self.method(*params, **kwargs)
+
+    def check_params(self, params, kwargs):
+        '''
+        Raises :class:`BadParamsException <rpc4django.exceptions.BadParamsException>`
+        if the number of ``params`` or their types do not match the
+        signature
+
+        Returns the keyword arguments of ``kwargs`` the method is called with
+        '''
+        nparams = len(params)
+
+        if kwargs and not self.accepts_kwargs:
+            # only pass the keyword arguments the method asks for
+            kwargs = dict((key, value) for key, value in kwargs.iteritems()
+                          if self._arg_index.get(key, -1) >= nparams)
+
+        if self._max_args is not None and nparams > self._max_args:
+            raise BadParamsException('%s takes at most %d arguments (%d given)' %
+                                     (self.name, self._max_args, nparams))
+
+        if nparams < self._min_args:
+            missing = [arg for arg in self.args[nparams:self._min_args]
+                       if arg not in kwargs]
+            if missing:
+                raise BadParamsException('%s is missing arguments: %s' %
+                                         (self.name, ', '.join(missing)))
+
+        for i, arg, rpctype, check in self._checks:
+            if i < nparams and not check(params[i]):
+                raise BadParamsException('%s argument %s must be %s' %
+                                         (self.name, arg, rpctype))
+
+        return kwargs
+
     def get_stub(self):
         '''
         Returns JSON for a JSONRPC request for this method
@@ -201,32 +386,121 @@ class RPCDispatcher:
     '''
     Keeps track of the methods available to be called and then
     dispatches method calls to
-    :class:`JSONRPCDispatcher <rpc4django.jsonrpcdispatcher.JSONRPCDispatcher>`
+    :class:`JSONRPCDispatcher <rpc4django.jsonrpcdispatcher.JSONRPCDispatcher>` or
+    :class:`XMLRPCDispatcher <rpc4django.xmlrpcdispatcher.XMLRPCDispatcher>`
 
     Disables RPC introspection methods (eg. ``system.list_methods()`` if
     ``restrict_introspection`` is set to ``True``. Disables out of the box
     authentication if ``restrict_ootb_auth`` is ``True``.
 
+    JSON-RPC 2.0 batches are limited to ``max_batch_size`` calls which run
+    concurrently on ``batch_threads`` threads (``0`` runs them sequentially).
+
+    At most ``versioned_cache_size`` results of the methods decorated with
+    ``@rpcmethod(versioned=True)`` are kept by each protocol.
+
+    JSON is decoded and encoded by ``json_codec``, a
+    :class:`JSONCodec <rpc4django.serialization.JSONCodec>`. By default
+    it uses the fastest installed backend, ``json_encoder`` and compact output.
+
+    The results of methods decorated with ``@rpcmethod(cache_ttl=...)`` are
+    cached by ``result_cache``, a
+    :class:`ResultCache <rpc4django.resultcache.ResultCache>` which by
+    default only caches in process.
+
+    Every call is recorded by ``metrics``, a
+    :class:`Metrics <rpc4django.metrics.Metrics>` instance, if it is passed.
+    They can be read with ``system.stats`` if ``restrict_stats`` is
+    ``False``.
+
+    At most ``max_concurrency`` calls run at the same time, whatever the
+    method. Calls over the limit fail at once with
+    :class:`OverloadedException <rpc4django.exceptions.OverloadedException>`.
+
+    Requests can also be encoded by ``codecs``, a list of binary codecs
+    (eg. :class:`MsgpackCodec <rpc4django.serialization.MsgpackCodec>`).
+    Each one gets a dispatcher like ``jsonrpcdispatcher`` using that codec
+    which shares its methods, caches, metrics and limits. So does the
+    ``xmlrpcdispatcher``, which serves ``text/xml`` requests unless
+    ``restrict_xmlrpc`` is ``True``.
+
+    The responses of calls with an idempotency key are kept and replayed
+    to their retries by ``replay_cache``, a
+    :class:`ReplayCache <rpc4django.idempotency.ReplayCache>`, if it is
+    passed.
+
     **Attributes**
 
     ``url``
       The URL that handles RPC requests (eg. ``/RPC2``)
       This is needed by ``system.describe``.
+    ``registry``
+      A :class:`MethodRegistry <rpc4django.registry.MethodRegistry>` of
+      :class:`RPCMethod<rpc4django.rpcdispatcher.RPCMethod>` instances
+      keyed by their name. It is shared with the ``jsonrpcdispatcher``
     ``rpcmethods``
       A list of :class:`RPCMethod<rpc4django.rpcdispatcher.RPCMethod>` instances
-      available to be called by the dispatcher
+      available to be called by the dispatcher in registration order
     ``jsonrpcdispatcher``
       An instance of :class:`JSONRPCDispatcher <rpc4django.jsonrpcdispatcher.JSONRPCDispatcher>`
       where JSONRPC calls are dispatched to using :meth:`jsondispatch`
+    ``xmlrpcdispatcher``
+      An instance of :class:`XMLRPCDispatcher <rpc4django.xmlrpcdispatcher.XMLRPCDispatcher>`
+      where XMLRPC calls are dispatched to using :meth:`xmldispatch`
+    ``protocols``
+      A dict of the dispatchers of JSON, XMLRPC and of every codec by content type
+      (see :meth:`get_protocol`)
+    ``metrics``
+      The :class:`Metrics <rpc4django.metrics.Metrics>` recording the calls
+      or ``None``
 
     '''
     
     def __init__(self, url='', apps=[], restrict_introspection=False,
-            restrict_ootb_auth=True, json_encoder=None):
+            restrict_ootb_auth=True, json_encoder=None,
+            max_batch_size=None, batch_threads=None, json_codec=None,
+            result_cache=None, metrics=None, restrict_stats=True,
+            max_concurrency=None, codecs=None, restrict_xmlrpc=False,
+            replay_cache=None, versioned_cache_size=None):
         version = platform.python_version_tuple()
         self.url = url
-        self.rpcmethods = []        # a list of RPCMethod objects
-        self.jsonrpcdispatcher = JSONRPCDispatcher(json_encoder)
+        self.registry = MethodRegistry()
+        self._introspection = {}
+        # a list of RPCMethod objects kept up to date by the registry
+        self.rpcmethods = self.registry.values()
+        self.jsonrpcdispatcher = JSONRPCDispatcher(json_encoder, self.registry,
+                                                   self.check_request_permission,
+                                                   json_codec, result_cache,
+                                                   metrics,
+                                                   make_limiter('', max_concurrency),
+                                                   replay_cache)
+        self.xmlrpcdispatcher = XMLRPCDispatcher(self.registry,
+                                                 self.check_request_permission, None,
+                                                 self.jsonrpcdispatcher.result_cache,
+                                                 metrics, self.jsonrpcdispatcher.limiter,
+                                                 replay_cache)
+        self.metrics = metrics
+
+        protocols = [self.jsonrpcdispatcher, self.xmlrpcdispatcher]
+        for codec in codecs or []:
+            protocols.append(JSONRPCDispatcher(json_encoder, self.registry,
+                                               self.check_request_permission, codec,
+                                               self.jsonrpcdispatcher.result_cache,
+                                               metrics, self.jsonrpcdispatcher.limiter,
+                                               replay_cache))
+
+        self.protocols = {}
+        for protocol in protocols:
+            if max_batch_size is not None:
+                protocol.MAX_BATCH_SIZE = max_batch_size
+            if batch_threads is not None:
+                protocol.BATCH_THREADS = batch_threads
+            if versioned_cache_size is not None:
+                protocol.VERSIONED_CACHE_SIZE = versioned_cache_size
+            if protocol is self.xmlrpcdispatcher and restrict_xmlrpc:
+                continue
+            for content_type in protocol.codec.content_types:
+                self.protocols[content_type] = protocol
 
         if not restrict_introspection:
             self.register_method(self.system_listmethods)
@@ -234,6 +508,9 @@ class RPCDispatcher:
             self.register_method(self.system_methodsignature)
             self.register_method(self.system_describe)
 
+        if metrics is not None and not restrict_stats:
+            self.register_method(self.system_stats)
+
         if not restrict_ootb_auth:
             self.register_method(self.system_login)
             self.register_method(self.system_logout)
@@ -241,44 +518,101 @@ class RPCDispatcher:
         self.register_rpcmethods(apps)
 
 
-    def check_request_permission(self, request):
+    def get_protocol(self, content_type):
+        '''
+        Returns the dispatcher of the requests of ``content_type`` (eg. the
+        ``Content-Type`` header) or ``None``
+        '''
+        media_type = (content_type or '').split(';')[0].strip().lower()
+        return self.protocols.get(media_type)
+
+
+    def check_request_permission(self, request, rpc_request=None, authenticated=None):
         '''
         Checks whether this user has permission to call a particular method
         This method does not check method call validity. That is done later
 
+        It is called by the JSONRPC and XMLRPC dispatchers before every
+        call, including every call of a batch or multicall.
+
         **Parameters**
 
         - ``request`` - a django HttpRequest object
+        - ``rpc_request`` - the already parsed
+          :class:`JSONRPCRequest <rpc4django.jsonrpcdispatcher.JSONRPCRequest>`.
+          If it is not passed, the method name is decoded from the request body
+        - ``authenticated`` - a set of the authentication callables already
+          applied to ``request``. They are not applied again and the
+          authentication done by this call is added to it
 
         Returns ``False`` if permission is denied and ``True`` otherwise
         '''
-        methods = self.list_methods()
-        method_name = self.get_method_name(request.raw_post_data) # TODO: put it to json dispatcher
+        if rpc_request is not None:
+            method_name = rpc_request.method
+        else:
+            method_name = self.get_method_name(request.raw_post_data)
 
-        for method in methods:
-            if method.name != method_name:
-                continue
+        method = self.registry.get(method_name)
+        if method is None:
+            # TODO raise wrong method
+            return None
 
-            if method.authentication:
+        if method.authentication:
+            if authenticated is None:
                 method.authentication(request)
+            elif method.authentication not in authenticated:
+                method.authentication(request)
+                authenticated.add(method.authentication)
 
-            if method.authorization:
-                method.authorization(request)
+        if method.authorization:
+            method.authorization(request)
 
-            return True
+        return True
 
-        # TODO raise wrong method
 
+    def _memoized(self, name, build):
+        # introspection results are rebuilt only when the registry changes
+        version, value = self._introspection.get(name, (None, None))
+        if version != self.registry.version:
+            value = build()
+            self._introspection[name] = (self.registry.version, value)
+        return value
 
-    @rpcmethod(name='system.describe', signature=['struct'])
+    def fingerprint(self):
+        '''
+        Returns a hash of the names, arguments, signatures and help of the
+        registered methods
+
+        Unlike ``registry.version``, which counts the registrations of this
+        process, it changes when a method is documented differently even if
+        as many methods are registered, so it can key what is shared between
+        processes and deploys (eg. the method summary).
+        '''
+
+        return self._memoized('fingerprint', self._fingerprint)
+
+    def _fingerprint(self):
+        digest = hashlib.sha1()
+        for name in self.registry.names():
+            method = self.registry[name]
+            digest.update(repr((name, method.args, method.signature, method.help)))
+        return digest.hexdigest()
+
+    @rpcmethod(name='system.describe', signature=['struct'], versioned=True)
     def system_describe(self, **kwargs):
         '''
         Returns a simple method description of the methods supported
+
+        ``registryVersion`` changes whenever the supported methods change
         '''
 
+        return self._memoized('describe', self._describe)
+
+    def _describe(self):
         description = {}
         description['serviceType'] = 'RPC4Django JSONRPC'
-        description['serviceURL'] = self.url,
+        description['serviceURL'] = self.url
+        description['registryVersion'] = self.registry.version
         description['methods'] = [{'name': method.name,
                                    'summary': method.help,
                                    'params': method.get_params(),
@@ -287,40 +621,47 @@ class RPCDispatcher:
 
         return description
 
-    @rpcmethod(name='system.listMethods', signature=['array'])
+    @rpcmethod(name='system.listMethods', signature=['array'], versioned=True)
     def system_listmethods(self, **kwargs):
         '''
         Returns a list of supported methods
         '''
 
-        methods = [method.name for method in self.rpcmethods]
-        methods.sort()
-        return methods
+        return self._memoized('listMethods', lambda: list(self.registry.names()))
 
-    @rpcmethod(name='system.methodHelp', signature=['string', 'string'])
+    @rpcmethod(name='system.methodHelp', signature=['string', 'string'], versioned=True)
     def system_methodhelp(self, method_name, **kwargs):
         '''
         Returns documentation for a specified method
         '''
 
-        for method in self.rpcmethods:
-            if method.name == method_name:
-                return method.help
+        method = self.registry.get(method_name)
+        if method is not None:
+            return method.help
 
         raise BadMethodException('Method %s not registered here' % method_name)
 
-    @rpcmethod(name='system.methodSignature', signature=['array', 'string'])
+    @rpcmethod(name='system.methodSignature', signature=['array', 'string'], versioned=True)
     def system_methodsignature(self, method_name, **kwargs):
         '''
         Returns the signature for a specified method
         '''
 
-        for method in self.rpcmethods:
-            if method.name == method_name:
-                return method.signature
+        method = self.registry.get(method_name)
+        if method is not None:
+            return method.signature
 
         raise BadMethodException('Method %s not registered here' % method_name)
 
+    @rpcmethod(name='system.stats', signature=['struct'])
+    def system_stats(self, **kwargs):
+        '''
+        Returns the number of calls, the errors by code and the latency,
+        request size and response size histograms of each method
+        '''
+
+        return self.metrics.collect()
+
     @rpcmethod(name='system.login', signature=['boolean', 'string', 'string'])
     def system_login(self, username, password, **kwargs):
         '''
@@ -367,17 +708,111 @@ class RPCDispatcher:
 
             for obj in dir(app):
                 method = getattr(app, obj)
-                if callable(method) and \
-                   hasattr(method, 'is_rpcmethod') and \
-                   method.is_rpcmethod == True:
+                if is_rpcmethod(method):
                     # if this method is callable and it has the rpcmethod
                     # decorator, add it to the dispatcher
-                    self.register_method(method, method.external_name)
+                    self._register_from_module(method, appname, obj)
                 elif isinstance(method, types.ModuleType):
                     # if this is not a method and instead a sub-module,
                     # scan the module for methods with @rpcmethod
                     self.register_rpcmethods(["%s.%s" % (appname, obj)])
 
+    def register_rpcmodules(self, modules):
+        '''
+        Adds the methods with the rpcmethod decorator defined in or imported
+        into each of the listed modules to the methods callable via RPC
+
+        Unlike :meth:`register_rpcmethods` only the listed modules are
+        imported and sub-modules are not scanned. A module which cannot be
+        imported raises ``ImportError``.
+        '''
+
+        for modname in modules:
+            module = import_module(modname)
+            for obj in dir(module):
+                method = getattr(module, obj)
+                if is_rpcmethod(method):
+                    self._register_from_module(method, modname, obj)
+
+    def get_manifest(self):
+        '''
+        Returns a manifest of the methods that were registered from modules
+        by :meth:`register_rpcmethods`, :meth:`register_rpcmodules` or
+        :meth:`register_manifest`
+
+        The manifest is a JSON serializable dict which can be written once
+        (see the ``rpc4django_manifest`` management command) and loaded
+        later by :meth:`register_manifest` without scanning any modules.
+        '''
+
+        return {
+            'methods': [list(method.source) for method in self.rpcmethods
+                        if method.source is not None],
+        }
+
+    def register_manifest(self, manifest):
+        '''
+        Registers the methods listed in a manifest returned by
+        :meth:`get_manifest`. Only the modules of the listed methods are
+        imported
+        '''
+
+        for modname, obj in manifest['methods']:
+            method = getattr(import_module(modname), obj)
+            if not is_rpcmethod(method):
+                raise ValueError('%s.%s is not an rpcmethod' % (modname, obj))
+            self._register_from_module(method, modname, obj)
+
+    def load_manifest(self, path):
+        '''
+        Registers the methods listed in the JSON manifest file at ``path``
+        '''
+
+        manifest_file = open(path)
+        try:
+            manifest = json.load(manifest_file)
+        finally:
+            manifest_file.close()
+        self.register_manifest(manifest)
+
+    def write_manifest(self, path):
+        '''
+        Writes the manifest of the registered methods to ``path`` as JSON
+        '''
+
+        manifest_file = open(path, 'w')
+        try:
+            json.dump(self.get_manifest(), manifest_file, indent=2)
+        finally:
+            manifest_file.close()
+
+    def _register_from_module(self, method, modname, obj):
+        meth = self.register_method(method, method.external_name)
+        if meth is not None:
+            meth.source = (modname, obj)
+
+
+    def jsondispatch(self, raw_post_data, **kwargs):
+        '''
+        Sends the JSONRPC request (or batch) to the JSONRPC dispatcher
+        which checks the permissions and calls the methods
+
+        Returns the JSON encoded response or, if the result is streamed,
+        an iterator of its chunks (see
+        :meth:`JSONRPCDispatcher.dispatch <rpc4django.jsonrpcdispatcher.JSONRPCDispatcher.dispatch>`)
+        '''
+        return self.jsonrpcdispatcher.dispatch(raw_post_data, **kwargs)
+
+    def xmldispatch(self, raw_post_data, **kwargs):
+        '''
+        Sends the XMLRPC request (or ``system.multicall``) to the XMLRPC
+        dispatcher which checks the permissions and calls the methods
+
+        Returns the XML encoded response or, if the result is streamed,
+        an iterator of its chunks (see
+        :meth:`XMLRPCDispatcher.dispatch <rpc4django.xmlrpcdispatcher.XMLRPCDispatcher.dispatch>`)
+        '''
+        return self.xmlrpcdispatcher.dispatch(raw_post_data, **kwargs)
 
     def get_method_name(self, raw_post_data):
         '''
@@ -403,8 +838,9 @@ class RPCDispatcher:
 
     def register_method(self, method, name=None, signature=None, helpmsg=None):
         '''
-        Instantiates an RPCMethod object and adds it to ``rpcmethods``
-        so that it can be called by RPC requests
+        Instantiates an RPCMethod object and adds it to the ``registry``
+        so that it can be called by RPC requests. A method registered
+        under a name which is already taken is ignored
 
         **Parameters**
 
@@ -420,11 +856,11 @@ class RPCDispatcher:
           The "help" message displayed by introspection functions asking about
           the method
 
+        Returns the new RPCMethod or ``None`` if the name was already taken
         '''
 
         meth = RPCMethod(method, name, signature, helpmsg)
-
-        if meth.name not in self.system_listmethods():
-            self.jsonrpcdispatcher.register_function(method, meth.name)
-            self.rpcmethods.append(meth)
+        if self.registry.register(meth.name, meth):
+            return meth
+        return None
 
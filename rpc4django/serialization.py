@@ -0,0 +1,532 @@
+'''
+Codecs used by the dispatchers to decode requests and encode responses
+
+Requests are JSON unless they are sent with the content type of one of
+the binary codecs (:envvar:`RPC4DJANGO_CODECS`):
+
+- MessagePack_ (``application/msgpack``) with msgpack-python (optional)
+- CBOR_ (``application/cbor``) with cbor2 (optional)
+
+The binary codecs carry the same calls, results and errors as JSON. Binary
+data needs no base64: in Python 2 ``str`` values are encoded as binary
+strings and ``unicode`` values as text.
+
+The JSON codec can use any of several JSON backends. By default the
+fastest installed backend is used:
+
+- rapidjson_ (C++, optional)
+- simplejson_ with its C speedups (optional)
+- the json module from the standard library
+
+Whatever the backend, the ``json_encoder`` class
+(:envvar:`RPC4DJANGO_JSON_ENCODER`) is used for values the backend cannot
+serialize itself.
+
+.. _MessagePack: http://msgpack.org/
+.. _CBOR: http://cbor.io/
+.. _rapidjson: https://pypi.python.org/pypi/python-rapidjson
+.. _simplejson: https://pypi.python.org/pypi/simplejson
+'''
+
+import re
+import struct
+
+
+class StdlibBackend(object):
+    '''
+    JSON backend using the json module of the standard library
+    '''
+
+    name = 'json'
+
+    def __init__(self):
+        import json as module
+        self.module = module
+
+    def loads(self, data):
+        return self.module.loads(data)
+
+    def dumps(self, obj, encoder=None, indent=None, separators=None):
+        return self.module.dumps(obj, cls=encoder, indent=indent,
+                                 separators=separators)
+
+
+class SimplejsonBackend(StdlibBackend):
+    '''
+    JSON backend using simplejson which is faster than the standard
+    library when its C speedups are compiled
+    '''
+
+    name = 'simplejson'
+
+    def __init__(self):
+        import simplejson as module
+        self.module = module
+
+
+class RapidjsonBackend(object):
+    '''
+    JSON backend using python-rapidjson
+
+    rapidjson only takes a ``default`` hook so the ``default`` method
+    of the encoder is used for the values it cannot serialize.
+    '''
+
+    name = 'rapidjson'
+
+    def __init__(self):
+        import rapidjson as module
+        self.module = module
+
+    def loads(self, data):
+        try:
+            return self.module.loads(data)
+        except self.module.JSONDecodeError as e:
+            # the dispatchers expect decoding errors as ValueError
+            raise ValueError(str(e))
+
+    def dumps(self, obj, encoder=None, indent=None, separators=None):
+        default = encoder().default if encoder is not None else None
+        return self.module.dumps(obj, default=default, indent=indent,
+                                 ensure_ascii=True)
+
+
+# backends by name in order of preference
+JSON_BACKENDS = (
+    ('rapidjson', RapidjsonBackend),
+    ('simplejson', SimplejsonBackend),
+    ('json', StdlibBackend),
+)
+
+
+def get_json_backend(name='auto'):
+    '''
+    Returns an instance of the JSON backend called ``name``
+
+    ``auto`` returns the first backend in ``JSON_BACKENDS`` which
+    can be imported. Raises ``ImportError`` if the named backend is
+    not installed and ``ValueError`` if it is unknown.
+    '''
+    for backend_name, backend in JSON_BACKENDS:
+        if name == 'auto':
+            try:
+                return backend()
+            except ImportError:
+                continue
+        elif name == backend_name:
+            return backend()
+
+    raise ValueError('Unknown JSON backend %s' % name)
+
+
+class JSONCodec(object):
+    '''
+    Encodes and decodes JSON using a JSON backend
+
+    **Parameters**
+
+    ``backend``
+      The name of the backend (see :func:`get_json_backend`)
+    ``encoder``
+      A subclass of ``json.JSONEncoder`` used to serialize values the
+      backend does not know about
+    ``indent``
+      Indent the output by this many characters. ``None`` gives the most
+      compact output without whitespace between items
+    '''
+
+    name = 'json'
+    content_type = 'application/json'
+    content_types = ('application/json',)
+
+    # a result can be encoded and sent a few items at a time
+    streams = True
+
+    def __init__(self, backend='auto', encoder=None, indent=None):
+        self.backend = get_json_backend(backend)
+        self.encoder = encoder
+        self.indent = indent
+        if indent is None:
+            self.separators = (',', ':')
+        else:
+            self.separators = (',', ': ')
+
+    def loads(self, data):
+        return self.backend.loads(data)
+
+    def dumps(self, obj):
+        return self.backend.dumps(obj, self.encoder, self.indent,
+                                  self.separators)
+
+    def check_limits(self, data, max_depth=None, max_elements=None):
+        '''
+        Raises ``ValueError`` if ``data`` is too deep or too long before it
+        is decoded (see :func:`check_json_limits`)
+        '''
+        check_json_limits(data, max_depth, max_elements)
+
+    def encode_response(self, encoded_id, encoded_result):
+        '''
+        Returns the response of a successful call from its encoded id and
+        result
+        '''
+        return '{"id":%s,"result":%s,"error":null}' % (encoded_id, encoded_result)
+
+    def encode_array(self, encoded_items):
+        '''
+        Returns an Array of items which are already encoded
+        '''
+        return '[' + ','.join(encoded_items) + ']'
+
+
+class MsgpackCodec(object):
+    '''
+    Encodes and decodes MessagePack with msgpack-python
+
+    ``encoder`` is a ``json.JSONEncoder`` whose ``default`` method is used
+    for the values msgpack cannot pack (eg. dates).
+    '''
+
+    name = 'msgpack'
+    content_type = 'application/msgpack'
+    content_types = ('application/msgpack', 'application/x-msgpack')
+    streams = False
+
+    def __init__(self, encoder=None):
+        import msgpack as module
+        self.module = module
+        self.default = encoder().default if encoder is not None else None
+        # the parts of a response around its id and result
+        self._head = '\x83' + self.dumps(u'id')
+        self._result = self.dumps(u'result')
+        self._tail = self.dumps(u'error') + self.dumps(None)
+
+    def loads(self, data):
+        try:
+            return self.module.unpackb(data, raw=False)
+        except (ValueError, TypeError) as e:
+            # the dispatchers expect decoding errors as ValueError
+            raise ValueError(str(e))
+
+    def dumps(self, obj):
+        return self.module.packb(obj, use_bin_type=True, default=self.default)
+
+    def check_limits(self, data, max_depth=None, max_elements=None):
+        '''
+        Raises ``ValueError`` if ``data`` is too deep or has too many
+        elements before it is decoded (see :func:`check_msgpack_limits`)
+        '''
+        check_msgpack_limits(data, max_depth, max_elements)
+
+    def encode_response(self, encoded_id, encoded_result):
+        return self._head + encoded_id + self._result + encoded_result + self._tail
+
+    def encode_array(self, encoded_items):
+        return self.module.Packer().pack_array_header(len(encoded_items)) + \
+            ''.join(encoded_items)
+
+
+def _cbor_array_head(length):
+    if length < 24:
+        return chr(0x80 | length)
+    elif length < 0x100:
+        return '\x98' + chr(length)
+    elif length < 0x10000:
+        return '\x99' + struct.pack('>H', length)
+    return '\x9a' + struct.pack('>I', length)
+
+
+class CBORCodec(object):
+    '''
+    Encodes and decodes CBOR with cbor2
+
+    ``encoder`` is a ``json.JSONEncoder`` whose ``default`` method is used
+    for the values cbor2 cannot encode. Dates and decimals are encoded as
+    CBOR tags, naive datetimes cannot be encoded.
+    '''
+
+    name = 'cbor'
+    content_type = 'application/cbor'
+    content_types = ('application/cbor',)
+    streams = False
+
+    def __init__(self, encoder=None):
+        import cbor2 as module
+        self.module = module
+        self.default = None
+        if encoder is not None:
+            default = encoder().default
+            self.default = lambda cbor_encoder, value: cbor_encoder.encode(default(value))
+        # the parts of a response around its id and result
+        self._head = '\xa3' + self.dumps(u'id')
+        self._result = self.dumps(u'result')
+        self._tail = self.dumps(u'error') + self.dumps(None)
+
+    def loads(self, data):
+        try:
+            return self.module.loads(data)
+        except (ValueError, TypeError, self.module.CBORDecodeError) as e:
+            raise ValueError(str(e))
+
+    def dumps(self, obj):
+        return self.module.dumps(obj, default=self.default)
+
+    def check_limits(self, data, max_depth=None, max_elements=None):
+        '''
+        Raises ``ValueError`` if ``data`` is too deep or has too many
+        elements before it is decoded (see :func:`check_cbor_limits`)
+        '''
+        check_cbor_limits(data, max_depth, max_elements)
+
+    def encode_response(self, encoded_id, encoded_result):
+        return self._head + encoded_id + self._result + encoded_result + self._tail
+
+    def encode_array(self, encoded_items):
+        return _cbor_array_head(len(encoded_items)) + ''.join(encoded_items)
+
+
+# the codecs of other content types than JSON by name
+CODECS = (
+    ('msgpack', MsgpackCodec),
+    ('cbor', CBORCodec),
+)
+
+
+def get_codecs(names=None, encoder=None):
+    '''
+    Returns the codecs of :data:`CODECS` called ``names`` (all by default)
+    which can be imported
+
+    Raises ``ValueError`` if a name is unknown.
+    '''
+    known = dict(CODECS)
+    for name in names or ():
+        if name not in known:
+            raise ValueError('Unknown codec %s' % name)
+
+    codecs = []
+    for name, codec in CODECS:
+        if names is not None and name not in names:
+            continue
+        try:
+            codecs.append(codec(encoder))
+        except ImportError:
+            continue
+    return codecs
+
+
+# matches a string, used when strings have to be removed one by one
+_JSON_STRINGS = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"')
+
+# keeps the brackets (as []), commas and quotes of a document
+_STRUCTURE = ''.join(chr(i) for i in range(256)).replace('{', '[').replace('}', ']')
+_NOT_STRUCTURE = ''.join(chr(i) for i in range(256) if chr(i) not in '[]{},"')
+
+
+def _structure(data):
+    # returns the brackets and commas of data which are not in strings
+    if '\\"' not in data:
+        structure = data.translate(_STRUCTURE, _NOT_STRUCTURE).replace('""', '')
+        if '"' not in structure:
+            # a string holding a bracket or comma would leave an odd
+            # number of quotes between two brackets or commas
+            return structure
+        data = ''.join(data.split('"')[::2])
+    else:
+        # strings with escaped quotes
+        data = _JSON_STRINGS.sub('', data)
+    return data.translate(_STRUCTURE, _NOT_STRUCTURE)
+
+
+def check_json_limits(data, max_depth=None, max_elements=None):
+    '''
+    Raises ``ValueError`` if the JSON document ``data`` nests Arrays and
+    Objects deeper than ``max_depth`` or has more than ``max_elements``
+    elements (counted by the commas separating them)
+
+    ``data`` is checked without being decoded. Counting its brackets and
+    commas is enough for most documents, otherwise its structure outside
+    of strings is extracted and the innermost brackets are stripped once
+    per level, all by string methods implemented in C.
+    '''
+    if isinstance(data, unicode):
+        data = data.encode('utf-8')
+
+    check_elements = max_elements is not None and data.count(',') >= max_elements
+    check_depth = max_depth is not None and \
+        data.count('[') + data.count('{') > max_depth
+    if not (check_elements or check_depth):
+        return
+
+    structure = _structure(data)
+
+    if check_elements and structure.count(',') >= max_elements:
+        raise ValueError('JSON has more than %d elements' % max_elements)
+
+    if check_depth:
+        brackets = structure.replace(',', '')
+        # every pass removes the Arrays and Objects which are empty so
+        # far, that is the innermost level of each branch
+        for level in xrange(max_depth):
+            if not brackets:
+                return
+            brackets = brackets.replace('[]', '')
+        if brackets:
+            raise ValueError('JSON is nested deeper than %d levels' % max_depth)
+
+
+def _check_binary_limits(data, max_depth, max_elements, read_item):
+    # walks the headers of the items of a binary document without decoding
+    # them. read_item(data, pos) returns the position of the next item, the
+    # number of items the item at pos holds (twice its entries for a Map,
+    # -1 until a break for an indefinite length, None for a break) and its
+    # number of elements
+    size = len(data)
+    # every element and every level takes at least a byte
+    if (max_depth is None or size <= max_depth) and \
+            (max_elements is None or size <= max_elements):
+        return
+
+    # the number of items left in each open Array or Map, the document
+    # itself is one item
+    stack = [1]
+    elements = 0
+    pos = 0
+    try:
+        while stack:
+            if stack[-1] == 0:
+                stack.pop()
+                continue
+            if pos >= size:
+                # a truncated document is reported by the decoder
+                return
+            pos, items, count = read_item(data, pos)
+            if items is None:
+                if stack[-1] > 0:
+                    return
+                stack.pop()
+                continue
+            if stack[-1] > 0:
+                stack[-1] -= 1
+            else:
+                # an item of an Array or Map of indefinite length
+                count += 1
+
+            if count:
+                elements += count
+                if max_elements is not None and elements > max_elements:
+                    raise ValueError('Request has more than %d elements' % max_elements)
+            if items:
+                stack.append(items)
+                if max_depth is not None and len(stack) - 1 > max_depth:
+                    raise ValueError('Request is nested deeper than %d levels' % max_depth)
+    except (KeyError, IndexError, struct.error):
+        # invalid documents are reported by the decoder
+        return
+
+
+# the number of bytes following the type byte of fixed size msgpack types
+_MSGPACK_FIXED = {
+    0xc0: 0, 0xc2: 0, 0xc3: 0, 0xca: 4, 0xcb: 8,
+    0xcc: 1, 0xcd: 2, 0xce: 4, 0xcf: 8, 0xd0: 1, 0xd1: 2, 0xd2: 4, 0xd3: 8,
+    0xd4: 2, 0xd5: 3, 0xd6: 5, 0xd7: 9, 0xd8: 17,
+}
+# the length format and extra bytes (the type of an ext) of sized types
+_MSGPACK_SIZED = {
+    0xc4: ('>B', 1, 0), 0xc5: ('>H', 2, 0), 0xc6: ('>I', 4, 0),
+    0xc7: ('>B', 1, 1), 0xc8: ('>H', 2, 1), 0xc9: ('>I', 4, 1),
+    0xd9: ('>B', 1, 0), 0xda: ('>H', 2, 0), 0xdb: ('>I', 4, 0),
+}
+# the length format and items per element of Arrays and Maps
+_MSGPACK_CONTAINERS = {
+    0xdc: ('>H', 2, 1), 0xdd: ('>I', 4, 1), 0xde: ('>H', 2, 2), 0xdf: ('>I', 4, 2),
+}
+
+
+def _msgpack_item(data, pos):
+    byte = ord(data[pos])
+    pos += 1
+    if byte <= 0x7f or byte >= 0xe0:
+        return pos, 0, 0
+    if byte <= 0x8f:
+        return pos, 2 * (byte & 0x0f), byte & 0x0f
+    if byte <= 0x9f:
+        return pos, byte & 0x0f, byte & 0x0f
+    if byte <= 0xbf:
+        return pos + (byte & 0x1f), 0, 0
+    if byte in _MSGPACK_FIXED:
+        return pos + _MSGPACK_FIXED[byte], 0, 0
+    if byte in _MSGPACK_SIZED:
+        fmt, size, extra = _MSGPACK_SIZED[byte]
+        return pos + size + extra + struct.unpack_from(fmt, data, pos)[0], 0, 0
+    fmt, size, per_element = _MSGPACK_CONTAINERS[byte]
+    length = struct.unpack_from(fmt, data, pos)[0]
+    return pos + size, per_element * length, length
+
+
+def check_msgpack_limits(data, max_depth=None, max_elements=None):
+    '''
+    Raises ``ValueError`` if the MessagePack document ``data`` nests Arrays
+    and Maps deeper than ``max_depth`` or has more than ``max_elements``
+    elements (the items of its Arrays and entries of its Maps)
+
+    Only the headers of the items are read, nothing is decoded.
+    '''
+    _check_binary_limits(data, max_depth, max_elements, _msgpack_item)
+
+
+_CBOR_ARGUMENTS = {25: ('>H', 2), 26: ('>I', 4), 27: ('>Q', 8)}
+
+
+def _cbor_argument(data, pos, info):
+    if info < 24:
+        return pos, info
+    if info == 24:
+        return pos + 1, ord(data[pos])
+    fmt, size = _CBOR_ARGUMENTS[info]
+    return pos + size, struct.unpack_from(fmt, data, pos)[0]
+
+
+def _cbor_item(data, pos):
+    while True:
+        byte = ord(data[pos])
+        pos += 1
+        major, info = byte >> 5, byte & 0x1f
+        if major != 6:
+            break
+        # a tag is followed by the item it tags
+        pos, tag = _cbor_argument(data, pos, info)
+
+    if info == 31:
+        if major == 7:
+            return pos, None, 0
+        if major == 4 or major == 5:
+            return pos, -1, 0
+        if major == 2 or major == 3:
+            # the chunks of a string end with a break
+            while ord(data[pos]) != 0xff:
+                pos = _cbor_item(data, pos)[0]
+            return pos + 1, 0, 0
+        raise KeyError(byte)
+
+    pos, value = _cbor_argument(data, pos, info)
+    if major == 2 or major == 3:
+        return pos + value, 0, 0
+    if major == 4:
+        return pos, value, value
+    if major == 5:
+        return pos, 2 * value, value
+    # integers, simple values and floats
+    return pos, 0, 0
+
+
+def check_cbor_limits(data, max_depth=None, max_elements=None):
+    '''
+    Raises ``ValueError`` if the CBOR document ``data`` nests Arrays and
+    Maps deeper than ``max_depth`` or has more than ``max_elements``
+    elements (the items of its Arrays and entries of its Maps, every item
+    of those of indefinite length)
+
+    Only the headers of the items are read, nothing is decoded.
+    '''
+    _check_binary_limits(data, max_depth, max_elements, _cbor_item)
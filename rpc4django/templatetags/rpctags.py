@@ -9,11 +9,15 @@ import logging
 from django import template
 from django.utils.safestring import mark_safe
 from django.conf import settings
+from rpc4django.utils import LRUCache
 
 logger = logging.getLogger('rpc4django')
 
 RESTRICT_REST = getattr(settings, 'RPC4DJANGO_RESTRICT_REST', False)
 
+# docstrings rarely change so their HTML is only rendered once
+_rest_cache = LRUCache(max_size=2000)
+
 # all custom tag libraries must have this
 register = template.Library()
 
@@ -23,16 +27,25 @@ def resttext(text):
     to import docutils or fails for any other reason
     
     If :envvar:`RPC4DJANGO_RESTRICT_REST` is ``True``, just return *text*
+
+    The result for each *text* is cached in memory
     '''
     
+    if RESTRICT_REST:
+        return text
+
+    html = _rest_cache.get(text)
+    if html is None:
+        html = _render_rest(text)
+        _rest_cache.set(text, html)
+    return html
+
+def _render_rest(text):
     overrides = {
         'inital_header_level' : 3,
         'report_level': 5,   # 0 reports everything, 5 reports nothing
     }
     
-    if RESTRICT_REST:
-        return text
-    
     try:
         from docutils.core import publish_parts
         parts = publish_parts(source=text, writer_name='html', \
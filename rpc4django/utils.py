@@ -1,9 +1,16 @@
 import httplib 
+import threading
+import time
 import xmlrpclib
+from collections import OrderedDict
 
 class CookieTransport(xmlrpclib.SafeTransport):
     """
     Overides request add cookies from previous request.
+
+    This transport opens a new connection for every XMLRPC request.
+    JSONRPC clients should use :class:`rpc4django.client.Client` which
+    keeps its connections open.
     """
 
     def __init__(self):
@@ -45,3 +52,125 @@ class CookieTransport(xmlrpclib.SafeTransport):
 
         return self.parse_response(h.getfile())
 
+
+class LRUCache(object):
+    """
+    A thread safe cache holding at most ``max_size`` entries.
+
+    The least recently used entries are evicted first and entries expire
+    ``ttl`` seconds after they are set (``None`` never expires them).
+    Hits, misses and evictions are counted.
+    """
+
+    def __init__(self, max_size=1000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            if expires is not None and expires < time.time():
+                self.misses += 1
+                return default
+
+            # most recently used entries are kept at the end
+            self._data[key] = (value, expires)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        expires = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        Returns a dict of the hits, misses, evictions and current size
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+        }
+
+    def __len__(self):
+        return len(self._data)
+
+
+def close_iterator(iterator):
+    """
+    Closes ``iterator`` if it can be closed (eg. a generator)
+    """
+    close = getattr(iterator, 'close', None)
+    if close is not None:
+        close()
+
+
+class ClosingIterator(object):
+    """
+    Iterates over ``chunks`` and calls each of ``callbacks`` exactly once
+    when the chunks are exhausted, raise or :meth:`close` is called
+
+    Unlike the ``finally`` of a generator, the callbacks also run if the
+    iteration never started, eg. when the WSGI server closes a streamed
+    response it could not send. ``close`` closes ``chunks`` as well.
+    """
+
+    def __init__(self, chunks, *callbacks):
+        self._chunks = iter(chunks)
+        self._callbacks = list(callbacks)
+        self._lock = threading.Lock()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        try:
+            return self._chunks.next()
+        except:
+            self.close()
+            raise
+
+    def close(self):
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, []
+        if not callbacks:
+            return
+        try:
+            close_iterator(self._chunks)
+        finally:
+            self._run(callbacks)
+
+    def _run(self, callbacks):
+        # every callback runs even if one raises
+        try:
+            callbacks[0]()
+        finally:
+            if len(callbacks) > 1:
+                self._run(callbacks[1:])
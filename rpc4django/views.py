@@ -11,17 +11,34 @@ The main entry point for RPC4Django. Usually, the user simply puts
 
 '''
 
+import hashlib
 import logging
-import traceback
-from django.http import HttpResponse, Http404
-from django.shortcuts import render_to_response
+import os
+import tempfile
+import threading
+from django.http import HttpResponse, HttpResponseNotModified, Http404
+try:
+    from django.http import StreamingHttpResponse
+except ImportError:
+    # before Django 1.5 an HttpResponse streams an iterator it is given
+    StreamingHttpResponse = HttpResponse
+from django.template.loader import render_to_string
 from django.conf import settings
 from django.core.urlresolvers import reverse, NoReverseMatch, get_mod_func
 from django.utils.importlib import import_module
 from .exceptions import UnknownProcessingError, RpcException, BadDataException
 from rpcdispatcher import RPCDispatcher
+from logutils import RequestLogger, error_limiter
 from jsonrpcdispatcher import json
+from serialization import JSONCodec, get_codecs
+from resultcache import ResultCache
+from metrics import Metrics, format_prometheus
+from profiling import RequestProfiler, SUMMARY_HEADER
+from deadlines import DEADLINE_HEADER, parse_deadline
+from compression import ResponseCompression, decompress
+from idempotency import ReplayCache
 from __init__ import version
+from utils import ClosingIterator, close_iterator
 
 logger = logging.getLogger('rpc4django')
 
@@ -32,19 +49,96 @@ LOG_REQUESTS_RESPONSES = getattr(settings, 'RPC4DJANGO_LOG_REQUESTS_RESPONSES',
 RESTRICT_INTROSPECTION = getattr(settings, 'RPC4DJANGO_RESTRICT_INTROSPECTION', False)
 RESTRICT_OOTB_AUTH = getattr(settings, 'RPC4DJANGO_RESTRICT_OOTB_AUTH', True)
 RESTRICT_JSON = getattr(settings, 'RPC4DJANGO_RESTRICT_JSONRPC', False)
+RESTRICT_XML = getattr(settings, 'RPC4DJANGO_RESTRICT_XMLRPC', False)
 RESTRICT_METHOD_SUMMARY = getattr(settings, 'RPC4DJANGO_RESTRICT_METHOD_SUMMARY', False)
 RESTRICT_RPCTEST = getattr(settings, 'RPC4DJANGO_RESTRICT_RPCTEST', False)
 RESTRICT_RPCTEST = getattr(settings, 'RPC4DJANGO_RESTRICT_RPCTEST', False)
 HTTP_ACCESS_CREDENTIALS = getattr(settings, 'RPC4DJANGO_HTTP_ACCESS_CREDENTIALS', False)
 HTTP_ACCESS_ALLOW_ORIGIN = getattr(settings, 'RPC4DJANGO_HTTP_ACCESS_ALLOW_ORIGIN', '')
 JSON_ENCODER = getattr(settings, 'RPC4DJANGO_JSON_ENCODER', 'django.core.serializers.json.DjangoJSONEncoder')
+JSON_CODEC = getattr(settings, 'RPC4DJANGO_JSON_CODEC', 'auto')
+JSON_INDENT = getattr(settings, 'RPC4DJANGO_JSON_INDENT', None)
+# requests and responses can also be encoded by these codecs when installed
+CODECS = getattr(settings, 'RPC4DJANGO_CODECS', ('msgpack', 'cbor'))
+BATCH_MAX_SIZE = getattr(settings, 'RPC4DJANGO_BATCH_MAX_SIZE', 100)
+BATCH_THREADS = getattr(settings, 'RPC4DJANGO_BATCH_THREADS', 0)
+
+# calls over MAX_CONCURRENCY running at the same time in a process are
+# rejected with OverloadedException
+MAX_CONCURRENCY = getattr(settings, 'RPC4DJANGO_MAX_CONCURRENCY', None)
+
+# requests are rejected before they are decoded if the body is larger
+# than MAX_BODY_SIZE bytes or the JSON is too deeply nested or too long
+MAX_BODY_SIZE = getattr(settings, 'RPC4DJANGO_MAX_BODY_SIZE', 10 * 1024 * 1024)
+MAX_JSON_DEPTH = getattr(settings, 'RPC4DJANGO_MAX_JSON_DEPTH', 64)
+MAX_JSON_ELEMENTS = getattr(settings, 'RPC4DJANGO_MAX_JSON_ELEMENTS', None)
+
+# responses of at least COMPRESS_MIN_SIZE bytes are compressed with the
+# first of COMPRESS_ENCODINGS which is installed and accepted by the client
+COMPRESS_ENCODINGS = getattr(settings, 'RPC4DJANGO_COMPRESS_ENCODINGS', ('zstd', 'br', 'gzip'))
+COMPRESS_MIN_SIZE = getattr(settings, 'RPC4DJANGO_COMPRESS_MIN_SIZE', 1024)
+
+# request bodies are only logged at DEBUG level, for the sampled fraction
+# of the calls to each method and truncated to LOG_MAX_BODY bytes
+LOG_SAMPLE_RATES = getattr(settings, 'RPC4DJANGO_LOG_SAMPLE_RATES', {})
+LOG_MAX_BODY = getattr(settings, 'RPC4DJANGO_LOG_MAX_BODY', 1024)
+LOG_RESPONSES = getattr(settings, 'RPC4DJANGO_LOG_RESPONSES', False)
+LOG_ERROR_INTERVAL = getattr(settings, 'RPC4DJANGO_LOG_ERROR_INTERVAL', 60)
+
+# results of methods with a cache_ttl are kept in process and, if this
+# names a Django cache, in that cache
+RESULT_CACHE = getattr(settings, 'RPC4DJANGO_RESULT_CACHE', None)
+RESULT_CACHE_SIZE = getattr(settings, 'RPC4DJANGO_RESULT_CACHE_SIZE', 1000)
+VERSIONED_CACHE_SIZE = getattr(settings, 'RPC4DJANGO_VERSIONED_CACHE_SIZE', 1000)
+
+# calls are recorded per method if METRICS is True. Multi-process servers
+# add up the metrics of their processes through files in METRICS_DIR
+METRICS = getattr(settings, 'RPC4DJANGO_METRICS', False)
+METRICS_DIR = getattr(settings, 'RPC4DJANGO_METRICS_DIR', None)
+RESTRICT_STATS = getattr(settings, 'RPC4DJANGO_RESTRICT_STATS', True)
+
+# requests with a header signed by PROFILE_KEY or sampled by
+# PROFILE_SAMPLE_RATES are profiled and the profiles saved in PROFILE_DIR
+PROFILE_KEY = getattr(settings, 'RPC4DJANGO_PROFILE_KEY', None)
+PROFILE_SAMPLE_RATES = getattr(settings, 'RPC4DJANGO_PROFILE_SAMPLE_RATES', {})
+PROFILE_DIR = getattr(settings, 'RPC4DJANGO_PROFILE_DIR',
+                      os.path.join(tempfile.gettempdir(), 'rpc4django-profiles'))
+PROFILE_SUMMARY = getattr(settings, 'RPC4DJANGO_PROFILE_SUMMARY', False)
+
+# the responses of calls with an idempotency key are replayed to their
+# retries for IDEMPOTENCY_TTL seconds, None disables replays
+IDEMPOTENCY_TTL = getattr(settings, 'RPC4DJANGO_IDEMPOTENCY_TTL', None)
+IDEMPOTENCY_CACHE = getattr(settings, 'RPC4DJANGO_IDEMPOTENCY_CACHE', None)
+IDEMPOTENCY_CACHE_SIZE = getattr(settings, 'RPC4DJANGO_IDEMPOTENCY_CACHE_SIZE', 1000)
+IDEMPOTENCY_IDS = getattr(settings, 'RPC4DJANGO_IDEMPOTENCY_IDS', False)
+IDEMPOTENCY_WAIT = getattr(settings, 'RPC4DJANGO_IDEMPOTENCY_WAIT', 30)
+
+SUMMARY_CACHE = getattr(settings, 'RPC4DJANGO_SUMMARY_CACHE', None)
+RPC_MODULES = getattr(settings, 'RPC4DJANGO_RPC_MODULES', None)
+MANIFEST = getattr(settings, 'RPC4DJANGO_MANIFEST', None)
 
 # get a list of the installed django applications
 # these will be scanned for @rpcmethod decorators
+# unless RPC4DJANGO_RPC_MODULES or RPC4DJANGO_MANIFEST is set
 APPS = getattr(settings, 'INSTALLED_APPS', [])
 
+request_logger = RequestLogger(LOG_SAMPLE_RATES, LOG_MAX_BODY, LOG_RESPONSES)
+error_limiter.interval = LOG_ERROR_INTERVAL
+
+response_compression = None
+if COMPRESS_ENCODINGS:
+    response_compression = ResponseCompression(COMPRESS_ENCODINGS, COMPRESS_MIN_SIZE)
+
+# requests are not profiled, and pay nothing, unless profiling is configured
+request_profiler = None
+if PROFILE_KEY or PROFILE_SAMPLE_RATES:
+    request_profiler = RequestProfiler(PROFILE_KEY, PROFILE_DIR,
+                                       PROFILE_SAMPLE_RATES, PROFILE_SUMMARY)
+
 
-def serve_rpc_request(request):
+def serve_rpc_request(request, max_body_size=MAX_BODY_SIZE,
+                      max_json_depth=MAX_JSON_DEPTH,
+                      max_json_elements=MAX_JSON_ELEMENTS):
     '''
     Handles rpc calls based on the content type of the request or
     returns the method documentation page if the request
@@ -54,38 +148,102 @@ def serve_rpc_request(request):
 
     ``request``
         the Django HttpRequest object
+    ``max_body_size``, ``max_json_depth``, ``max_json_elements``
+        the limits of the request body. They default to
+        :envvar:`RPC4DJANGO_MAX_BODY_SIZE`, :envvar:`RPC4DJANGO_MAX_JSON_DEPTH`
+        and :envvar:`RPC4DJANGO_MAX_JSON_ELEMENTS` and can be set for an
+        endpoint in ``urls.py``::
+
+            (r'^RPC2$', 'rpc4django.views.serve_rpc_request',
+             {'max_body_size': 65536}),
+
+    The ``X-RPC4Django-Deadline`` header sets the deadline of the calls
+    (see :mod:`rpc4django.deadlines`). Retries sent with the
+    ``Idempotency-Key`` of a call get its response (see
+    :mod:`rpc4django.idempotency`).
 
     '''
+    dispatcher = get_dispatcher()
+
     if request.method == "POST":
         # Handle POST request with RPC payload
 
-        if LOG_REQUESTS_RESPONSES:
-            logger.debug('Incoming request: %s' %str(request.raw_post_data))
-
-        # From now on only JSON
-        protocol = dispatcher.jsonrpcdispatcher
-        response_type = 'application/json'
+        # the request is decoded by the codec of its content type and the
+        # response is encoded by the codec the client accepts
+        content_type = request.META.get('CONTENT_TYPE') or ''
+        request_protocol = dispatcher.get_protocol(content_type)
+        if request_protocol is None and 'application/json' in content_type:
+            request_protocol = dispatcher.jsonrpcdispatcher
+        protocol = get_response_protocol(dispatcher, request.META.get('HTTP_ACCEPT'),
+                                         request_protocol or dispatcher.jsonrpcdispatcher)
+        response_type = protocol.codec.content_type
+        rpc_request = None
+        log = False
+        profile_summary = None
 
         try:
 
-            if response_type not in request.META.get('CONTENT_TYPE'):
-                raise BadDataException('Use %s content type' % response_type)
+            if request_protocol is None:
+                raise BadDataException('Use %s content type' %
+                                       ' or '.join(sorted(dispatcher.protocols)))
+
+            body = read_body(request, max_body_size)
+
+            deadline = request.META.get(DEADLINE_HEADER)
+            if deadline is not None:
+                try:
+                    deadline = parse_deadline(deadline)
+                except ValueError as e:
+                    raise BadDataException(e.message)
+
+            # the body is decoded once and shared by everything below
+            rpc_request = request_protocol.parse(body, max_json_depth, max_json_elements,
+                                                 deadline)
 
-            dispatcher.check_request_permission(request)
-            response = protocol.dispatch(request.raw_post_data, request=request)
+            # nothing is formatted unless the call is going to be logged
+            log = LOG_REQUESTS_RESPONSES and request_logger.sampled(rpc_request)
+            if log:
+                request_logger.log_request(rpc_request, body)
+
+            # permissions are checked by the dispatcher for every call
+            if request_profiler is not None and \
+                    request_profiler.wants(request, rpc_request):
+                response, profile_summary = request_profiler.run(
+                    rpc_request, protocol.dispatch, rpc_request, request=request)
+            else:
+                response = protocol.dispatch(rpc_request, request=request)
 
         except RpcException as e:
 
             if settings.DEBUG:
-                traceback.print_exc()
-            response =  protocol.encode_error(e)
+                error_limiter.log_exception('RPC call %r failed', rpc_request)
+            response =  protocol.encode_error(e, rpc_request)
 
         except Exception as e:
 
-            traceback.print_exc()
-            response =  protocol.encode_error(UnknownProcessingError('%s: %s' % (e.__class__.__name__, e.message)))
-
-        return HttpResponse(response, response_type)
+            error_limiter.log_exception('RPC call %r failed', rpc_request)
+            response =  protocol.encode_error(UnknownProcessingError('%s: %s' % (e.__class__.__name__, e.message)), rpc_request)
+
+        streamed = not isinstance(response, basestring)
+        if log and not streamed:
+            request_logger.log_response(rpc_request, response)
+
+        response, encoding = compress_response(request, dispatcher, rpc_request, response)
+        if streamed:
+            # the result is encoded while the response is being sent
+            response = StreamingHttpResponse(response, content_type=response_type)
+        else:
+            response = HttpResponse(response, response_type)
+        if response_compression is not None:
+            response['Vary'] = 'Accept-Encoding'
+        if encoding is not None:
+            response['Content-Encoding'] = encoding
+
+        # lets clients know when introspection results need to be refetched
+        response['X-RPC4Django-Registry-Version'] = str(dispatcher.registry.version)
+        if profile_summary:
+            response[SUMMARY_HEADER] = profile_summary
+        return response
 
     elif request.method == 'OPTIONS':
         # Handle OPTIONS request for "preflighted" requests
@@ -101,7 +259,7 @@ def serve_rpc_request(request):
         response['Access-Control-Allow-Headers'] = request.META.get('HTTP_ACCESS_CONTROL_REQUEST_HEADERS', '')
 
         if LOG_REQUESTS_RESPONSES:
-            logger.debug('Outgoing HTTP access response to: %s' %(origin))
+            logger.debug('Outgoing HTTP access response to: %s', origin)
 
         return response
     else:
@@ -112,43 +270,286 @@ def serve_rpc_request(request):
             raise Http404
 
         # show documentation
-        methods = dispatcher.list_methods()
-        template_data = {
-            'methods': methods,
-            'url': URL,
+        html, etag = get_method_summary(dispatcher)
+
+        etags = _parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in etags or '*' in etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(html)
+        response['ETag'] = etag
+        return response
 
-            # rpc4django version
-            'version': version(),
 
-            # restricts the ability to test the rpc server from the docs
-            'restrict_rpctest': RESTRICT_RPCTEST,
-        }
-        return render_to_response('rpc4django/rpcmethod_summary.html', template_data)
+def _accepted_types(accept):
+    # the media types of an Accept header by decreasing q, in listed order
+    # for equal q, without those with q=0
+    types = []
+    for index, item in enumerate((accept or '').split(',')):
+        parts = item.split(';')
+        q = 1.0
+        for param in parts[1:]:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            types.append((-q, index, parts[0]))
+    return [media_type for q, index, media_type in sorted(types)]
+
+
+def get_response_protocol(dispatcher, accept, default):
+    '''
+    Returns the dispatcher of the content type with the highest ``q`` in
+    the ``Accept`` header which has one, otherwise ``default``
+
+    ``Accept`` only chooses between the codecs of JSON-RPC (eg. JSON or
+    MessagePack): XMLRPC requests are answered with XMLRPC and JSON-RPC
+    requests never are.
+    '''
+    if default is dispatcher.xmlrpcdispatcher:
+        return default
+    for media_type in _accepted_types(accept):
+        protocol = dispatcher.get_protocol(media_type)
+        if protocol is not None and protocol is not dispatcher.xmlrpcdispatcher:
+            return protocol
+    return default
+
+
+# compressed request bodies are read and decompressed this many bytes at a time
+READ_CHUNK_SIZE = 65536
+
+
+def read_body(request, max_body_size=None):
+    '''
+    Returns the body of ``request``
+
+    Raises :class:`BadDataException <rpc4django.exceptions.BadDataException>`
+    without reading the body if its ``Content-Length`` exceeds
+    ``max_body_size`` bytes. Django never reads more than the
+    ``Content-Length`` of a request.
+
+    A body with a ``Content-Encoding`` of ``gzip`` or ``deflate`` is
+    decompressed as it is read and rejected as soon as it decompresses to
+    more than ``max_body_size`` bytes.
+    '''
+    if max_body_size is not None:
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            raise BadDataException('Invalid Content-Length')
+        if length > max_body_size:
+            raise BadDataException('Request body exceeds %d bytes' % max_body_size)
+
+    encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+    if encoding in ('', 'identity'):
+        return request.raw_post_data
+
+    chunks = iter(lambda: request.read(READ_CHUNK_SIZE), '')
+    try:
+        return decompress(chunks, encoding, max_body_size)
+    except ValueError as e:
+        raise BadDataException(e.message)
+
+
+def compress_response(request, dispatcher, rpc_request, response):
+    '''
+    Returns the encoded ``response`` (a string or an iterator of chunks),
+    compressed if the client accepts it, and its ``Content-Encoding`` or
+    ``None``
+
+    The level is the ``compress_level`` of the method called, or the
+    default of the encoding. A ``compress_level`` of ``0`` disables the
+    compression of the method's responses. Streamed responses are always
+    compressed, others if they are at least
+    :envvar:`RPC4DJANGO_COMPRESS_MIN_SIZE` bytes.
+    '''
+    if response_compression is None:
+        return response, None
+
+    compressor = response_compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING'))
+    if compressor is None:
+        return response, None
+
+    level = None
+    method_name = getattr(rpc_request, 'method', None)
+    if isinstance(method_name, basestring):
+        level = getattr(dispatcher.registry.get(method_name), 'compress_level', None)
+    if level == 0:
+        return response, None
+
+    if not isinstance(response, basestring):
+        # closing the compressed stream closes the response it compresses
+        return ClosingIterator(compressor.stream(response, level),
+                               lambda: close_iterator(response)), compressor.name
+    if len(response) < response_compression.min_size:
+        return response, None
+    return compressor.compress(response, level), compressor.name
+
+
+def _parse_etags(header):
+    return [etag.strip() for etag in header.split(',')]
+
+
+# the rendered method summary for the current registry version
+_summary = {}
+_summary_lock = threading.Lock()
+
+
+def get_method_summary(dispatcher):
+    '''
+    Returns the rendered method summary page and its ETag
+
+    The page is rendered once per :meth:`fingerprint
+    <rpc4django.rpcdispatcher.RPCDispatcher.fingerprint>` of the registered
+    methods and kept in memory and, if :envvar:`RPC4DJANGO_SUMMARY_CACHE`
+    names a Django cache, in that cache to be shared between processes.
+    '''
+    key = 'rpc4django:summary:%s:%s:%s:%d' % (version(), dispatcher.url,
+                                              dispatcher.fingerprint(),
+                                              RESTRICT_RPCTEST)
+
+    summary = _summary.get(key)
+    if summary is not None:
+        return summary
+
+    with _summary_lock:
+        summary = _summary.get(key)
+        if summary is None:
+            cache = None
+            if SUMMARY_CACHE:
+                from django.core.cache import get_cache
+                cache = get_cache(SUMMARY_CACHE)
+                summary = cache.get(key)
+
+            if summary is None:
+                summary = _render_method_summary(dispatcher)
+                if cache is not None:
+                    cache.set(key, summary)
+
+            _summary.clear()
+            _summary[key] = summary
+    return summary
+
+
+def _render_method_summary(dispatcher):
+    registry = dispatcher.registry
+    template_data = {
+        'methods': [registry[name] for name in registry.names()],
+        'url': dispatcher.url,
+
+        # rpc4django version
+        'version': version(),
+
+        # restricts the ability to test the rpc server from the docs
+        'restrict_rpctest': RESTRICT_RPCTEST,
+    }
+    html = render_to_string('rpc4django/rpcmethod_summary.html', template_data)
+    if isinstance(html, unicode):
+        html = html.encode('utf-8')
+    return html, '"%s"' % hashlib.sha1(html).hexdigest()
+
+def serve_metrics(request):
+    '''
+    Returns the metrics of the RPC methods in the Prometheus text format
+
+    It is added next to ``serve_rpc_request`` in ``urls.py`` and raises 404
+    unless :envvar:`RPC4DJANGO_METRICS` is ``True``
+
+    ::
+
+        (r'^RPC2/metrics$', 'rpc4django.views.serve_metrics'),
+
+    '''
+    metrics = get_dispatcher().metrics
+    if metrics is None:
+        raise Http404
+
+    text = format_prometheus(metrics.collect())
+    if isinstance(text, unicode):
+        text = text.encode('utf-8')
+    return HttpResponse(text, content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # exclude from the CSRF framework because RPC is intended to be used cross site
 from django.views.decorators.csrf import csrf_exempt
 serve_rpc_request = csrf_exempt(serve_rpc_request)
 
-# reverse the method for use with system.describe and ajax
-try:
-    URL = reverse(serve_rpc_request)
-except NoReverseMatch:
-    URL = ''
+# the RPCDispatcher is built by get_dispatcher() on the first request
+dispatcher = None
+_dispatcher_lock = threading.Lock()
 
-# resolve JSON_ENCODER to class if it's a string
-if isinstance(JSON_ENCODER, basestring):
-    mod_name, cls_name = get_mod_func(JSON_ENCODER)
-    json_encoder = getattr(import_module(mod_name), cls_name)
-else:
-    json_encoder = JSON_ENCODER
 
+def get_dispatcher():
+    '''
+    Returns the :class:`RPCDispatcher <rpc4django.rpcdispatcher.RPCDispatcher>`
+    serving the requests
+
+    It is built on the first call rather than when this module is imported.
+    Its methods are taken from the manifest file
+    :envvar:`RPC4DJANGO_MANIFEST` if it exists, otherwise from the modules
+    listed in :envvar:`RPC4DJANGO_RPC_MODULES`, otherwise by scanning
+    every module of the ``INSTALLED_APPS``.
+    '''
+    global dispatcher
 
-if not issubclass(json_encoder, json.JSONEncoder):
-    raise Exception("RPC4DJANGO_JSON_ENCODER must be derived from "
-                    "rpc4django.jsonrpcdispatcher.JSONEncoder")
+    if dispatcher is None:
+        with _dispatcher_lock:
+            if dispatcher is None:
+                dispatcher = build_dispatcher()
+    return dispatcher
 
-# instantiate the rpcdispatcher -- this examines the INSTALLED_APPS
-# for any @rpcmethod decorators and adds them to the callable methods
-dispatcher = RPCDispatcher(URL, APPS, RESTRICT_INTROSPECTION,
-        RESTRICT_OOTB_AUTH, json_encoder)
 
+def build_dispatcher(use_manifest=True):
+    '''
+    Returns a new :class:`RPCDispatcher <rpc4django.rpcdispatcher.RPCDispatcher>`
+    configured from the settings
+
+    If ``use_manifest`` is ``False``, :envvar:`RPC4DJANGO_MANIFEST` is ignored
+    '''
+
+    # reverse the method for use with system.describe and ajax
+    try:
+        url = reverse(serve_rpc_request)
+    except NoReverseMatch:
+        url = ''
+
+    # resolve JSON_ENCODER to class if it's a string
+    if isinstance(JSON_ENCODER, basestring):
+        mod_name, cls_name = get_mod_func(JSON_ENCODER)
+        json_encoder = getattr(import_module(mod_name), cls_name)
+    else:
+        json_encoder = JSON_ENCODER
+
+    if not issubclass(json_encoder, json.JSONEncoder):
+        raise Exception("RPC4DJANGO_JSON_ENCODER must be derived from "
+                        "rpc4django.jsonrpcdispatcher.JSONEncoder")
+
+    json_codec = JSONCodec(JSON_CODEC, json_encoder, JSON_INDENT)
+    codecs = get_codecs(CODECS, json_encoder)
+    result_cache = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE)
+    metrics = Metrics(METRICS_DIR) if METRICS else None
+    replay_cache = None
+    if IDEMPOTENCY_TTL:
+        replay_cache = ReplayCache(IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL,
+                                   IDEMPOTENCY_CACHE, IDEMPOTENCY_IDS, IDEMPOTENCY_WAIT)
+
+    rpc_dispatcher = RPCDispatcher(url, [], RESTRICT_INTROSPECTION,
+            RESTRICT_OOTB_AUTH, json_encoder, BATCH_MAX_SIZE, BATCH_THREADS,
+            json_codec, result_cache, metrics, RESTRICT_STATS, MAX_CONCURRENCY,
+            codecs, RESTRICT_XML, replay_cache, VERSIONED_CACHE_SIZE)
+
+    if use_manifest and MANIFEST and os.path.exists(MANIFEST):
+        rpc_dispatcher.load_manifest(MANIFEST)
+    elif RPC_MODULES is not None:
+        rpc_dispatcher.register_rpcmodules(RPC_MODULES)
+    else:
+        if use_manifest and MANIFEST:
+            logger.warning('RPC4DJANGO_MANIFEST %s does not exist, '
+                           'scanning INSTALLED_APPS instead', MANIFEST)
+        # examine the INSTALLED_APPS for any @rpcmethod decorators
+        # and add them to the callable methods
+        rpc_dispatcher.register_rpcmethods(APPS)
+
+    return rpc_dispatcher
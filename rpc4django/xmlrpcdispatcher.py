@@ -0,0 +1,427 @@
+'''
+This module implements an XMLRPC dispatcher which also accepts
+``system.multicall`` batches
+
+see http://xmlrpc.scripting.com/spec.html
+and http://mirrors.talideon.com/articles/multicall.html
+
+Requests are decoded by an expat parser as they are fed to it, without
+building a DOM, and the limits on the depth and number of values are
+checked while parsing. Documents with a ``DOCTYPE`` are rejected so no
+entity can be expanded.
+
+Calls go through the same registry, permission checks, caches, limits,
+deadlines and metrics as JSONRPC calls. Errors are returned as faults
+whose ``faultCode`` is the ``code`` of the
+:class:`RpcException <rpc4django.exceptions.RpcException>`.
+'''
+
+import base64
+import binascii
+import sys
+import xmlrpclib
+from xml.parsers import expat
+from .exceptions import RpcException, BadDataException, UnknownProcessingError
+from .jsonrpcdispatcher import JSONRPCDispatcher, JSONRPCRequest, JSONRPCBatch
+from .logutils import error_limiter
+
+RESPONSE_HEAD = "<?xml version='1.0'?>\n<methodResponse>\n<params>\n<param>\n"
+RESPONSE_TAIL = "</param>\n</params>\n</methodResponse>\n"
+FAULT_HEAD = "<?xml version='1.0'?>\n<methodResponse>\n<fault>\n"
+FAULT_TAIL = "</fault>\n</methodResponse>\n"
+ARRAY_HEAD = "<value><array><data>\n"
+ARRAY_TAIL = "</data></array></value>\n"
+
+MULTICALL = 'system.multicall'
+
+
+def _boolean(text):
+    if text == '1':
+        return True
+    if text == '0':
+        return False
+    raise ValueError('bad boolean value %r' % text)
+
+
+def _base64(text):
+    try:
+        return xmlrpclib.Binary(base64.decodestring(text.encode('ascii')))
+    except binascii.Error:
+        raise ValueError('bad base64 value')
+
+
+def _datetime(text):
+    return xmlrpclib.DateTime(text.strip().encode('ascii'))
+
+
+# converts the text of a scalar element to its value
+SCALARS = {
+    'string': lambda text: text,
+    'int': int,
+    'i4': int,
+    'i8': int,
+    'boolean': _boolean,
+    'double': float,
+    'base64': _base64,
+    'dateTime.iso8601': _datetime,
+    'nil': lambda text: None,
+}
+
+# elements which only hold other elements
+CONTAINERS = frozenset(['methodCall', 'params', 'param', 'data', 'member'])
+
+
+def _escape(text):
+    # most strings have nothing to escape and are not copied
+    if '&' in text:
+        text = text.replace('&', '&amp;')
+    if '<' in text:
+        text = text.replace('<', '&lt;')
+    if '>' in text:
+        text = text.replace('>', '&gt;')
+    return text
+
+
+class _Marshaller(xmlrpclib.Marshaller):
+    # xmlrpclib's marshaller with fewer writes and a faster escape for
+    # strings and Structs
+
+    dispatch = xmlrpclib.Marshaller.dispatch.copy()
+
+    def dump_value(self, value, write):
+        self._Marshaller__dump(value, write)
+
+    def dump_string(self, value, write):
+        write('<value><string>%s</string></value>\n' % _escape(value))
+    dispatch[str] = dump_string
+
+    def dump_unicode(self, value, write):
+        write('<value><string>%s</string></value>\n' %
+              _escape(value).encode(self.encoding, 'xmlcharrefreplace'))
+    dispatch[unicode] = dump_unicode
+
+    def dump_struct(self, value, write):
+        i = id(value)
+        if i in self.memo:
+            raise TypeError('cannot marshal recursive dictionaries')
+        self.memo[i] = None
+        dump = self._Marshaller__dump
+        write('<value><struct>\n')
+        for k, v in value.iteritems():
+            if type(k) is unicode:
+                k = k.encode(self.encoding, 'xmlcharrefreplace')
+            elif type(k) is not str:
+                raise TypeError('dictionary key must be string')
+            write('<member>\n<name>%s</name>\n' % _escape(k))
+            dump(v, write)
+            write('</member>\n')
+        write('</struct></value>\n')
+        del self.memo[i]
+    dispatch[dict] = dump_struct
+
+
+class XMLRPCParser(object):
+    '''
+    Decodes an XMLRPC ``methodCall`` with expat as it is fed
+
+    ::
+
+        parser = XMLRPCParser(max_depth=64)
+        for chunk in chunks:
+            parser.feed(chunk)
+        method, params = parser.close()
+
+    Raises ``ValueError`` for invalid XMLRPC, a ``DOCTYPE``, Arrays and
+    Structs nested deeper than ``max_depth`` or more than ``max_elements``
+    values.
+    '''
+
+    def __init__(self, max_depth=None, max_elements=None):
+        # no limit is checked as a limit larger than any document
+        self.max_depth = max_depth if max_depth is not None else sys.maxint
+        self.max_elements = max_elements if max_elements is not None else sys.maxint
+        self.method = None
+        self._values = []
+        # the index in _values of the first item of each open Array or Struct
+        self._marks = []
+        self._text = []
+        self._elements = 0
+        # True in a <value> without a type element which holds a string
+        self._untyped = False
+
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = self._start
+        parser.EndElementHandler = self._end
+        parser.CharacterDataHandler = self._text.append
+        parser.StartDoctypeDeclHandler = self._doctype
+        self._parser = parser
+
+    def feed(self, data):
+        try:
+            self._parser.Parse(data, False)
+        except expat.ExpatError as e:
+            raise ValueError('XML decoding error: %s' % e)
+
+    def close(self):
+        '''
+        Returns the method name and the list of params of the call
+        '''
+        try:
+            self._parser.Parse('', True)
+        except expat.ExpatError as e:
+            raise ValueError('XML decoding error: %s' % e)
+        if self.method is None:
+            raise ValueError('XML methodCall has no methodName')
+        return self.method, self._values
+
+    def _doctype(self, *args):
+        raise ValueError('XML with a DOCTYPE is not accepted')
+
+    def _start(self, tag, attrs):
+        del self._text[:]
+        if tag == 'value':
+            self._untyped = True
+            self._elements += 1
+            if self._elements > self.max_elements:
+                raise ValueError('XML exceeds %d values' % self.max_elements)
+        else:
+            self._untyped = False
+            if tag == 'array' or tag == 'struct':
+                self._marks.append(len(self._values))
+                if len(self._marks) > self.max_depth:
+                    raise ValueError('XML exceeds depth %d' % self.max_depth)
+
+    def _end(self, tag):
+        # the text is only joined for the elements which hold text
+        if tag == 'value':
+            if self._untyped:
+                self._values.append(''.join(self._text))
+                self._untyped = False
+            return
+
+        scalar = SCALARS.get(tag)
+        if scalar is not None:
+            self._values.append(scalar(''.join(self._text)))
+        elif tag == 'name':
+            # the name of a member is followed by its value
+            self._values.append(''.join(self._text))
+        elif tag == 'array':
+            mark = self._marks.pop()
+            self._values[mark:] = [self._values[mark:]]
+        elif tag == 'struct':
+            mark = self._marks.pop()
+            items = self._values[mark:]
+            self._values[mark:] = [dict(zip(items[::2], items[1::2]))]
+        elif tag == 'methodName':
+            self.method = ''.join(self._text)
+        elif tag not in CONTAINERS:
+            raise ValueError('Unknown XML element %s' % tag)
+
+
+class XMLRPCCodec(object):
+    '''
+    Encodes and decodes XMLRPC with expat and xmlrpclib's marshaller
+
+    ``None`` is encoded as ``<nil/>``. Unlike the other codecs, ``loads``
+    returns the method name and params of a call and ``dumps`` the
+    ``<value>`` element of a value.
+    '''
+
+    name = 'xml'
+    content_type = 'text/xml'
+    content_types = ('text/xml', 'application/xml')
+    streams = True
+
+    def __init__(self, encoding='utf-8'):
+        self.encoding = encoding
+
+    def loads(self, data, max_depth=None, max_elements=None):
+        parser = XMLRPCParser(max_depth, max_elements)
+        parser.feed(data)
+        return parser.close()
+
+    def dumps(self, value):
+        out = []
+        _Marshaller(self.encoding, allow_none=True).dump_value(value, out.append)
+        return ''.join(out)
+
+    def encode_response(self, encoded_value):
+        return RESPONSE_HEAD + encoded_value + RESPONSE_TAIL
+
+    def encode_fault(self, code, message):
+        return FAULT_HEAD + self.dumps({'faultCode': code, 'faultString': message}) + \
+            FAULT_TAIL
+
+    def encode_array(self, responses):
+        '''
+        Returns the ``system.multicall`` response of the encoded responses
+        of its calls: the result of each call in an Array or its fault
+        '''
+        items = [ARRAY_HEAD]
+        for response in responses:
+            if response.startswith(RESPONSE_HEAD):
+                items.append(ARRAY_HEAD)
+                items.append(response[len(RESPONSE_HEAD):-len(RESPONSE_TAIL)])
+                items.append(ARRAY_TAIL)
+            else:
+                items.append(response[len(FAULT_HEAD):-len(FAULT_TAIL)])
+        items.append(ARRAY_TAIL)
+        return self.encode_response(''.join(items))
+
+
+class XMLRPCRequest(JSONRPCRequest):
+    '''
+    A decoded XMLRPC call, which has no ``id``
+    '''
+
+    def __repr__(self):
+        return '<XMLRPCRequest method=%r size=%d>' % (self.method, self.raw_size)
+
+
+class XMLRPCMulticall(JSONRPCBatch):
+    '''
+    The calls of a decoded ``system.multicall``
+    '''
+
+    def __repr__(self):
+        return '<XMLRPCMulticall calls=%d size=%d>' % (len(self), self.raw_size)
+
+
+class XMLRPCDispatcher(JSONRPCDispatcher):
+    '''
+    Dispatches XMLRPC calls to the methods of a
+    :class:`MethodRegistry <rpc4django.registry.MethodRegistry>`
+
+    The calls of a ``system.multicall`` are checked and run like the calls
+    of a JSON-RPC 2.0 batch: every permission is checked before any call
+    runs, each authentication is applied once and the calls run
+    concurrently if ``BATCH_THREADS`` is set. A failed call is a fault
+    in the multicall response and does not fail the others.
+
+    An iterator returned by a method is streamed as an Array. XMLRPC has
+    no way to end a result with an error, so if iterating fails before
+    the first chunk is sent the response is a fault, and after it the
+    response is cut short and cannot be parsed by the client.
+    '''
+
+    def __init__(self, methods=None, permission_check=None, codec=None,
+                 result_cache=None, metrics=None, limiter=None, replay_cache=None):
+        if codec is None:
+            codec = XMLRPCCodec()
+        JSONRPCDispatcher.__init__(self, None, methods, permission_check, codec,
+                                   result_cache, metrics, limiter, replay_cache)
+
+
+    def _encode_result(self, api_call_id, result=None, error=None):
+        if error is not None:
+            return self.codec.encode_fault(error.code, error.message)
+        try:
+            return self.codec.encode_response(self.codec.dumps(result))
+        except Exception:
+            error = RpcException('Failed to encode return value', api_call_id)
+            return self.codec.encode_fault(error.code, error.message)
+
+
+    def _encode_encoded_result(self, api_call_id, encoded_result):
+        return self.codec.encode_response(encoded_result)
+
+
+    def _replace_id(self, response, api_call_id):
+        # XMLRPC responses have no id
+        return response
+
+
+    def _encode_stream(self, api_call_id, result, stream_errors=None):
+        chunk = [RESPONSE_HEAD, ARRAY_HEAD]
+        size = 0
+        sent = False
+        try:
+            for item in result:
+                try:
+                    encoded = self.codec.dumps(item)
+                except Exception:
+                    raise RpcException('Failed to encode return value')
+                chunk.append(encoded)
+                size += len(encoded)
+                if size >= self.STREAM_CHUNK_SIZE:
+                    yield ''.join(chunk)
+                    chunk = []
+                    size = 0
+                    sent = True
+        except Exception as e:
+            if not isinstance(e, RpcException):
+                error_limiter.log_exception('Streaming the result of call %r failed',
+                                            api_call_id)
+                e = UnknownProcessingError('%s: %s' % (e.__class__.__name__, e.message))
+            if stream_errors is not None:
+                stream_errors.append(e.code)
+            if not sent:
+                yield self._encode_result(api_call_id, error=e)
+            # otherwise the unterminated response fails on the client
+            return
+
+        chunk.append(ARRAY_TAIL)
+        chunk.append(RESPONSE_TAIL)
+        yield ''.join(chunk)
+
+
+    def parse(self, xml_data, max_depth=None, max_elements=None, deadline=None):
+        '''
+        Decodes the XMLRPC ``methodCall`` into an :class:`XMLRPCRequest`
+        or, for ``system.multicall``, an :class:`XMLRPCMulticall` of its
+        calls
+
+        Arrays and Structs may be nested at most ``max_depth`` deep and
+        the call may have at most ``max_elements`` values. ``deadline``
+        is the Unix time the client stops waiting for the calls.
+        Invalid calls of a multicall do not fail the others.
+        '''
+        if not xml_data:
+            raise BadDataException('No POST data')
+
+        try:
+            method, params = self.codec.loads(xml_data, max_depth, max_elements)
+        except (ValueError, OverflowError) as e:
+            raise BadDataException(str(e))
+
+        raw_size = len(xml_data)
+        if method != MULTICALL or MULTICALL in self.methods:
+            return XMLRPCRequest(method, params, '', raw_size, deadline)
+
+        if len(params) != 1 or not isinstance(params[0], list):
+            raise BadDataException('system.multicall takes an Array of calls')
+        if not params[0]:
+            raise BadDataException('system.multicall is empty')
+        if len(params[0]) > self.MAX_BATCH_SIZE:
+            raise BadDataException('system.multicall exceeds %d calls' % self.MAX_BATCH_SIZE)
+
+        calls = []
+        for call in params[0]:
+            if not isinstance(call, dict) or \
+                    not isinstance(call.get('methodName'), basestring):
+                calls.append(BadDataException('system.multicall call has no methodName'))
+            elif not isinstance(call.get('params', []), list):
+                calls.append(BadDataException('system.multicall params have to be an Array'))
+            elif call['methodName'] == MULTICALL:
+                calls.append(BadDataException('system.multicall cannot be nested'))
+            else:
+                calls.append(XMLRPCRequest(call['methodName'], call.get('params', []),
+                                           '', raw_size, deadline))
+        return XMLRPCMulticall(calls, raw_size)
+
+
+    def dispatch(self, xml_data, **kwargs):
+        '''
+        Calls the method of an XMLRPC call or the methods of a
+        ``system.multicall``
+
+        ``xml_data`` is either the result of :meth:`parse` or the XML
+        encoded string which is parsed first. ``kwargs`` are passed to the
+        methods.
+
+        Returns the XMLRPC response or, if the result is streamed, an
+        iterator of its chunks. Errors of a single call are raised while
+        errors of a multicall are faults in its response.
+        '''
+        return JSONRPCDispatcher.dispatch(self, xml_data, **kwargs)
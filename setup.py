@@ -93,6 +93,8 @@ setup(
     license = 'BSD',
     platforms = ['OS Independent'],
     packages = ['rpc4django', 
+                'rpc4django.management',
+                'rpc4django.management.commands',
                 'rpc4django.templatetags',
                ],
     data_files = [('rpc4django/templates/rpc4django', 
@@ -0,0 +1,20 @@
+'''
+Django settings for the tests that need them
+'''
+
+from django.conf import settings
+
+TEST_SETTINGS = {
+    'SECRET_KEY': 'rpc4django tests',
+    'DATABASES': {'default': {'ENGINE': 'django.db.backends.sqlite3',
+                              'NAME': ':memory:'}},
+    'AUTHENTICATION_BACKENDS': ('tests.test_auth.StubBackend',),
+    'INSTALLED_APPS': ('rpc4django',),
+    'ROOT_URLCONF': 'tests.urls',
+    'RPC4DJANGO_RPC_MODULES': ['example.testapp.othermodule'],
+}
+
+
+def configure():
+    if not settings.configured:
+        settings.configure(**TEST_SETTINGS)
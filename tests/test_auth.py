@@ -0,0 +1,91 @@
+'''
+Authentication Tests
+--------------------
+
+'''
+
+import base64
+import unittest
+from tests.settings import configure
+
+configure()
+
+from rpc4django import auth
+
+
+class StubUser(object):
+    is_active = True
+
+    def __init__(self, pk, password):
+        self.pk = pk
+        self.password = password
+
+    def is_authenticated(self):
+        return True
+
+
+class StubBackend(object):
+    users = {}
+    authenticate_calls = 0
+
+    def authenticate(self, username=None, password=None):
+        StubBackend.authenticate_calls += 1
+        user = self.users.get(username)
+        if user is not None and user.password == 'hash:' + password:
+            return user
+        return None
+
+    def get_user(self, user_id):
+        for user in self.users.values():
+            if user.pk == user_id:
+                return user
+        return None
+
+
+class StubRequest(object):
+    def __init__(self, username, password):
+        credentials = base64.b64encode('%s:%s' % (username, password))
+        self.META = {'HTTP_AUTHORIZATION': 'Basic ' + credentials}
+
+
+class TestBasicHttpAuth(unittest.TestCase):
+
+    def setUp(self):
+        StubBackend.users = {'rpc': StubUser(1, 'hash:pass:word')}
+        StubBackend.authenticate_calls = 0
+        self.ttl = auth.AUTH_CACHE_TTL
+        auth.AUTH_CACHE_TTL = 60
+        auth.clear_credential_cache()
+
+    def tearDown(self):
+        auth.AUTH_CACHE_TTL = self.ttl
+        auth.clear_credential_cache()
+
+    def test_stateless(self):
+        request = auth.stateless_basic_http_auth(StubRequest('rpc', 'pass:word'))
+        self.assertEqual(request.user.pk, 1)
+        self.assertFalse(hasattr(request, 'session'))
+        self.assertRaises(auth.AuthException, auth.stateless_basic_http_auth,
+                          StubRequest('rpc', 'wrong'))
+
+    def test_cache(self):
+        for i in range(3):
+            request = auth.stateless_basic_http_auth(StubRequest('rpc', 'pass:word'))
+            self.assertEqual(request.user.pk, 1)
+        self.assertEqual(StubBackend.authenticate_calls, 1)
+
+        # a changed password invalidates the cached verification
+        StubBackend.users['rpc'].password = 'hash:new'
+        self.assertRaises(auth.AuthException, auth.stateless_basic_http_auth,
+                          StubRequest('rpc', 'pass:word'))
+        self.assertEqual(StubBackend.authenticate_calls, 2)
+
+    def test_cache_disabled(self):
+        auth.AUTH_CACHE_TTL = 0
+        for i in range(2):
+            auth.stateless_basic_http_auth(StubRequest('rpc', 'pass:word'))
+        self.assertEqual(StubBackend.authenticate_calls, 2)
+        self.assertEqual(len(auth.credential_cache), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+'''
+Client Tests
+------------
+
+The client calls a local HTTP/1.1 server in front of ``serve_rpc_request``.
+
+'''
+
+import socket
+import threading
+import time
+import unittest
+import xmlrpclib
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+from tests.settings import configure
+
+configure()
+
+from django.test.client import RequestFactory
+from rpc4django import views
+from rpc4django.client import Client
+from rpc4django.exceptions import BadMethodException
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    connections = 0
+    cookies = []
+    encodings = []
+    # the number of calls and the seconds each response is delayed
+    calls = 0
+    delay = 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['content-length']))
+        self.server.cookies.append(self.headers.get('cookie'))
+        if self.path != '/RPC2':
+            self.send_error(404)
+            return
+
+        meta = dict(('HTTP_' + name.upper().replace('-', '_'), value)
+                    for name, value in self.headers.items())
+        request = RequestFactory().post(self.path, body, self.headers['content-type'], **meta)
+        response = views.serve_rpc_request(request)
+        content = ''.join(response)
+        self.server.calls += 1
+        time.sleep(self.server.delay)
+
+        self.send_response(200)
+        if response.has_header('Content-Encoding'):
+            self.send_header('Content-Encoding', response['Content-Encoding'])
+            self.server.encodings.append(response['Content-Encoding'])
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Set-Cookie', 'visited=yes; Path=/')
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestClient(unittest.TestCase):
+
+    def setUp(self):
+        # every response is compressed
+        self.min_size = views.response_compression.min_size
+        views.response_compression.min_size = 0
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server.cookies = []
+        self.server.encodings = []
+        thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d/RPC2' % self.server.server_address[1]
+        self.client = Client(self.url)
+
+    def tearDown(self):
+        views.response_compression.min_size = self.min_size
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_call(self):
+        self.assertEqual(self.client.call('rpc4django.introduction'), u'はじめまして')
+        self.assertTrue('rpc4django.introduction' in self.client.system.listMethods())
+        self.assertRaises(BadMethodException, self.client.no.such.method)
+
+        # the calls shared one connection and sent the cookie back
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.server.cookies, [None, 'visited=yes', 'visited=yes'])
+        self.assertEqual(self.server.encodings, ['gzip'] * 3)
+
+    def test_batch(self):
+        with self.client.batch() as batch:
+            intro = batch.rpc4django.introduction()
+            missing = batch.call('no.such.method')
+        self.assertEqual(intro.result, u'はじめまして')
+        try:
+            missing.result
+            self.fail('missing.result did not raise')
+        except BadMethodException as e:
+            self.assertEqual(e.code, 102)
+        self.assertEqual(len(self.server.cookies), 1)
+
+    def test_threads(self):
+        results = []
+
+        def call():
+            for i in range(5):
+                results.append(self.client.rpc4django.introduction())
+
+        threads = [threading.Thread(target=call) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [u'はじめまして'] * 20)
+        self.assertTrue(self.server.connections <= 4)
+
+    def test_timeout_not_retried(self):
+        client = Client(self.url, timeout=0.2)
+        client.rpc4django.introduction()
+        self.server.calls = 0
+        self.server.delay = 0.5
+        # the call times out on the idle connection and is not sent again
+        self.assertRaises(socket.timeout, client.rpc4django.introduction)
+        time.sleep(0.5)
+        self.assertEqual(self.server.calls, 1)
+        client.close()
+
+    def test_http_error(self):
+        client = Client(self.url.replace('RPC2', 'missing'))
+        self.assertRaises(xmlrpclib.ProtocolError, client.system.listMethods)
+        client.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+'''
+Binary Codec Tests
+------------------
+
+The MessagePack and CBOR tests are skipped when msgpack or cbor2 is not
+installed.
+
+'''
+
+import unittest
+from datetime import datetime
+from tests.settings import configure
+
+configure()
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test.client import RequestFactory
+from rpc4django import views
+from rpc4django.jsonrpcdispatcher import JSONRPCDispatcher, BadDataException, json
+from rpc4django.rpcdispatcher import RPCDispatcher
+from rpc4django.serialization import get_codecs, check_cbor_limits, MsgpackCodec, CBORCodec
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+class CodecTests(object):
+    # the tests of every binary codec
+
+    def setUp(self):
+        def add(a, b):
+            return a + b
+
+        def rows(count):
+            for i in xrange(count):
+                yield {u'row': i}
+
+        self.codec = self.codec_class(DjangoJSONEncoder)
+        self.dispatcher = JSONRPCDispatcher(codec=self.codec)
+        self.dispatcher.register_function(add, 'add')
+        self.dispatcher.register_function(rows, 'rows')
+        self.dispatcher.register_function(lambda data: data[::-1], 'reverse')
+        self.dispatcher.register_function(lambda: datetime(2012, 2, 2), 'date')
+
+        def cached(data):
+            return data[::-1]
+        cached.cache_ttl = 60
+        self.dispatcher.register_function(cached, 'cached')
+
+        def versioned(data):
+            return data[::-1]
+        versioned.versioned = True
+        self.dispatcher.register_function(versioned, 'versioned')
+
+    def call(self, method, params, api_call_id=1):
+        return self.codec.dumps({u'id': api_call_id, u'method': method, u'params': params})
+
+    def test_call(self):
+        response = self.codec.loads(self.dispatcher.dispatch(self.call(u'add', [1, 2])))
+        self.assertEqual(response, {u'id': 1, u'result': 3, u'error': None})
+
+        # binary data is not base64 encoded
+        response = self.codec.loads(self.dispatcher.dispatch(
+            self.call(u'reverse', ['\x00\xff'])))
+        self.assertEqual(response[u'result'], '\xff\x00')
+
+        # iterators are encoded as a whole
+        response = self.codec.loads(self.dispatcher.dispatch(self.call(u'rows', [2])))
+        self.assertEqual(response[u'result'], [{u'row': 0}, {u'row': 1}])
+
+    def test_binary_params_not_cached(self):
+        # binary strings cannot be a cache key, the method is called
+        for method in (u'cached', u'versioned'):
+            for i in range(2):
+                response = self.codec.loads(self.dispatcher.dispatch(
+                    self.call(method, ['\x00\xff'])))
+                self.assertEqual(response[u'result'], '\xff\x00')
+
+    def test_batch(self):
+        batch = self.codec.dumps([
+            {u'id': 1, u'method': u'add', u'params': [1, 2]},
+            {u'id': 2, u'method': u'nosuchmethod', u'params': []},
+        ])
+        responses = self.codec.loads(self.dispatcher.dispatch(batch))
+        self.assertEqual(responses[0][u'result'], 3)
+        self.assertEqual(responses[1][u'error'][u'code'], 102)
+        self.assertEqual(responses[1][u'error'][u'exception'], u'BadMethodException')
+
+    def test_encoded_result(self):
+        response = self.dispatcher._encode_encoded_result(7, self.codec.dumps([1, u'a']))
+        self.assertEqual(self.codec.loads(response),
+                         {u'id': 7, u'result': [1, u'a'], u'error': None})
+        self.assertEqual(self.codec.loads(self.codec.encode_array(
+            [self.codec.dumps(i) for i in range(300)])), range(300))
+
+    def test_bad_data(self):
+        self.assertRaises(ValueError, self.codec.loads, '\xc1')
+
+    def test_limits(self):
+        data = self.call(u'reverse', [[[1, 2], {u'a': [3]}]])
+        # the request, params, the list, [1, 2] and {'a': [3]} are 5 levels
+        self.dispatcher.parse(data, max_depth=5)
+        self.assertRaisesRegexp(BadDataException, '^Request is nested deeper than 4 levels$',
+                                self.dispatcher.parse, data, max_depth=4)
+        # 3 entries of the request, 1 param, 2 items, 2 items, 1 entry, 1 item
+        self.dispatcher.parse(data, max_elements=10)
+        self.assertRaisesRegexp(BadDataException, '^Request has more than 9 elements$',
+                                self.dispatcher.parse, data, max_elements=9)
+
+        # invalid or truncated data is reported by the decoder
+        self.assertRaises(BadDataException, self.dispatcher.parse, '\xc1', 1, 1)
+        self.assertRaises(BadDataException, self.dispatcher.parse, data[:-3], 1000, 1000)
+
+    def test_view(self):
+        factory = RequestFactory()
+        content_type = self.codec.content_type
+        request = factory.post('/RPC2', self.call(u'rpc4django.introduction', []),
+                               content_type)
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response['Content-Type'], content_type)
+        self.assertEqual(self.codec.loads(response.content)[u'result'], u'はじめまして')
+
+        # a JSON response can be asked for
+        request = factory.post('/RPC2', self.call(u'rpc4django.introduction', []),
+                               content_type, HTTP_ACCEPT='application/json')
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content)['id'], 1)
+
+
+@unittest.skipIf(msgpack is None, 'msgpack is not installed')
+class TestMsgpackCodec(CodecTests, unittest.TestCase):
+    codec_class = MsgpackCodec
+
+    def test_default(self):
+        # dates are encoded by the JSON encoder
+        response = self.codec.loads(self.dispatcher.dispatch(self.call(u'date', [])))
+        self.assertEqual(response[u'result'], u'2012-02-02T00:00:00')
+
+
+@unittest.skipIf(cbor2 is None, 'cbor2 is not installed')
+class TestCBORCodec(CodecTests, unittest.TestCase):
+    codec_class = CBORCodec
+
+
+class TestCBORLimits(unittest.TestCase):
+
+    def test_indefinite_length(self):
+        # [_ 1, [_ 2], 1(3), (_ "a", "b")]
+        data = '\x9f\x01\x9f\x02\xff\xc1\x03\x7f\x61a\x61b\xff\xff'
+        check_cbor_limits(data, max_depth=2, max_elements=5)
+        self.assertRaises(ValueError, check_cbor_limits, data, max_depth=1)
+        self.assertRaises(ValueError, check_cbor_limits, data, max_elements=4)
+
+
+class TestCodecRegistry(unittest.TestCase):
+
+    def test_get_codecs(self):
+        self.assertRaises(ValueError, get_codecs, ['json5'])
+        self.assertEqual(get_codecs([]), [])
+
+        names = [codec.name for codec in get_codecs()]
+        self.assertEqual('msgpack' in names, msgpack is not None)
+        self.assertEqual('cbor' in names, cbor2 is not None)
+
+    def test_response_protocol(self):
+        dispatcher = RPCDispatcher(codecs=get_codecs())
+        json_protocol = dispatcher.jsonrpcdispatcher
+
+        def protocol(accept):
+            return views.get_response_protocol(dispatcher, accept, json_protocol).codec.name
+
+        self.assertEqual(protocol(None), 'json')
+        self.assertEqual(protocol('text/html, */*'), 'json')
+        if msgpack is not None:
+            # the highest q wins, then the first listed
+            self.assertEqual(protocol('application/json;q=0.1, application/msgpack'),
+                             'msgpack')
+            self.assertEqual(protocol('application/msgpack;q=0.5, application/json;q=0.5'),
+                             'msgpack')
+            self.assertEqual(protocol('application/msgpack; q=0, application/json'), 'json')
+            self.assertEqual(protocol('application/msgpack;q=0.000'), 'json')
+
+    def test_protocols(self):
+        dispatcher = RPCDispatcher(codecs=get_codecs())
+        self.assertTrue(dispatcher.get_protocol('application/json; charset=utf-8')
+                        is dispatcher.jsonrpcdispatcher)
+        self.assertTrue(dispatcher.get_protocol('text/plain') is None)
+        for codec in get_codecs():
+            protocol = dispatcher.get_protocol(codec.content_type)
+            self.assertEqual(protocol.codec.name, codec.name)
+            self.assertTrue(protocol.methods is dispatcher.registry)
+
+if __name__ == '__main__':
+    unittest.main()
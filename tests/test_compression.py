@@ -0,0 +1,97 @@
+'''
+Compression Tests
+-----------------
+
+'''
+
+import unittest
+import zlib
+from tests.settings import configure
+
+configure()
+
+from django.test.client import RequestFactory
+from rpc4django import views
+from rpc4django.compression import GzipCompressor, ResponseCompression, \
+    decompress, parse_accept_encoding
+from rpc4django.jsonrpcdispatcher import json
+
+
+def gzip(data):
+    return GzipCompressor().compress(data)
+
+
+class TestCompression(unittest.TestCase):
+
+    def test_negotiate(self):
+        self.assertEqual(parse_accept_encoding('gzip;q=0.5, br , identity;q=0'),
+                         {'gzip': 0.5, 'br': 1.0, 'identity': 0.0})
+
+        compression = ResponseCompression(['gzip'])
+        self.assertEqual(compression.negotiate('deflate, gzip').name, 'gzip')
+        self.assertEqual(compression.negotiate('*').name, 'gzip')
+        self.assertTrue(compression.negotiate('gzip;q=0') is None)
+        self.assertTrue(compression.negotiate('br') is None)
+        self.assertTrue(compression.negotiate(None) is None)
+
+    def test_stream(self):
+        chunks = list(GzipCompressor().stream(['abc' * 100, 'def' * 100], 1))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(zlib.decompress(''.join(chunks), 16 + zlib.MAX_WBITS),
+                         'abc' * 100 + 'def' * 100)
+
+    def test_decompress(self):
+        data = 'a' * 100000
+        compressed = gzip(data)
+        chunks = [compressed[i:i + 100] for i in range(0, len(compressed), 100)]
+        self.assertEqual(decompress(chunks, 'gzip', 100000), data)
+        self.assertEqual(decompress([zlib.compress(data)], 'deflate'), data)
+
+        # a bomb is stopped after the limit
+        self.assertRaises(ValueError, decompress, chunks, 'gzip', 99999)
+        self.assertRaises(ValueError, decompress, ['not gzip'], 'gzip', 100)
+        self.assertRaises(ValueError, decompress, chunks, 'compress', 100)
+
+
+class TestCompressedRequests(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.data = '{"params":[],"method":"system.listMethods","id":1}'
+
+    def test_request(self):
+        request = self.factory.post('/RPC2', gzip(self.data), 'application/json',
+                                    HTTP_CONTENT_ENCODING='gzip')
+        jsondict = json.loads(views.serve_rpc_request(request).content)
+        self.assertTrue('rpc4django.introduction' in jsondict['result'])
+
+        # small enough compressed but not decompressed
+        data = self.data.replace('1}', '"%s"}' % ('a' * 1000))
+        request = self.factory.post('/RPC2', gzip(data), 'application/json',
+                                    HTTP_CONTENT_ENCODING='gzip')
+        jsondict = json.loads(views.serve_rpc_request(request, max_body_size=100).content)
+        self.assertEqual(jsondict['error']['code'], 101)
+        self.assertEqual(jsondict['error']['message'],
+                         'Decompressed request body exceeds 100 bytes')
+
+    def test_response(self):
+        min_size = views.response_compression.min_size
+        try:
+            views.response_compression.min_size = 0
+            request = self.factory.post('/RPC2', self.data, 'application/json',
+                                        HTTP_ACCEPT_ENCODING='gzip')
+            response = views.serve_rpc_request(request)
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Vary'], 'Accept-Encoding')
+            content = zlib.decompress(response.content, 16 + zlib.MAX_WBITS)
+            self.assertTrue('rpc4django.introduction' in json.loads(content)['result'])
+
+            views.response_compression.min_size = 1000000
+            response = views.serve_rpc_request(self.factory.post(
+                '/RPC2', self.data, 'application/json', HTTP_ACCEPT_ENCODING='gzip'))
+            self.assertFalse(response.has_header('Content-Encoding'))
+        finally:
+            views.response_compression.min_size = min_size
+
+if __name__ == '__main__':
+    unittest.main()
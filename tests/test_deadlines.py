@@ -0,0 +1,85 @@
+'''
+Deadlines Tests
+---------------
+
+'''
+
+import time
+import unittest
+from rpc4django.deadlines import Deadline, parse_deadline, earliest
+from rpc4django.jsonrpcdispatcher import JSONRPCDispatcher, json
+from rpc4django.exceptions import BadDataException, DeadlineExceededException
+
+
+class TestDeadlines(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+
+        def add(a, b, **kwargs):
+            self.calls.append(kwargs.get('deadline'))
+            return a + b
+
+        def slow(seconds, **kwargs):
+            time.sleep(seconds)
+            return seconds
+
+        def rows(count, **kwargs):
+            for i in xrange(count):
+                if i == 2:
+                    time.sleep(0.05)
+                yield i
+
+        slow.timeout = 0.01
+        self.dispatcher = JSONRPCDispatcher()
+        self.dispatcher.register_function(add, 'add')
+        self.dispatcher.register_function(slow, 'slow')
+        self.dispatcher.register_function(rows, 'rows')
+
+    def test_parse(self):
+        self.assertEqual(parse_deadline('1500000000.5'), 1500000000.5)
+        self.assertRaises(ValueError, parse_deadline, 'soon')
+        self.assertRaises(ValueError, parse_deadline, True)
+        self.assertRaises(ValueError, parse_deadline, 'inf')
+        self.assertEqual(earliest(None, 3, 2), 2)
+        self.assertTrue(earliest(None) is None)
+
+        rpc_request = self.dispatcher.parse('{"params":[],"method":"add","id":1,"deadline":5}', deadline=9)
+        self.assertEqual(rpc_request.deadline, 5)
+        rpc_request = self.dispatcher.parse('{"params":[],"method":"add","id":1,"deadline":9}', deadline=5)
+        self.assertEqual(rpc_request.deadline, 5)
+        self.assertRaises(BadDataException, self.dispatcher.parse,
+                          '{"params":[],"method":"add","id":1,"deadline":"soon"}')
+
+    def test_expired(self):
+        # a call that waited past its deadline is never run
+        jsontxt = '{"params":[1,2],"method":"add","id":1,"deadline":%f}' % (time.time() - 1)
+        self.assertRaises(DeadlineExceededException, self.dispatcher.dispatch, jsontxt)
+        responses = json.loads(self.dispatcher.dispatch('[%s]' % jsontxt))
+        self.assertEqual(responses[0]['error']['code'], 106)
+        self.assertEqual(self.calls, [])
+
+        jsontxt = '{"params":[1,2],"method":"add","id":1,"deadline":%f}' % (time.time() + 60)
+        self.assertEqual(json.loads(self.dispatcher.dispatch(jsontxt))['result'], 3)
+        self.assertTrue(50 < self.calls[0].remaining() <= 60)
+
+        # calls without a deadline are passed none
+        self.dispatcher.dispatch('{"params":[1,2],"method":"add","id":1}')
+        self.assertTrue(self.calls[1] is None)
+
+    def test_timeout(self):
+        self.assertRaises(DeadlineExceededException, self.dispatcher.dispatch,
+                          '{"params":[0.05],"method":"slow","id":1}')
+
+        self.dispatcher.STREAM_ITEMS = 1
+        jsontxt = '{"params":[5],"method":"rows","id":1,"deadline":%f}' % (time.time() + 0.02)
+        jsondict = json.loads(''.join(self.dispatcher.dispatch(jsontxt)))
+        self.assertEqual(jsondict['result'], [0, 1])
+        self.assertEqual(jsondict['error']['code'], 106)
+
+        deadline = Deadline(time.time() - 1)
+        self.assertTrue(deadline.expired())
+        self.assertEqual(deadline.remaining(), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+'''
+Idempotency Tests
+-----------------
+
+'''
+
+import threading
+import unittest
+from tests.settings import configure
+
+configure()
+
+from django.test.client import RequestFactory
+from rpc4django.exceptions import OverloadedException
+from rpc4django.idempotency import ReplayCache
+from rpc4django.jsonrpcdispatcher import JSONRPCDispatcher, json
+
+
+class User(object):
+    def __init__(self, pk):
+        self.pk = pk
+
+    def is_authenticated(self):
+        return True
+
+
+class TestReplayCache(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+        def pay(amount, **kwargs):
+            self.calls.append(amount)
+            self.started.set()
+            self.release.wait()
+            if amount < 0:
+                raise ValueError('negative amount')
+            return len(self.calls)
+
+        def rows(count, **kwargs):
+            self.calls.append(count)
+            for i in xrange(count):
+                yield i
+
+        self.replay_cache = ReplayCache(ttl=60)
+        self.dispatcher = JSONRPCDispatcher(replay_cache=self.replay_cache)
+        self.dispatcher.register_function(pay, 'pay')
+        self.dispatcher.register_function(rows, 'rows')
+        self.factory = RequestFactory()
+
+    def request(self, key=None, user=1):
+        if key is None:
+            request = self.factory.post('/RPC2')
+        else:
+            request = self.factory.post('/RPC2', HTTP_IDEMPOTENCY_KEY=key)
+        request.user = User(user)
+        return request
+
+    def pay(self, amount, request=None, api_call_id=1):
+        response = self.dispatcher.dispatch(
+            '{"id":%d,"method":"pay","params":[%d]}' % (api_call_id, amount),
+            request=request)
+        return json.loads(response)['result']
+
+    def test_replay(self):
+        self.assertEqual(self.pay(10, self.request('a')), 1)
+        self.assertEqual(self.pay(10, self.request('a')), 1)
+        self.assertEqual(self.calls, [10])
+        self.assertEqual(self.replay_cache.stats()['replays'], 1)
+
+        # another key, user, call or no key at all runs the method
+        self.assertEqual(self.pay(10, self.request('b')), 2)
+        self.assertEqual(self.pay(10, self.request('a', user=2)), 3)
+        self.assertEqual(self.pay(20, self.request('a')), 4)
+        self.assertEqual(self.pay(10, self.request()), 5)
+        self.assertEqual(self.pay(10), 6)
+
+        # streamed results are kept whole
+        jsontxt = '{"id":1,"method":"rows","params":[3]}'
+        for i in range(2):
+            response = self.dispatcher.dispatch(jsontxt, request=self.request('c'))
+            self.assertEqual(json.loads(response)['result'], [0, 1, 2])
+        self.assertEqual(self.calls[-1], 3)
+        self.assertEqual(len(self.calls), 7)
+
+    def test_new_id(self):
+        # a retry with a new id, as sent by rpc4django.client, is replayed
+        # with its own id
+        jsontxt = '{"id":%d,"method":"pay","params":[10]}'
+        first = json.loads(self.dispatcher.dispatch(jsontxt % 1, request=self.request('a')))
+        retry = json.loads(self.dispatcher.dispatch(jsontxt % 2, request=self.request('a')))
+        self.assertEqual(self.calls, [10])
+        self.assertEqual((first['id'], first['result']), (1, 1))
+        self.assertEqual((retry['id'], retry['result']), (2, 1))
+
+        # the identical calls of a batch sharing the header all run
+        batch = '[{"id":3,"method":"pay","params":[20]},{"id":4,"method":"pay","params":[20]}]'
+        for i in range(2):
+            responses = json.loads(self.dispatcher.dispatch(batch, request=self.request('b')))
+            self.assertEqual([response['result'] for response in responses], [2, 3])
+        self.assertEqual(self.calls, [10, 20, 20])
+
+    def test_ids(self):
+        self.replay_cache.use_ids = True
+        self.assertEqual(self.pay(10, api_call_id=7), 1)
+        self.assertEqual(self.pay(10, api_call_id=7), 1)
+        self.assertEqual(self.pay(10, api_call_id=8), 2)
+
+        # the calls of a batch are replayed one by one
+        batch = '[{"id":7,"method":"pay","params":[10]},{"id":9,"method":"pay","params":[10]}]'
+        responses = json.loads(self.dispatcher.dispatch(batch))
+        self.assertEqual([response['result'] for response in responses], [1, 3])
+
+    def test_errors_not_kept(self):
+        self.assertRaises(ValueError, self.pay, -1, self.request('a'))
+        self.assertRaises(ValueError, self.pay, -1, self.request('a'))
+        self.assertEqual(self.calls, [-1, -1])
+
+    def test_wait(self):
+        self.release.clear()
+        results = []
+        first = threading.Thread(target=lambda: results.append(self.pay(10, self.request('a'))))
+        first.start()
+        self.started.wait(5)
+
+        retry = threading.Thread(target=lambda: results.append(self.pay(10, self.request('a'))))
+        retry.start()
+        while not self.replay_cache.waits:
+            retry.join(0.01)
+        self.release.set()
+        first.join(5)
+        retry.join(5)
+        self.assertEqual(results, [1, 1])
+        self.assertEqual(self.calls, [10])
+
+        # a retry gives up waiting after wait_timeout
+        self.release.clear()
+        self.started.clear()
+        self.replay_cache.wait_timeout = 0.05
+        first = threading.Thread(target=self.pay, args=(30, self.request('b')))
+        first.start()
+        self.started.wait(5)
+        self.assertRaises(OverloadedException, self.pay, 30, self.request('b'))
+        self.release.set()
+        first.join(5)
+
+    def test_shared_lock(self):
+        replay_cache = ReplayCache(ttl=60, django_cache='default', wait_timeout=0.1)
+        store = replay_cache.store
+        self.assertTrue(store.lock('key', 10))
+        self.assertFalse(store.lock('key', 10))
+
+        # the call runs in "another process" which never ends
+        self.assertRaises(OverloadedException, replay_cache.run, 'key',
+                          lambda: ('response', True))
+        store.unlock('key')
+        self.assertEqual(replay_cache.run('key', lambda: ('response', True)), 'response')
+        self.assertEqual(replay_cache.run('key', lambda: ('other', True)), 'response')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,6 +9,8 @@ JSON RPC Dispatcher Tests
 import unittest
 from datetime import datetime
 from rpc4django.jsonrpcdispatcher import *
+from rpc4django.serialization import JSONCodec, get_json_backend
+from rpc4django.exceptions import ProcessingException
 
 class TestJSONRPCDispatcher(unittest.TestCase):
 
@@ -57,6 +59,21 @@ class TestJSONRPCDispatcher(unittest.TestCase):
         self.assertEqual(type(jsondict['result']), unicode)
         self.assertEqual(type(datetime.strptime(jsondict['result'], "%Y-%m-%d %H:%M:%S")), datetime)
 
+    def test_codec(self):
+        jsontxt = '{"params":[1,2],"method":"add","id":1}'
+        resp = self.dispatcher.dispatch(jsontxt)
+        self.assertFalse(' ' in resp)
+        self.assertFalse('\n' in resp)
+
+        dispatcher = JSONRPCDispatcher(codec=JSONCodec('json', indent=4))
+        dispatcher.register_function(lambda a, b: a + b, 'add')
+        resp = dispatcher.dispatch(jsontxt)
+        self.assertTrue('\n    ' in resp)
+        self.assertEqual(json.loads(resp)['result'], 3)
+
+        self.assertEqual(get_json_backend('json').name, 'json')
+        self.assertRaises(ValueError, get_json_backend, 'nosuchbackend')
+
     def test_kwargs(self):
         d = dict()
         d['params'] = [1,2]
@@ -102,6 +119,109 @@ class TestJSONRPCDispatcher(unittest.TestCase):
         self.assertEqual(jsondict['id'], 'hello')
         self.assertEqual(jsondict['result'], 120)
         
+    def test_parse(self):
+        jsontxt = '{"params":[1,2],"method":"add","id":7}'
+        rpc_request = self.dispatcher.parse(jsontxt)
+        self.assertTrue(isinstance(rpc_request, JSONRPCRequest))
+        self.assertEqual(rpc_request.method, 'add')
+        self.assertEqual(rpc_request.params, [1, 2])
+        self.assertEqual(rpc_request.id, 7)
+        self.assertEqual(rpc_request.raw_size, len(jsontxt))
+
+        # an already parsed request is dispatched without decoding again
+        resp = self.dispatcher.dispatch(rpc_request)
+        jsondict = json.loads(resp)
+        self.assertEqual(jsondict['id'], 7)
+        self.assertEqual(jsondict['result'], 3)
+
+        self.assertRaises(BadDataException, self.dispatcher.parse, '')
+        self.assertRaises(BadDataException, self.dispatcher.parse, '"a string"')
+        self.assertRaises(BadDataException, self.dispatcher.parse,
+                          '{"params":"a","method":"add","id":7}')
+
+    def test_encode_error_id(self):
+        rpc_request = self.dispatcher.parse('{"params":[],"method":"add","id":9}')
+        resp = self.dispatcher.encode_error(BadMethodException('nope'), rpc_request)
+        jsondict = json.loads(resp)
+        self.assertEqual(jsondict['id'], 9)
+        self.assertEqual(jsondict['error']['code'], 102)
+
+    def test_batch(self):
+        jsontxt = json.dumps([
+            {"method": "add", "id": 1, "params": [1, 2]},
+            {"method": "add123", "id": 2, "params": []},
+            "not a call",
+            {"method": "fact", "id": 4, "params": ["a"]},
+            {"method": "fact", "id": 5, "params": [4]},
+        ])
+        resp = json.loads(self.dispatcher.dispatch(jsontxt))
+        self.assertEqual([r['id'] for r in resp], [1, 2, '', 4, 5])
+        self.assertEqual(resp[0]['result'], 3)
+        self.assertEqual(resp[1]['error']['code'], 102)
+        self.assertEqual(resp[2]['error']['code'], 101)
+        self.assertEqual(resp[3]['error']['code'], 104)
+        self.assertEqual(resp[4]['result'], 24)
+
+    def test_batch_threads(self):
+        self.dispatcher.BATCH_THREADS = 4
+        calls = [{"method": "fact", "id": i, "params": [i]} for i in range(20)]
+        resp = json.loads(self.dispatcher.dispatch(json.dumps(calls)))
+        self.assertEqual([r['id'] for r in resp], range(20))
+        self.assertEqual(resp[5]['result'], 120)
+
+    def test_batch_limits(self):
+        self.assertRaises(BadDataException, self.dispatcher.parse, '[]')
+        self.dispatcher.MAX_BATCH_SIZE = 2
+        calls = [{"method": "fact", "id": i, "params": [i]} for i in range(3)]
+        self.assertRaises(BadDataException, self.dispatcher.parse, json.dumps(calls))
+
+    def test_limits(self):
+        jsontxt = '{"params":[[1,2],{"a":"[[,,]]"}],"method":"add","id":7}'
+        self.assertEqual(self.dispatcher.parse(jsontxt, 3, 5).params,
+                         [[1, 2], {"a": "[[,,]]"}])
+        self.assertRaises(BadDataException, self.dispatcher.parse, jsontxt, 2)
+        self.assertRaises(BadDataException, self.dispatcher.parse, jsontxt, None, 4)
+        self.assertRaises(BadDataException, self.dispatcher.parse, '[' * 10000)
+
+        def small(value):
+            return value
+        small.max_body_size = 40
+        self.dispatcher.register_function(small, 'small')
+        resp = json.loads(self.dispatcher.dispatch('{"params":[1],"method":"small","id":1}'))
+        self.assertEqual(resp['result'], 1)
+        self.assertRaises(BadDataException, self.dispatcher.dispatch,
+                          '{"params":["%s"],"method":"small","id":1}' % ('a' * 10))
+
+    def test_stream(self):
+        def rows(count, fail_at=None):
+            for i in xrange(count):
+                if i == fail_at:
+                    raise ProcessingException('row %d failed' % i)
+                yield {'row': i}
+
+        self.dispatcher.register_function(rows, 'rows')
+        self.dispatcher.STREAM_CHUNK_SIZE = 100
+        self.dispatcher.STREAM_ITEMS = 10
+
+        jsontxt = '{"params":[50],"method":"rows","id":1}'
+        chunks = list(self.dispatcher.dispatch(jsontxt))
+        self.assertTrue(len(chunks) > 1)
+        jsondict = json.loads(''.join(chunks))
+        self.assertEqual(jsondict['id'], 1)
+        self.assertEqual(jsondict['result'], [{'row': i} for i in range(50)])
+        self.assertTrue(jsondict['error'] is None)
+
+        # the error trailer follows the rows already sent
+        jsontxt = '{"params":[50, 20],"method":"rows","id":2}'
+        jsondict = json.loads(''.join(self.dispatcher.dispatch(jsontxt)))
+        self.assertEqual(jsondict['result'], [{'row': i} for i in range(20)])
+        self.assertEqual(jsondict['error']['code'], 200)
+        self.assertEqual(jsondict['error']['message'], 'row 20 failed')
+
+        jsontxt = '{"params":[1],"method":"rows","id":3}'
+        jsondict = json.loads(self.dispatcher.dispatch('[%s]' % jsontxt))
+        self.assertEqual(jsondict[0]['result'], [{'row': 0}])
+
     def test_method_error(self):
         jsontxt = '{"params":["a"],"method":"fact","id":"hello"}'
         resp = self.dispatcher.dispatch(jsontxt)
@@ -0,0 +1,93 @@
+'''
+Limits Tests
+------------
+
+'''
+
+import unittest
+from rpc4django.limits import Limiter, TokenBucket, make_limiter
+from rpc4django.metrics import Metrics
+from rpc4django.jsonrpcdispatcher import JSONRPCDispatcher, json
+from rpc4django.exceptions import OverloadedException
+
+
+class TestLimits(unittest.TestCase):
+
+    def setUp(self):
+        def rows(count):
+            for i in xrange(count):
+                yield i
+
+        self.dispatcher = JSONRPCDispatcher()
+        self.dispatcher.register_function(rows, 'rows')
+        self.dispatcher.register_function(lambda a, b: a + b, 'add')
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(0.001, burst=2)
+        self.assertTrue(bucket.take())
+        self.assertTrue(bucket.take())
+        self.assertFalse(bucket.take())
+
+        self.assertTrue(make_limiter('add') is None)
+
+    def test_concurrency(self):
+        limiter = Limiter(max_concurrency=1, name='rows')
+        self.dispatcher.methods.get('rows').limiter = limiter
+
+        # a streamed call holds its slot until its response is consumed
+        response = self.dispatcher.dispatch('{"params":[3],"method":"rows","id":1}')
+        self.assertRaises(OverloadedException, self.dispatcher.dispatch,
+                          '{"params":[3],"method":"rows","id":2}')
+        self.assertEqual(json.loads(''.join(response))['result'], [0, 1, 2])
+        self.assertEqual(limiter.active, 0)
+        self.dispatcher.dispatch('{"params":[3],"method":"rows","id":3}')
+
+        # other methods are not limited
+        self.dispatcher.dispatch('{"params":[1,2],"method":"add","id":4}')
+        self.assertEqual(limiter.rejected, 1)
+
+    def test_closed_stream(self):
+        limiter = Limiter(max_concurrency=1, name='rows')
+        self.dispatcher.methods.get('rows').limiter = limiter
+        self.dispatcher.metrics = Metrics()
+
+        # a response closed without being iterated (eg. the client went
+        # away) releases its slot, once
+        response = self.dispatcher.dispatch('{"params":[3],"method":"rows","id":1}')
+        self.assertEqual(limiter.active, 1)
+        response.close()
+        response.close()
+        self.assertEqual(limiter.active, 0)
+        self.assertEqual(self.dispatcher.metrics.collect()['rows']['calls'], 1)
+
+        response = self.dispatcher.dispatch('{"params":[3],"method":"rows","id":2}')
+        self.assertEqual(json.loads(''.join(response))['result'], [0, 1, 2])
+        response.close()
+        self.assertEqual(limiter.active, 0)
+        self.assertEqual(limiter.rejected, 0)
+
+    def test_global(self):
+        self.dispatcher.limiter = Limiter(max_concurrency=1)
+        response = self.dispatcher.dispatch('{"params":[3],"method":"rows","id":1}')
+        try:
+            self.dispatcher.dispatch('{"params":[1,2],"method":"add","id":2}')
+            self.fail('add was not rejected')
+        except OverloadedException as e:
+            self.assertEqual(e.code, 105)
+            self.assertEqual(e.api_call_id, 2)
+        ''.join(response)
+
+        # failed calls release their slot
+        self.assertRaises(TypeError, self.dispatcher.dispatch,
+                          '{"params":[1],"method":"add","id":3}')
+        self.assertEqual(self.dispatcher.limiter.active, 0)
+
+    def test_rate(self):
+        self.dispatcher.methods.get('add').limiter = Limiter(rate=0.001, burst=2)
+        batch = ','.join('{"params":[1,2],"method":"add","id":%d}' % i for i in range(3))
+        responses = json.loads(self.dispatcher.dispatch('[%s]' % batch))
+        self.assertEqual([r['result'] for r in responses], [3, 3, None])
+        self.assertEqual(responses[2]['error']['code'], 105)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+'''
+Logging Tests
+-------------
+
+'''
+
+import logging
+import unittest
+from rpc4django.logutils import ErrorRateLimiter, RequestLogger, logger
+from rpc4django.jsonrpcdispatcher import JSONRPCRequest, JSONRPCBatch
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LoggingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = RecordingHandler()
+        self.level = logger.level
+        logger.addHandler(self.handler)
+
+    def tearDown(self):
+        logger.removeHandler(self.handler)
+        logger.setLevel(self.level)
+
+
+class TestRequestLogger(LoggingTestCase):
+
+    def test_disabled(self):
+        logger.setLevel(logging.INFO)
+        request_logger = RequestLogger()
+        self.assertFalse(request_logger.sampled(JSONRPCRequest('add')))
+
+    def test_sampled(self):
+        logger.setLevel(logging.DEBUG)
+        request_logger = RequestLogger({'*': 0, 'add': 1})
+        self.assertTrue(request_logger.sampled(JSONRPCRequest('add')))
+        self.assertFalse(request_logger.sampled(JSONRPCRequest('sub')))
+        self.assertFalse(request_logger.sampled(JSONRPCRequest(['add'])))
+        self.assertFalse(request_logger.sampled(JSONRPCBatch([])))
+
+    def test_truncate(self):
+        logger.setLevel(logging.DEBUG)
+        request_logger = RequestLogger(max_body=4)
+        request_logger.log_request(JSONRPCRequest('add'), '0123456789')
+        request_logger.log_response(JSONRPCRequest('add'), '0123456789')
+        self.assertEqual(len(self.handler.records), 1)
+        self.assertTrue(self.handler.records[0].getMessage().endswith(
+            ': 0123... (10 bytes)'))
+
+        request_logger.log_responses = True
+        request_logger.log_response(JSONRPCRequest('add'), '0123')
+        self.assertTrue(self.handler.records[1].getMessage().endswith(': 0123'))
+
+
+class TestErrorRateLimiter(LoggingTestCase):
+
+    def raise_and_log(self, limiter, exc_class):
+        try:
+            raise exc_class('failed')
+        except exc_class:
+            return limiter.log_exception('call %s failed', 'add')
+
+    def test_rate_limit(self):
+        limiter = ErrorRateLimiter(interval=60)
+        self.assertTrue(self.raise_and_log(limiter, ValueError))
+        self.assertFalse(self.raise_and_log(limiter, ValueError))
+        self.assertFalse(self.raise_and_log(limiter, ValueError))
+        # each exception type is limited on its own
+        self.assertTrue(self.raise_and_log(limiter, KeyError))
+        self.assertEqual(len(self.handler.records), 2)
+        self.assertTrue(self.handler.records[0].exc_info is not None)
+
+        limiter.interval = 0
+        self.assertTrue(self.raise_and_log(limiter, ValueError))
+        self.assertEqual(self.handler.records[2].getMessage(),
+                         'call add failed (2 similar errors suppressed)')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+'''
+Metrics Tests
+-------------
+
+'''
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from rpc4django.metrics import Metrics, format_prometheus, UNKNOWN_METHOD, BATCH
+from rpc4django.jsonrpcdispatcher import JSONRPCDispatcher
+from rpc4django.exceptions import RpcException, BadParamsException
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+        self.dispatcher = JSONRPCDispatcher(metrics=self.metrics)
+
+        def add(a, b):
+            if not isinstance(b, int):
+                raise BadParamsException('b must be an int')
+            return a + b
+
+        def rows(count):
+            for i in xrange(count):
+                yield i
+
+        self.dispatcher.register_function(add, 'add')
+        self.dispatcher.register_function(rows, 'rows')
+
+    def test_record(self):
+        self.dispatcher.dispatch('{"params":[1,2],"method":"add","id":1}')
+        self.assertRaises(BadParamsException, self.dispatcher.dispatch,
+                          '{"params":[1,"b"],"method":"add","id":2}')
+        self.assertRaises(RpcException, self.dispatcher.dispatch,
+                          '{"params":[],"method":"nosuchmethod","id":3}')
+        batch = ('[{"params":[1,2],"method":"add","id":4},'
+                 '{"params":[3],"method":"rows","id":5}]')
+        self.dispatcher.dispatch(batch)
+        ''.join(self.dispatcher.dispatch('{"params":[3],"method":"rows","id":6}'))
+
+        stats = self.metrics.collect()
+        self.assertEqual(sorted(stats), [BATCH, UNKNOWN_METHOD, 'add', 'rows'])
+        self.assertEqual(stats['add']['calls'], 3)
+        self.assertEqual(stats['add']['errors'], {'201': 1})
+        self.assertEqual(stats[UNKNOWN_METHOD]['errors'], {'102': 1})
+        self.assertEqual(stats['rows']['calls'], 2)
+        self.assertEqual(sum(stats['add']['latency']['counts']), 3)
+        self.assertEqual(stats['rows']['response_bytes']['sum'],
+                         2 * len('{"id":5,"result":[0,1,2],"error":null}'))
+
+        # the size of the batch is recorded once and not for its calls
+        self.assertEqual(stats[BATCH]['calls'], 1)
+        self.assertEqual(stats[BATCH]['request_bytes']['sum'], len(batch))
+        self.assertEqual(stats['rows']['request_bytes']['sum'],
+                         len('{"params":[3],"method":"rows","id":6}'))
+        self.assertEqual(sum(stats['rows']['request_bytes']['counts']), 1)
+
+    def test_prometheus(self):
+        self.dispatcher.dispatch('{"params":[1,2],"method":"add","id":1}')
+        self.assertRaises(BadParamsException, self.dispatcher.dispatch,
+                          '{"params":[1,"b"],"method":"add","id":2}')
+        lines = format_prometheus(self.metrics.collect()).splitlines()
+        self.assertTrue('rpc4django_calls_total{method="add"} 2' in lines)
+        self.assertTrue('rpc4django_errors_total{method="add",code="201"} 1' in lines)
+        self.assertTrue('rpc4django_call_duration_seconds_bucket{method="add",le="+Inf"} 2' in lines)
+        self.assertTrue('rpc4django_request_bytes_bucket{method="add",le="100"} 2' in lines)
+        self.assertTrue('rpc4django_response_bytes_count{method="add"} 2' in lines)
+
+    def test_directory(self):
+        directory = tempfile.mkdtemp()
+        try:
+            metrics = Metrics(directory)
+            metrics.record('add', 0.01, 50, 40)
+
+            # the file written by another process
+            other = Metrics()
+            other.record('add', 0.5, 50, 40, 201)
+            other.record('sub', 0.5, 50, 40)
+            with open(os.path.join(directory, 'metrics-999999.json'), 'w') as f:
+                json.dump(other.snapshot(), f)
+
+            stats = metrics.collect()
+            self.assertEqual(stats['add']['calls'], 2)
+            self.assertEqual(stats['add']['errors'], {'201': 1})
+            self.assertEqual(stats['sub']['calls'], 1)
+            self.assertEqual(stats['add']['latency']['sum'], 0.51)
+            self.assertTrue(os.path.exists(os.path.join(directory,
+                                           'metrics-%d.json' % os.getpid())))
+        finally:
+            shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
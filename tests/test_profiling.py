@@ -0,0 +1,82 @@
+'''
+Profiling Tests
+---------------
+
+'''
+
+import json
+import os
+import pstats
+import shutil
+import tempfile
+import time
+import unittest
+from tests.settings import configure
+
+configure()
+
+from django.test.client import RequestFactory
+from rpc4django.profiling import RequestProfiler, sign, PROFILE_HEADER
+from rpc4django.jsonrpcdispatcher import JSONRPCDispatcher
+
+
+class TestRequestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.profiler = RequestProfiler('secret', os.path.join(self.directory, 'profiles'),
+                                        summary=True)
+        self.factory = RequestFactory()
+        self.dispatcher = JSONRPCDispatcher()
+
+        def add(a, b):
+            return a + b
+
+        self.dispatcher.register_function(add, 'add')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_verify(self):
+        self.assertTrue(self.profiler.verify(sign('secret', 'add'), u'add'))
+        self.assertFalse(self.profiler.verify(sign('other secret', 'add'), u'add'))
+        self.assertFalse(self.profiler.verify(sign('secret', 'add', int(time.time()) - 600),
+                                              u'add'))
+        self.assertFalse(self.profiler.verify('garbage', u'add'))
+        # the header only profiles the method it is signed for
+        self.assertFalse(self.profiler.verify(sign('secret', 'add'), u'sub'))
+        self.assertFalse(self.profiler.verify(sign('secret', 'add'), None))
+
+    def test_wants(self):
+        rpc_request = self.dispatcher.parse('{"params":[1,2],"method":"add","id":1}')
+        request = self.factory.post('/RPC2', '', 'application/json',
+                                    **{PROFILE_HEADER: sign('secret', 'add')})
+        self.assertTrue(self.profiler.wants(request, rpc_request))
+        self.assertFalse(self.profiler.wants(self.factory.post('/RPC2'), rpc_request))
+
+        batch = self.dispatcher.parse('[{"params":[1,2],"method":"add","id":1},'
+                                      '{"params":[1,2],"method":"sub","id":2}]')
+        self.assertFalse(self.profiler.wants(request, batch))
+        request = self.factory.post('/RPC2', '', 'application/json',
+                                    **{PROFILE_HEADER: sign('secret', 'add,sub')})
+        self.assertTrue(self.profiler.wants(request, batch))
+
+        sampled = RequestProfiler(sample_rates={'add': 1, '*': 0})
+        self.assertTrue(sampled.wants(self.factory.post('/RPC2'), rpc_request))
+        rpc_request.method = 'sub'
+        self.assertFalse(sampled.wants(self.factory.post('/RPC2'), rpc_request))
+
+    def test_run(self):
+        rpc_request = self.dispatcher.parse('{"params":[1,2],"method":"add","id":"a/b"}')
+        response, summary = self.profiler.run(rpc_request, self.dispatcher.dispatch,
+                                              rpc_request)
+        self.assertEqual(json.loads(response), {'id': 'a/b', 'result': 3, 'error': None})
+        self.assertTrue('ms' in summary)
+
+        filenames = os.listdir(self.profiler.directory)
+        self.assertEqual(len(filenames), 1)
+        self.assertTrue(filenames[0].startswith('add-a_b-'))
+        pstats.Stats(os.path.join(self.profiler.directory, filenames[0]))
+
+if __name__ == '__main__':
+    unittest.main()
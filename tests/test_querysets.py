@@ -0,0 +1,133 @@
+'''
+QuerySet Results Tests
+----------------------
+
+'''
+
+import unittest
+import xmlrpclib
+from tests.settings import configure
+
+configure()
+
+from django.core.management.color import no_style
+from django.db import connection, models
+from rpc4django.jsonrpcdispatcher import json
+from rpc4django.querysets import encode_models, model_to_dict
+from rpc4django.rpcdispatcher import RPCDispatcher, rpcmethod
+
+
+class Author(models.Model):
+    name = models.CharField(max_length=50)
+
+    class Meta:
+        app_label = 'rpc4django'
+
+
+class Book(models.Model):
+    title = models.CharField(max_length=50)
+    pages = models.IntegerField()
+    author = models.ForeignKey(Author)
+
+    @property
+    def short(self):
+        return self.pages < 100
+
+    class Meta:
+        app_label = 'rpc4django'
+
+
+def create_tables():
+    cursor = connection.cursor()
+    for model in (Author, Book):
+        statements, references = connection.creation.sql_create_model(model, no_style())
+        for statement in statements:
+            cursor.execute(statement)
+
+
+class TestQuerySets(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        create_tables()
+        author = Author.objects.create(name=u'Ann')
+        for i in range(5):
+            Book.objects.create(title=u'Book %d' % i, pages=50 * i, author=author)
+
+    def setUp(self):
+        @rpcmethod(name='books', fields=['title', 'author'])
+        def books(**kwargs):
+            return Book.objects.order_by('id')
+
+        @rpcmethod(name='shortbooks', fields=['title', 'short'])
+        def shortbooks(**kwargs):
+            return list(Book.objects.order_by('id'))
+
+        @rpcmethod(name='book', cache_ttl=60)
+        def book(pk, **kwargs):
+            return Book.objects.get(pk=pk)
+
+        @rpcmethod(name='titles', versioned=True)
+        def titles(**kwargs):
+            return Book.objects.order_by('id').values_list('title', flat=True)
+
+        self.dispatcher = RPCDispatcher()
+        for method in (books, shortbooks, book, titles):
+            self.dispatcher.register_method(method)
+
+    def call(self, method, params=()):
+        response = self.dispatcher.jsondispatch(json.dumps(
+            {'id': 1, 'method': method, 'params': list(params)}))
+        if not isinstance(response, basestring):
+            response = ''.join(response)
+        return json.loads(response)
+
+    def test_encode_models(self):
+        book = Book.objects.get(pk=1)
+        self.assertEqual(model_to_dict(book),
+                         {'id': 1, 'title': u'Book 0', 'pages': 0, 'author_id': 1})
+        self.assertEqual(model_to_dict(book, ['title', 'author', 'short']),
+                         {'title': u'Book 0', 'author': 1, 'short': True})
+
+        rows = encode_models(Book.objects.filter(pages__gt=100).order_by('id'), ['pages'])
+        self.assertEqual(list(rows), [{'pages': 150}, {'pages': 200}])
+        self.assertEqual(encode_models([1, 2]), [1, 2])
+
+        # an evaluated QuerySet is not queried again
+        connection.use_debug_cursor = True
+        try:
+            queryset = Book.objects.order_by('id')
+            len(queryset)
+            queries = len(connection.queries)
+            self.assertEqual(len(list(encode_models(queryset, ['title']))), 5)
+            self.assertEqual(len(connection.queries), queries)
+            self.assertEqual(len(list(encode_models(Book.objects.all()))), 5)
+            self.assertEqual(len(connection.queries), queries + 1)
+        finally:
+            connection.use_debug_cursor = None
+
+    def test_streamed(self):
+        response = self.dispatcher.jsondispatch(
+            '{"id":1,"method":"books","params":[]}')
+        self.assertFalse(isinstance(response, basestring))
+        result = json.loads(''.join(response))['result']
+        self.assertEqual(len(result), 5)
+        self.assertEqual(result[0], {'title': u'Book 0', 'author': 1})
+
+        result = self.call('shortbooks')['result']
+        self.assertEqual([row['short'] for row in result],
+                         [True, True, False, False, False])
+
+    def test_cached(self):
+        self.assertEqual(self.call('book', [2])['result']['title'], u'Book 1')
+        self.assertEqual(self.call('book', [2])['result']['title'], u'Book 1')
+        self.assertEqual(self.call('titles')['result'][:2], [u'Book 0', u'Book 1'])
+        self.assertEqual(self.call('titles')['result'][:2], [u'Book 0', u'Book 1'])
+
+    def test_xmlrpc(self):
+        out, name = xmlrpclib.loads(''.join(self.dispatcher.xmldispatch(
+            xmlrpclib.dumps((), 'books'))))
+        self.assertEqual(out[0][4], {'title': 'Book 4', 'author': 1})
+
+if __name__ == '__main__':
+    unittest.main()
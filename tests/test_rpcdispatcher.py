@@ -12,6 +12,8 @@ from xmlrpclib import Fault, Binary
 from xml.dom.minidom import parseString
 from rpc4django.rpcdispatcher import *
 from rpc4django.jsonrpcdispatcher import *
+from rpc4django.registry import MethodRegistry
+from rpc4django.exceptions import BadParamsException
 
 BINARY_STRING = '\x97\xd2\xab\xc8\xfc\x98\xad'
 
@@ -41,10 +43,46 @@ class TestRPCMethod(unittest.TestCase):
         self.assertEqual(self.add.get_returnvalue(), 'int')
         self.assertEqual(self.test1.get_returnvalue(), 'object')
     
+    def test_invoke(self):
+        self.assertEqual(self.add.invoke(1, 2), 3)
+        # keyword arguments are only passed to methods that take them
+        self.assertEqual(self.add.invoke(1, 2, request='request'), 3)
+        self.assertRaises(BadParamsException, self.add.invoke, 1)
+        self.assertRaises(BadParamsException, self.add.invoke, 1, 2, 3)
+        self.assertRaises(BadParamsException, self.add.invoke, 1, 'b')
+        self.assertRaises(BadParamsException, self.add.invoke, True, 2)
+        self.assertEqual(self.test1.invoke(u'anything'), 4)
+
+        def wants_request(a, request=None):
+            return request
+        method = RPCMethod(wants_request)
+        self.assertEqual(method.invoke(1, request='request'), 'request')
+        self.assertEqual(method.invoke(1, 2, request='request'), 2)
+        self.assertEqual(method.invoke(1, other='ignored'), None)
+
+        # templates must not call RPCMethods, whatever the Django version
+        self.assertFalse(callable(method))
+
     def test_get_params(self):
         self.assertEqual(self.add.get_params(), [{'name': 'a', 'rpctype': 'int'}, {'name': 'b', 'rpctype': 'int'}])
         self.assertEqual(self.test1.get_params(), [{'name': 'arg1', 'rpctype': 'object'}])
 
+class TestMethodRegistry(unittest.TestCase):
+    def test_register(self):
+        registry = MethodRegistry()
+        self.assertTrue(registry.register('b', 1))
+        self.assertTrue(registry.register('a', 2))
+        self.assertFalse(registry.register('b', 3))
+
+        self.assertEqual(registry['b'], 1)
+        self.assertEqual(registry.get('c'), None)
+        self.assertEqual(registry.get(['unhashable']), None)
+        self.assertTrue('a' in registry)
+        self.assertFalse('c' in registry)
+        self.assertEqual(len(registry), 2)
+        self.assertEqual(registry.values(), [1, 2])
+        self.assertEqual(registry.names(), ['a', 'b'])
+
 class TestRPCDispatcher(unittest.TestCase):
     def setUp(self):
         self.d = RPCDispatcher()
@@ -85,6 +123,159 @@ class TestRPCDispatcher(unittest.TestCase):
         resp = self.d.system_listmethods()
         self.assertEquals(resp, ['add', 'system.describe', 'system.listMethods', 'system.methodHelp', 'system.methodSignature'])
         
+    def test_shared_registry(self):
+        self.d.register_method(self.add)
+        self.assertTrue(self.d.jsonrpcdispatcher.methods is self.d.registry)
+        self.assertEqual(self.d.registry['add'].name, 'add')
+        self.assertEqual(len(self.d.rpcmethods), 5)
+
+    def test_register_rpcmodules(self):
+        self.d.register_rpcmodules(['example.testapp.othermodule'])
+        self.assertTrue('rpc4django.introduction' in self.d.registry)
+        self.assertTrue('view.request' in self.d.registry)
+        self.assertFalse('rpc4django.mytestmethod' in self.d.registry)
+        self.assertRaises(ImportError, self.d.register_rpcmodules, ['nosuchmodule'])
+
+    def test_manifest(self):
+        self.d.register_rpcmodules(['example.testapp.othermodule'])
+        self.d.register_method(self.add)
+        manifest = self.d.get_manifest()
+        self.assertEqual(manifest['methods'], [
+            ['example.testapp.othermodule', 'intro'],
+            ['example.testapp.othermodule', 'request'],
+        ])
+
+        d = RPCDispatcher()
+        d.register_manifest(json.loads(json.dumps(manifest)))
+        self.assertEqual(d.system_listmethods(), [
+            'rpc4django.introduction', 'system.describe', 'system.listMethods',
+            'system.methodHelp', 'system.methodSignature', 'view.request'])
+
+    def test_versioned(self):
+        calls = []
+
+        @rpcmethod(name='versioned', versioned=True)
+        def versioned(a):
+            calls.append(a)
+            return [a]
+
+        self.d.register_method(versioned)
+        jsontxt = '{"params":[1],"method":"versioned","id":%d}'
+        for i in range(3):
+            jsondict = json.loads(self.d.jsondispatch(jsontxt % i))
+            self.assertEqual(jsondict['id'], i)
+            self.assertEqual(jsondict['result'], [1])
+            self.assertTrue(jsondict['error'] is None)
+        self.assertEqual(calls, [1])
+
+        # registering a method invalidates the results
+        self.d.register_method(self.add)
+        self.d.jsondispatch(jsontxt % 4)
+        self.assertEqual(calls, [1, 1])
+
+    def test_versioned_eviction(self):
+        calls = []
+
+        @rpcmethod(name='versioned', versioned=True)
+        def versioned(a):
+            calls.append(a)
+            return a
+
+        d = RPCDispatcher(versioned_cache_size=2)
+        d.register_method(versioned)
+        jsontxt = '{"params":[%d],"method":"versioned","id":1}'
+        for a in (1, 2, 1, 3, 1, 2):
+            d.jsondispatch(jsontxt % a)
+        # 2 was evicted by 3 as the least recently used
+        self.assertEqual(calls, [1, 2, 3, 2])
+        self.assertEqual(len(d.jsonrpcdispatcher._versioned[1]), 2)
+
+    def test_fingerprint(self):
+        d = RPCDispatcher()
+        self.d.register_method(self.add, helpmsg='Adds a and b')
+        d.register_method(self.add, helpmsg='Returns a + b')
+        # as many methods are registered but their help differs
+        self.assertEqual(self.d.registry.version, d.registry.version)
+        self.assertNotEqual(self.d.fingerprint(), d.fingerprint())
+
+        d2 = RPCDispatcher()
+        d2.register_method(self.add, helpmsg='Adds a and b')
+        self.assertEqual(self.d.fingerprint(), d2.fingerprint())
+
+    def test_cached(self):
+        calls = []
+
+        @rpcmethod(name='cached', cache_ttl=60, cache_per_user=True)
+        def cached(a, b=None):
+            calls.append(a)
+            return {'a': a, 'b': b}
+
+        class User(object):
+            def __init__(self, pk):
+                self.pk = pk
+            def is_authenticated(self):
+                return True
+
+        class Request(object):
+            def __init__(self, user):
+                self.user = user
+
+        self.d.register_method(cached)
+        jsontxt = '{"params":[%s],"method":"cached","id":%d}'
+        first, second = Request(User(1)), Request(User(2))
+        for i in range(3):
+            jsondict = json.loads(self.d.jsondispatch(jsontxt % (1, i), request=first))
+            self.assertEqual(jsondict['id'], i)
+            self.assertEqual(jsondict['result'], {'a': 1, 'b': None})
+            self.assertTrue(jsondict['error'] is None)
+        self.assertEqual(calls, [1])
+
+        self.d.jsondispatch(jsontxt % ('{"x":1,"y":2}', 3), request=first)
+        self.d.jsondispatch(jsontxt % ('{"y":2,"x":1}', 4), request=first)
+        self.d.jsondispatch(jsontxt % (1, 5), request=second)
+        self.assertEqual(calls, [1, {'x': 1, 'y': 2}, 1])
+
+        # bad params are rejected before the cache is looked up
+        self.assertRaises(BadParamsException, self.d.jsondispatch,
+                          jsontxt % ('1,2,3', 6), request=first)
+        self.assertRaises(BadParamsException, self.d.jsondispatch,
+                          jsontxt % ('1,2,3', 7), request=first)
+
+        stats = self.d.jsonrpcdispatcher.result_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (3, 3, 3))
+
+    def test_cache_key_checked(self):
+        keys = []
+
+        def key(a):
+            keys.append(a)
+            return str(a)
+
+        @rpcmethod(name='keyed', signature=['int', 'int'], cache_ttl=60, cache_key=key)
+        def keyed(a):
+            return a
+
+        self.d.register_method(keyed)
+        jsontxt = '{"params":[%s],"method":"keyed","id":1}'
+        # the arity and types are checked before the cache_key function runs
+        for params in ('1,2', '"a"'):
+            try:
+                self.d.jsondispatch(jsontxt % params)
+                self.fail('%s was not rejected' % params)
+            except BadParamsException as e:
+                self.assertEqual(e.code, 201)
+        self.assertEqual(keys, [])
+        self.assertEqual(json.loads(self.d.jsondispatch(jsontxt % '1'))['result'], 1)
+        self.assertEqual(keys, [1])
+
+    def test_describe(self):
+        version = self.d.system_describe()['registryVersion']
+        self.assertTrue(self.d.system_describe() is self.d.system_describe())
+        self.d.register_method(self.add)
+        description = self.d.system_describe()
+        self.assertTrue(description['registryVersion'] > version)
+        self.assertTrue('add' in [method['name'] for method in description['methods']])
+
     def test_methodhelp(self):
         resp = self.d.system_methodhelp('system.methodHelp')
         self.assertEquals(resp, 'Returns documentation for a specified method')
@@ -139,6 +330,40 @@ class TestRPCDispatcher(unittest.TestCase):
         self.assertEqual(jsondict['id'], 1)
         self.assertEqual(jsondict['result'], 3)
         
+    def test_check_request_permission(self):
+        calls = []
+
+        @rpcmethod(name='secure', authentication=calls.append)
+        def secure():
+            return True
+
+        self.d.register_method(secure)
+        rpc_request = self.d.jsonrpcdispatcher.parse('{"params":[],"method":"secure","id":1}')
+        self.assertTrue(self.d.check_request_permission('req', rpc_request))
+        self.assertEqual(calls, ['req'])
+
+    def test_batch_authenticates_once(self):
+        calls = []
+
+        def authenticate(request):
+            calls.append(request)
+
+        @rpcmethod(name='secure', authentication=authenticate)
+        def secure(**kwargs):
+            return True
+
+        self.d.register_method(secure)
+        jsontxt = '[{"params":[],"method":"secure","id":1},{"params":[],"method":"secure","id":2}]'
+        resp = json.loads(self.d.jsondispatch(jsontxt, request='req'))
+        self.assertEqual([r['result'] for r in resp], [True, True])
+        self.assertEqual(calls, ['req'])
+
+    def test_bad_params(self):
+        self.d.register_method(self.add)
+        resp = json.loads(self.d.jsondispatch('[{"params":[1],"method":"add","id":1}]'))
+        self.assertEqual(resp[0]['error']['code'], 201)
+        self.assertEqual(resp[0]['error']['message'], 'add is missing arguments: b')
+
     def test_kwargs(self):
         self.d.register_method(self.kwargstest)
         
@@ -0,0 +1,36 @@
+'''
+Utils Tests
+-----------
+
+'''
+
+import unittest
+from rpc4django.utils import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_lru(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        # 'b' is now the least recently used entry
+        cache.set('c', 3)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats(), {'hits': 3, 'misses': 1,
+                                         'evictions': 1, 'size': 2})
+
+    def test_ttl(self):
+        cache = LRUCache(ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=-1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b', 'expired'), 'expired')
+        cache.delete('a')
+        self.assertEqual(cache.get('a'), None)
+
+if __name__ == '__main__':
+    unittest.main()
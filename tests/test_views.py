@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+'''
+View Tests
+----------
+
+'''
+
+import unittest
+import xmlrpclib
+from tests.settings import configure
+
+configure()
+
+from django.test.client import RequestFactory
+from rpc4django import views
+from rpc4django.jsonrpcdispatcher import json
+
+
+class TestServeRpcRequest(unittest.TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def post(self, data, **extra):
+        request = self.factory.post('/RPC2', data, 'application/json', **extra)
+        return views.serve_rpc_request(request)
+
+    def test_post(self):
+        response = self.post('{"params":[],"method":"rpc4django.introduction","id":1}')
+        self.assertEqual(response.status_code, 200)
+        jsondict = json.loads(response.content)
+        self.assertEqual(jsondict['id'], 1)
+        self.assertEqual(jsondict['result'], u'はじめまして')
+        self.assertEqual(response['X-RPC4Django-Registry-Version'],
+                         str(views.get_dispatcher().registry.version))
+
+    def test_browser_accept(self):
+        # application/xml in a browser's Accept does not switch to XMLRPC
+        accept = 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8'
+        response = self.post('{"params":[],"method":"rpc4django.introduction","id":1}',
+                             HTTP_ACCEPT=accept)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content)['result'], u'はじめまして')
+
+        # nor does a JSON Accept switch an XMLRPC request to JSON
+        request = self.factory.post('/RPC2', xmlrpclib.dumps((), 'rpc4django.introduction'),
+                                    'text/xml', HTTP_ACCEPT='application/json')
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response['Content-Type'], 'text/xml')
+        self.assertEqual(xmlrpclib.loads(response.content)[0][0], u'はじめまして')
+
+    def test_limits(self):
+        data = '{"params":[],"method":"rpc4django.introduction","id":[[1]]}'
+        request = self.factory.post('/RPC2', data, 'application/json')
+        jsondict = json.loads(views.serve_rpc_request(request, max_body_size=10).content)
+        self.assertEqual(jsondict['error']['code'], 101)
+        self.assertEqual(jsondict['error']['message'], 'Request body exceeds 10 bytes')
+
+        request = self.factory.post('/RPC2', data, 'application/json')
+        jsondict = json.loads(views.serve_rpc_request(request, max_json_depth=2).content)
+        self.assertEqual(jsondict['error']['code'], 101)
+
+        request = self.factory.post('/RPC2', data, 'application/json')
+        jsondict = json.loads(views.serve_rpc_request(request, max_json_depth=3).content)
+        self.assertTrue(jsondict['error'] is None)
+
+    def test_deadline(self):
+        data = '{"params":[],"method":"rpc4django.introduction","id":1}'
+        jsondict = json.loads(self.post(data, HTTP_X_RPC4DJANGO_DEADLINE='1').content)
+        self.assertEqual(jsondict['error']['code'], 106)
+        jsondict = json.loads(self.post(data, HTTP_X_RPC4DJANGO_DEADLINE='soon').content)
+        self.assertEqual(jsondict['error']['code'], 101)
+
+    def test_summary(self):
+        response = views.serve_rpc_request(self.factory.get('/RPC2'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue('rpc4django.introduction' in response.content)
+        etag = response['ETag']
+
+        # the page is only rendered once per registry version
+        self.assertEqual(views.get_method_summary(views.get_dispatcher())[1], etag)
+
+        response = views.serve_rpc_request(self.factory.get('/RPC2',
+                                           HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,14 @@ XML RPC Dispatcher Tests
 
 import unittest
 import xmlrpclib
+from datetime import datetime
+from tests.settings import configure
+
+configure()
+
+from django.test.client import RequestFactory
+from rpc4django import views
+from rpc4django.exceptions import BadDataException, BadMethodException
 from rpc4django.xmlrpcdispatcher import *
 
 class TestXMLRPCDispatcher(unittest.TestCase):
@@ -15,9 +23,104 @@ class TestXMLRPCDispatcher(unittest.TestCase):
             if kwargs.get('c', None) is not None:
                 return True
             return False
+
+        def echo(*args):
+            return list(args)
+
+        def rows(count, fail=False):
+            for i in xrange(count):
+                yield i
+            if fail:
+                raise KeyError('row')
         
         self.dispatcher = XMLRPCDispatcher()
         self.dispatcher.register_function(kwargstest, 'kwargstest')
+        self.dispatcher.register_function(echo, 'echo')
+        self.dispatcher.register_function(rows, 'rows')
+
+    def test_parse(self):
+        values = (1, -2 ** 31, True, 1.5, u'\u306f', 'text', None, [1, [2]],
+                  {'a': {'b': []}}, xmlrpclib.Binary('\x00\xff'),
+                  xmlrpclib.DateTime(datetime(2012, 2, 2)))
+        rpc_request = self.dispatcher.parse(xmlrpclib.dumps(values, 'echo', allow_none=True))
+        self.assertEqual(rpc_request.method, 'echo')
+        self.assertEqual(rpc_request.params, list(values))
+
+        # a value without a type is a string
+        method, params = XMLRPCCodec().loads('<methodCall><methodName>echo</methodName>'
+            '<params><param><value> a b </value></param>'
+            '<param><value><i8>1099511627776</i8></value></param></params></methodCall>')
+        self.assertEqual(params, [u' a b ', 2 ** 40])
+
+        xml = xmlrpclib.dumps(([[[1]]], [2, 3]), 'echo')
+        self.assertEqual(len(self.dispatcher.parse(xml, max_depth=3).params), 2)
+        self.assertRaises(BadDataException, self.dispatcher.parse, xml, max_depth=2)
+        self.assertRaises(BadDataException, self.dispatcher.parse, xml, max_elements=5)
+
+        self.assertRaises(BadDataException, self.dispatcher.parse, '<methodCall>')
+        self.assertRaises(BadDataException, self.dispatcher.parse, '<methodCall/>')
+        self.assertRaises(BadDataException, self.dispatcher.parse,
+            '<methodCall><methodName>a</methodName><params><param><value>'
+            '<int>one</int></value></param></params></methodCall>')
+
+        # entities cannot be declared
+        bomb = ('<?xml version="1.0"?><!DOCTYPE a [<!ENTITY a "aaaaaaaaaa">'
+                '<!ENTITY b "&a;&a;&a;&a;&a;&a;&a;&a;&a;&a;">]>'
+                '<methodCall><methodName>&b;</methodName></methodCall>')
+        self.assertRaises(BadDataException, self.dispatcher.parse, bomb)
+
+    def test_incremental(self):
+        xml = xmlrpclib.dumps(([1, 2], {'a': u'\u306f'}), 'echo')
+        parser = XMLRPCParser()
+        for i in range(0, len(xml), 7):
+            parser.feed(xml[i:i + 7])
+        self.assertEqual(parser.close(), (u'echo', [[1, 2], {'a': u'\u306f'}]))
+
+    def test_errors(self):
+        self.assertRaises(BadMethodException, self.dispatcher.dispatch,
+                          xmlrpclib.dumps((), 'nosuchmethod'))
+
+        fault = self.dispatcher.encode_error(BadMethodException('No such method'))
+        try:
+            xmlrpclib.loads(fault)
+            self.fail('fault expected')
+        except xmlrpclib.Fault as e:
+            self.assertEqual(e.faultCode, 102)
+            self.assertEqual(e.faultString, 'No such method')
+
+    def test_stream(self):
+        self.dispatcher.STREAM_CHUNK_SIZE = 100
+        chunks = list(self.dispatcher.dispatch(xmlrpclib.dumps((50,), 'rows')))
+        self.assertTrue(len(chunks) > 1)
+        out, name = xmlrpclib.loads(''.join(chunks))
+        self.assertEqual(out[0], range(50))
+
+        # a stream failing before anything was sent is a fault
+        chunks = self.dispatcher.dispatch(xmlrpclib.dumps((2, True), 'rows'))
+        self.assertRaises(xmlrpclib.Fault, xmlrpclib.loads, ''.join(chunks))
+
+    def test_multicall(self):
+        calls = [
+            {'methodName': 'echo', 'params': [1, 'a']},
+            {'methodName': 'nosuchmethod', 'params': []},
+            {'methodName': 'rows', 'params': [3]},
+            {'params': []},
+        ]
+        out, name = xmlrpclib.loads(self.dispatcher.dispatch(
+            xmlrpclib.dumps((calls,), 'system.multicall')))
+        results = out[0]
+        self.assertEqual(results[0], [[1, 'a']])
+        self.assertEqual(results[1]['faultCode'], 102)
+        self.assertEqual(results[2], [[0, 1, 2]])
+        self.assertEqual(results[3]['faultCode'], 101)
+
+        self.dispatcher.BATCH_THREADS = 2
+        out, name = xmlrpclib.loads(self.dispatcher.dispatch(
+            xmlrpclib.dumps((calls[:1] * 3,), 'system.multicall')))
+        self.assertEqual(out[0], [[[1, 'a']]] * 3)
+
+        self.assertRaises(BadDataException, self.dispatcher.dispatch,
+                          xmlrpclib.dumps(([],), 'system.multicall'))
 
     def test_kwargs(self):
         xml = xmlrpclib.dumps((1,2), 'kwargstest')
@@ -28,6 +131,19 @@ class TestXMLRPCDispatcher(unittest.TestCase):
         ret = self.dispatcher.dispatch(xml, c=1)
         out, name = xmlrpclib.loads(ret)
         self.assertTrue(out[0])
-        
+
+    def test_view(self):
+        factory = RequestFactory()
+        request = factory.post('/RPC2', xmlrpclib.dumps((), 'rpc4django.introduction'),
+                               'text/xml; charset=utf-8')
+        response = views.serve_rpc_request(request)
+        self.assertEqual(response['Content-Type'], 'text/xml')
+        out, name = xmlrpclib.loads(response.content)
+        self.assertEqual(out[0], u'\u306f\u3058\u3081\u307e\u3057\u3066')
+
+        request = factory.post('/RPC2', xmlrpclib.dumps((), 'nosuchmethod'), 'text/xml')
+        self.assertRaises(xmlrpclib.Fault, xmlrpclib.loads,
+                          views.serve_rpc_request(request).content)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,5 @@
+from django.conf.urls.defaults import patterns
+
+urlpatterns = patterns('',
+    ('^RPC2$', 'rpc4django.views.serve_rpc_request'),
+)